@@ -18,8 +18,12 @@ from consts.proj_vars import ProjVar, InstallVars, ComplianceVar
 from consts import build_server as build_server_consts
 from consts import stx
 from utils.mongo_reporter.cgcs_mongo_reporter import collect_and_upload_results
+from utils import cli
+from utils import tis_log
 from utils.tis_log import LOG
+from utils.upload_queue import UploadQueue
 from utils.cgcs_reporter import parse_log
+from utils.kpi import kpi
 # Kpi fixture. Do not remove!
 from testfixtures.pre_checks_and_configs import collect_kpi
 
@@ -35,6 +39,10 @@ tracebacks = []
 region = None
 test_count = 0
 console_log = True
+upload_queue = None
+# lab info used by mongo upload
+MONGO_LAB_KEYS = ('short_name', 'controller_nodes', 'compute_nodes',
+                  'storage_nodes')
 
 ################################
 # Process and log test results #
@@ -100,19 +108,25 @@ def _write_results(res_in_tests, test_name):
     build_job = build_info.get('JOB', '')
 
     if ProjVar.get_var("REPORT_ALL") or ProjVar.get_var("REPORT_TAG"):
+        async_upload = ProjVar.get_var('ASYNC_UPLOAD')
         if ProjVar.get_var('SESSION_ID'):
             global tracebacks
             search_forward = True \
                 if (ComplianceVar.get_var('REFSTACK_SUITE') or
                     ComplianceVar.get_var('DOVETAIL_SUITE')) else False
+            test_history_kwargs = dict(
+                session_id=ProjVar.get_var('SESSION_ID'),
+                test_name=test_name, result=res_in_tests,
+                start_time=tc_start_time, end_time=tc_end_time,
+                traceback=list(tracebacks), parse_name=True,
+                search_forward=search_forward)
             try:
-                from utils.cgcs_reporter import upload_results
-                upload_results.upload_test_result(
-                    session_id=ProjVar.get_var('SESSION_ID'),
-                    test_name=test_name, result=res_in_tests,
-                    start_time=tc_start_time, end_time=tc_end_time,
-                    traceback=tracebacks, parse_name=True,
-                    search_forward=search_forward)
+                if async_upload:
+                    _get_upload_queue().put('test_history',
+                                            **test_history_kwargs)
+                else:
+                    from utils.cgcs_reporter import upload_results
+                    upload_results.upload_test_result(**test_history_kwargs)
             except:
                 LOG.exception(
                     "Unable to upload test result to TestHistory db! "
@@ -122,21 +136,92 @@ def _write_results(res_in_tests, test_name):
                 if repeat_count <= 0:
                     tracebacks = []
 
+        # Session info is frozen into the kwargs, since queued jobs may be
+        # replayed by a later session
+        lab = ProjVar.get_var('LAB') or {}
+        mongo_kwargs = dict(test_name=test_name, result=res_in_tests,
+                            log_dir=ProjVar.get_var('LOG_DIR'), build=build_id,
+                            build_server=build_server, build_job=build_job,
+                            lab={key: lab[key] for key in MONGO_LAB_KEYS if
+                                 key in lab},
+                            tag=ProjVar.get_var('REPORT_TAG') or '',
+                            system_type=ProjVar.get_var('SYS_TYPE') or '')
         try:
-            upload_res = collect_and_upload_results(test_name, res_in_tests,
-                                                    ProjVar.get_var('LOG_DIR'),
-                                                    build=build_id,
-                                                    build_server=build_server,
-                                                    build_job=build_job)
-            if not upload_res:
+            if async_upload:
+                _get_upload_queue().put('mongo', **mongo_kwargs)
+            elif not _upload_to_mongo(**mongo_kwargs):
                 with open(ProjVar.get_var("TCLIST_PATH"), mode='a') as f:
                     f.write('\tUPLOAD_UNSUCC')
         except Exception as e:
             LOG.exception("Unable to upload test result to mongoDB! Test case: {}\n{}".format(test_name, e.__str__()))
 
+    # log timing summary of rest requests, clis and ssh cmds of this test
+    kpi.log_summary(scope='test')
+
+    # index log offsets of this test, so parse_log does not need to rescan the whole log at the end of session
+    try:
+        parse_log.update_log_index(ProjVar.get_var('LOG_DIR'))
+    except Exception as e:
+        LOG.warning("Unable to update log index. \nDetails: {}".format(e.__str__()))
+
     tc_start_time = None
 
 
+def _upload_to_mongo(test_name, result, log_dir, build, build_server,
+                     build_job, lab=None, tag=None, system_type=None):
+    return bool(collect_and_upload_results(test_name, result, log_dir,
+                                           build=build,
+                                           build_server=build_server,
+                                           build_job=build_job, lab=lab,
+                                           tag=tag, system_type=system_type))
+
+
+def _get_upload_queue():
+    """
+    Get the background result upload queue. Created on first use, or at
+    session start if a journal is left from previous sessions.
+    """
+    global upload_queue
+    if upload_queue is None:
+        from utils.cgcs_reporter import upload_results
+        UploadQueue.register('test_history', upload_results.upload_test_result,
+                             batch_func=upload_results.upload_test_result_batch)
+        UploadQueue.register('mongo', _upload_to_mongo)
+        upload_queue = UploadQueue(spool_path=_get_upload_spool_path())
+    return upload_queue
+
+
+def _get_upload_spool_path():
+    # Under lab log dir, so that jobs not uploaded are replayed by next
+    # session of the same lab
+    return os.path.join(os.path.dirname(ProjVar.get_var('LOG_DIR')),
+                        'upload_spool.log')
+
+
+def _flush_upload_queue():
+    """
+    Wait for queued result uploads, and mark tests failed to upload to mongoDB
+    with UPLOAD_UNSUCC in test results log.
+    """
+    if upload_queue is None:
+        return
+
+    upload_queue.flush()
+    failed_tests = [kwargs['test_name'] for seq, kind, kwargs in
+                    upload_queue.failed if kind == 'mongo']
+    if not failed_tests:
+        return
+
+    tclist_path = ProjVar.get_var("TCLIST_PATH")
+    with open(tclist_path) as f:
+        lines = f.read().split('\n')
+    for i, line in enumerate(lines):
+        if line.split('\t')[-1] in failed_tests:
+            lines[i] = line + '\tUPLOAD_UNSUCC'
+    with open(tclist_path, mode='w') as f:
+        f.write('\n'.join(lines))
+
+
 def pytest_runtest_makereport(item, call, __multicall__):
     report = __multicall__.execute()
     my_rep = MakeReport.get_report(item)
@@ -373,6 +458,22 @@ def pytest_configure(config):
         ProjVar.set_var(COLLECT_TELNET=True)
     if keystone_debug:
         ProjVar.set_var(KEYSTONE_DEBUG=True)
+    if config.getoption('no_ssh_mux'):
+        ProjVar.set_var(SSH_MUX=False)
+    if config.getoption('cli_token_auth'):
+        ProjVar.set_var(CLI_TOKEN_AUTH=True)
+    if config.getoption('rest_backend'):
+        ProjVar.set_var(REST_BACKEND=True)
+    if config.getoption('sync_upload'):
+        ProjVar.set_var(ASYNC_UPLOAD=False)
+    if config.getoption('no_kube_watch'):
+        ProjVar.set_var(KUBE_WATCH=False)
+    if config.getoption('no_alarm_tracker'):
+        ProjVar.set_var(ALARM_TRACKER=False)
+    if config.getoption('no_defer_downloads'):
+        ProjVar.set_var(DEFER_INSTALL_DOWNLOADS=False)
+    if config.getoption('no_artifact_cache'):
+        ProjVar.set_var(ARTIFACT_CACHE=False)
     if config.getoption('noconsolelog'):
         global console_log
         console_log = False
@@ -450,7 +551,24 @@ def pytest_configure(config):
 
     InstallVars.set_install_var(lab=lab)
 
-    config_logger(log_dir, console=console_log)
+    config_logger(log_dir, console=console_log,
+                  rotate_size=config.getoption('log_rotate_size'))
+
+    if col_kpi:
+        # kpis are uploaded in batches from a background thread. Failed
+        # uploads are spooled under lab log dir and replayed by next session
+        # of the same lab.
+        from utils.kpi import upload_kpi
+        upload_kpi.KpiWriter.set_writer(upload_kpi.KpiWriter(
+            spool_path=os.path.join(os.path.dirname(log_dir), 'kpi_spool.lp'),
+            local_path=config.getoption('kpi_sink')))
+
+    if ProjVar.get_var('ASYNC_UPLOAD') and os.path.exists(
+            _get_upload_spool_path()):
+        try:
+            _get_upload_queue()
+        except Exception as e:
+            LOG.warning("Failed to replay result upload journal. {}".format(e))
 
     # set resultlog save location
     config.option.resultlog = ProjVar.get_var("PYTESTLOG_PATH")
@@ -493,6 +611,17 @@ def pytest_addoption(parser):
     tag_help = "Tag to be used for uploading logs to the test results database."
     telnetlog_help = "Collect telnet logs throughout the session"
     remote_cli_help = 'Run testcases using remote CLI'
+    cli_token_auth_help = "Authenticate openstack cli with a cached keystone " \
+                          "token instead of username and password"
+    rest_backend_help = "Use REST api instead of cli for frequently used query " \
+                        "keywords such as get_hosts, get_alarms and " \
+                        "get_vm_values. Applies to admin user only"
+    no_ssh_mux_help = "Do not share one ssh transport among the controller " \
+                      "ssh sessions opened by different threads"
+    log_rotate_size_help = "Rotate and gzip TIS_AUTOMATION.log when it " \
+                           "reaches given size in MB"
+    sync_upload_help = "Upload test results to the test results database " \
+                       "before next test starts, instead of in background"
 
     # Test session options on installed and configured STX system:
     parser.addoption('--testcase-config', action='store',
@@ -515,6 +644,10 @@ def pytest_addoption(parser):
     parser.addoption('--kpi', '--collect-kpi', '--collect_kpi',
                      action='store_true', dest='col_kpi',
                      help="Collect kpi for applicable test cases")
+    parser.addoption('--kpi-sink', '--kpi_sink', '--kpisink', action='store',
+                     dest='kpi_sink', metavar='PATH', default=None,
+                     help="Write collected kpis in InfluxDB line protocol to "
+                          "given file instead of uploading to KPI DB")
 
     # Debugging/Log collection options:
     parser.addoption('--sessiondir', '--session_dir', '--session-dir',
@@ -549,6 +682,43 @@ def pytest_addoption(parser):
                      action='store_true', help=telnetlog_help)
     parser.addoption('--keystone_debug', '--keystone-debug',
                      action='store_true', dest='keystone_debug')
+    parser.addoption('--cli-token-auth', '--cli_token_auth', '--tokenauth',
+                     action='store_true', dest='cli_token_auth',
+                     help=cli_token_auth_help)
+    parser.addoption('--rest-backend', '--rest_backend', '--restbackend',
+                     action='store_true', dest='rest_backend',
+                     help=rest_backend_help)
+    parser.addoption('--no-ssh-mux', '--no_ssh_mux', '--nosshmux',
+                     action='store_true', dest='no_ssh_mux',
+                     help=no_ssh_mux_help)
+    parser.addoption('--log-rotate-size', '--log_rotate_size', action='store',
+                     dest='log_rotate_size', metavar='MB', default=None,
+                     help=log_rotate_size_help)
+    parser.addoption('--no-kube-watch', '--no_kube_watch', '--nokubewatch',
+                     action='store_true', dest='no_kube_watch',
+                     help="Poll kubectl get instead of using kubectl watch "
+                          "when waiting for pods")
+    parser.addoption('--no-alarm-tracker', '--no_alarm_tracker',
+                     '--noalarmtracker', action='store_true',
+                     dest='no_alarm_tracker',
+                     help="List all alarms instead of applying fm event-list "
+                          "deltas when checking alarms before and after "
+                          "tests")
+    parser.addoption('--no-defer-downloads', '--no_defer_downloads',
+                     '--nodeferdownloads', action='store_true',
+                     dest='no_defer_downloads',
+                     help="Download guest image and helm charts during "
+                          "download lab files step instead of while booting "
+                          "other hosts during fresh install")
+    parser.addoption('--no-artifact-cache', '--no_artifact_cache',
+                     '--noartifactcache', action='store_true',
+                     dest='no_artifact_cache',
+                     help="Copy files from test server directly to "
+                          "destination instead of via checksum keyed cache "
+                          "on active controller")
+    parser.addoption('--sync-upload', '--sync_upload', '--syncupload',
+                     action='store_true', dest='sync_upload',
+                     help=sync_upload_help)
     parser.addoption('--reportall', '--report_all', '--report-all',
                      dest='reportall', action='store_true',
                      help=report_help)
@@ -983,7 +1153,17 @@ def pytest_addoption(parser):
                      dest='compliance_suite', help=compliance_help)
 
 
-def config_logger(log_dir, console=True):
+def config_logger(log_dir, console=True, rotate_size=None):
+    """
+    Log to TIS_AUTOMATION.log and console via a background thread.
+
+    Args:
+        log_dir (str):
+        console (bool): whether to log INFO and above to console
+        rotate_size (int|None): rotate and gzip TIS_AUTOMATION.log when it
+            reaches given MB. No rotation if None.
+
+    """
     # logger for log saved in file
     file_name = log_dir + '/TIS_AUTOMATION.log'
     logging.Formatter.converter = gmtime
@@ -1002,17 +1182,26 @@ def config_logger(log_dir, console=True):
                         filename=tmp_path, filemode='w')
 
     # file handler:
-    file_handler = logging.FileHandler(file_name)
+    if rotate_size:
+        file_handler = tis_log.get_gzip_rotating_file_handler(
+            file_name, max_bytes=int(rotate_size) * 1024 * 1024)
+    else:
+        file_handler = logging.FileHandler(file_name)
     file_handler.setFormatter(tis_formatter)
     file_handler.setLevel(logging.DEBUG)
-    LOG.addHandler(file_handler)
 
     # logger for stream output
     console_level = logging.INFO if console else logging.CRITICAL
     stream_hdler = logging.StreamHandler()
     stream_hdler.setFormatter(tis_formatter)
     stream_hdler.setLevel(console_level)
-    LOG.addHandler(stream_hdler)
+
+    # tmp log handler is served by the listener thread as well
+    handlers = [file_handler, stream_hdler] + logging.getLogger().handlers
+    LOG.propagate = False
+    tis_log.start_queue_logging(
+        LOG, handlers=handlers,
+        spill_path=os.path.join(log_dir, 'TIS_AUTOMATION_large_output.log'))
 
     print("LOG DIR: {}".format(log_dir))
 
@@ -1028,6 +1217,24 @@ def pytest_unconfigure(config):
     except:
         pass
 
+    try:
+        from utils.kube_watch import PodWatcher
+        PodWatcher.stop_all()
+    except:
+        pass
+
+    try:
+        from keywords import check_helper
+        check_helper.shutdown_check_pool()
+    except:
+        pass
+
+    try:
+        from testfixtures import resource_mgmt
+        resource_mgmt.shutdown_teardown_pool()
+    except:
+        pass
+
     version_and_patch = ''
     try:
         version_and_patch = setups.get_version_and_patch_info()
@@ -1056,6 +1263,11 @@ def pytest_unconfigure(config):
             pass
         return
 
+    try:
+        _flush_upload_queue()
+    except Exception as e:
+        LOG.warning("Failed to flush result upload queue. {}".format(e))
+
     try:
         tc_res_path = log_dir + '/test_results.log'
         build_info = ProjVar.get_var('BUILD_INFO')
@@ -1104,6 +1316,14 @@ def pytest_unconfigure(config):
         LOG.exception(
             "Failed to add session summary to test_results.py. "
             "\nDetails: {}".format(e.__str__()))
+    try:
+        summary = kpi.log_summary(scope='session', reset=False)
+        if summary:
+            with open(os.path.join(ProjVar.get_var('LOG_DIR'), 'kpi_timings.log'), mode='w') as f:
+                f.write(summary + '\n')
+    except Exception as e:
+        LOG.warning("Failed to write kpi timing summary. \nDetails: {}".format(e.__str__()))
+
     # Below needs con_ssh to be initialized
     try:
         from utils.clients.ssh import ControllerClient
@@ -1112,14 +1332,19 @@ def pytest_unconfigure(config):
         LOG.warning("No con_ssh found")
         return
 
+    LOG.info("CLI auth cache stats: {}".format(cli.get_auth_cache_stats()))
+
     if ProjVar.get_var('COLLECT_KPI'):
         try:
             from utils.kpi import upload_kpi
-            upload_kpi.upload_kpi(kpi_file=ProjVar.get_var('KPI_PATH'))
+            kpi_writer = upload_kpi.KpiWriter.get_writer()
+            if kpi_writer:
+                LOG.info("KPI writer stats: {}".format(kpi_writer.close()))
         except Exception as e:
             LOG.warning("Unable to upload KPIs. {}".format(e.__str__()))
 
     try:
+        tis_log.flush_queue_logging()
         parse_log.parse_test_steps(ProjVar.get_var('LOG_DIR'))
     except Exception as e:
         LOG.warning(
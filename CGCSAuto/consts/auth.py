@@ -54,9 +54,32 @@ class Tenant:
         'TENANT1': __TENANT1,
         'TENANT2': __TENANT2}
 
+    # Called with reason when auth url, region or user credentials change
+    __change_callbacks = []
+
+    @classmethod
+    def add_change_callback(cls, callback):
+        """
+        Register a callback to be called when auth url, region or user
+        credentials are changed. e.g., to invalidate cached cli auth.
+
+        Args:
+            callback (runnable): called with reason (str) as keyword arg
+
+        """
+        if callback not in cls.__change_callbacks:
+            cls.__change_callbacks.append(callback)
+
+    @classmethod
+    def __notify_change(cls, reason):
+        for callback in cls.__change_callbacks:
+            callback(reason=reason)
+
     @classmethod
     def add_dc_region(cls, region_info):
         cls.__DC_MAP.update(region_info)
+        cls.__notify_change('DC regions updated: {}'.format(
+            ', '.join(region_info)))
 
     @classmethod
     def set_platform_url(cls, url, central_region=False):
@@ -71,6 +94,7 @@ class Tenant:
             cls.__DC_MAP.get('RegionOne')['auth_url'] = url
         else:
             cls.__URL_PLATFORM = url
+        cls.__notify_change('Platform auth url set to {}'.format(url))
 
     @classmethod
     def set_region(cls, region):
@@ -81,6 +105,7 @@ class Tenant:
 
         """
         cls.__REGION = region
+        cls.__notify_change('Region set to {}'.format(region))
 
     @classmethod
     def add(cls, username, tenantname=None, dictname=None, password=None,
@@ -98,7 +123,10 @@ class Tenant:
 
         dictname = dictname.upper() if dictname else username.upper().\
             replace('-', '_')
+        existing = dictname in cls.__tenants
         cls.__tenants[dictname] = user_dict
+        if existing:
+            cls.__notify_change('Tenant {} replaced'.format(dictname))
         return user_dict
 
     __primary = 'TENANT1'
@@ -198,6 +226,7 @@ class Tenant:
         if tenant:
             kwargs['tenant'] = tenant
         tenant_dict.update(kwargs)
+        cls.__notify_change('Tenant {} updated'.format(tenant_dictname))
         cls.__tenants[tenant_dictname] = tenant_dict
 
     @classmethod
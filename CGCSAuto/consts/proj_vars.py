@@ -43,6 +43,14 @@ class ProjVar:
                   'STX_KEYFILE_PATH': '~/.ssh/id_rsa',
                   'OPENSTACK_DOMAIN': None,
                   'IPV6_OAM': None,
+                  'SSH_MUX': True,
+                  'CLI_TOKEN_AUTH': False,
+                  'REST_BACKEND': False,
+                  'ASYNC_UPLOAD': True,
+                  'KUBE_WATCH': True,
+                  'ALARM_TRACKER': True,
+                  'DEFER_INSTALL_DOWNLOADS': True,
+                  'ARTIFACT_CACHE': True,
                   }
 
     @classmethod
@@ -12,6 +12,7 @@ from pytest import skip
 
 from utils.tis_log import LOG
 from utils.rest import Rest
+from utils.multi_thread import MThreadPool
 from consts.auth import Tenant
 from consts.stx import MELLANOX_DEVICE, GuestImages, EventLogID
 from consts.reasons import SkipStorageSpace
@@ -793,7 +794,12 @@ def _check_disk_size(vm_ssh, disk_name, expt_size):
 
 
 def check_alarms(before_alarms, timeout=300, auth_info=Tenant.get('admin_platform'), con_ssh=None, fail_ok=False):
-    after_alarms = system_helper.get_alarms(auth_info=auth_info, con_ssh=con_ssh)
+    # Alarm tracker only queries alarm events since last check
+    tracker = system_helper.AlarmTracker.get_tracker(con_ssh=con_ssh, auth_info=auth_info)
+    if tracker:
+        after_alarms = tracker.get_alarms()
+    else:
+        after_alarms = system_helper.get_alarms(auth_info=auth_info, con_ssh=con_ssh)
     new_alarms = []
     check_interval = 5
     for item in after_alarms:
@@ -814,9 +820,13 @@ def check_alarms(before_alarms, timeout=300, auth_info=Tenant.get('admin_platfor
     remaining_alarms = None
     if new_alarms:
         LOG.info("New alarms detected. Waiting for new alarms to clear.")
-        res, remaining_alarms = system_helper.wait_for_alarms_gone(new_alarms, fail_ok=True, timeout=timeout,
-                                                                   check_interval=check_interval,
-                                                                   auth_info=auth_info, con_ssh=con_ssh)
+        if tracker:
+            res, remaining_alarms = tracker.wait_for_alarms_gone(new_alarms, fail_ok=True, timeout=timeout,
+                                                                 check_interval=check_interval)
+        else:
+            res, remaining_alarms = system_helper.wait_for_alarms_gone(new_alarms, fail_ok=True, timeout=timeout,
+                                                                       check_interval=check_interval,
+                                                                       auth_info=auth_info, con_ssh=con_ssh)
 
     if not res:
         msg = "New alarm(s) found and did not clear within {} seconds. Alarm IDs and Entity IDs: {}".\
@@ -828,6 +838,99 @@ def check_alarms(before_alarms, timeout=300, auth_info=Tenant.get('admin_platfor
     return res, remaining_alarms
 
 
+_CHECK_POOL = None
+
+
+def _get_check_pool(max_workers):
+    """
+    Get the pool shared by run_checks calls. Workers only set up controller
+    sessions, once for the whole session instead of per fixture.
+    """
+    global _CHECK_POOL
+    if _CHECK_POOL is None or _CHECK_POOL.max_workers < max_workers:
+        shutdown_check_pool()
+        _CHECK_POOL = MThreadPool(max_workers=max_workers, natbox=False)
+    return _CHECK_POOL
+
+
+def shutdown_check_pool(wait=True):
+    """
+    Shut down the pool used by run_checks and close its worker sessions
+    """
+    global _CHECK_POOL
+    if _CHECK_POOL is not None:
+        pool, _CHECK_POOL = _CHECK_POOL, None
+        pool.shutdown(wait=wait, cancel_pending=True)
+
+
+def run_checks(checks, timeout=900, max_workers=5, fail_ok=False):
+    """
+    Run independent checks concurrently and aggregate the results. Worker
+    threads are reused across calls and each uses its own controller ssh
+    session. Single check is run in current thread.
+
+    Args:
+        checks (dict): {<name>: <func>|(<func>, <args>)|(<func>, <args>, <kwargs>)}. A check fails if it raises.
+            e.g., {'alarms': (check_alarms, (before_alarms,)),
+                   'pods': (kube_helper.wait_for_pods_healthy, (), {'timeout': 300})}
+        timeout (int): max seconds to wait for all checks
+        max_workers (int):
+        fail_ok (bool): whether to raise AssertionError if any check failed
+
+    Returns (tuple): (<all passed(bool)>, <results(dict)>)
+        results: {<name>: {'passed': <bool>, 'output': <return value>, 'error': <str|None>, 'duration': <seconds>}}
+
+    """
+    tasks = {}
+    for name, check in checks.items():
+        if callable(check):
+            check = (check, )
+        func, args, kwargs = (tuple(check) + ((), {})[len(check) - 1:])[:3]
+        tasks[name] = (func, args, kwargs)
+
+    def _run_check(name_, func_, args_, kwargs_):
+        start_time = time.time()
+        result = {'passed': True, 'output': None, 'error': None}
+        try:
+            result['output'] = func_(*args_, **kwargs_)
+        except Exception as e:
+            LOG.warning("{} check failed: {}".format(name_, e))
+            result['passed'] = False
+            result['error'] = '{}: {}'.format(type(e).__name__, e)
+        result['duration'] = time.time() - start_time
+        return result
+
+    if len(tasks) <= 1:
+        results = {name: _run_check(name, *task) for name, task in tasks.items()}
+    else:
+        end_time = time.time() + timeout
+        pool = _get_check_pool(max_workers=max_workers)
+        futures_ = {name: pool.submit(_run_check, name, *task) for name, task in tasks.items()}
+        results = {}
+        for name, future in futures_.items():
+            try:
+                results[name] = future.result(timeout=max(end_time - time.time(), 0))
+            except Exception as e:
+                results[name] = {'passed': False, 'output': None, 'duration': None,
+                                 'error': 'Check did not finish within {} seconds. {}'.format(timeout, e)}
+        if all(future.done() for future in futures_.values()):
+            pool.forget(list(futures_.values()))
+        else:
+            # Do not block on hung checks, and do not reuse their workers
+            shutdown_check_pool(wait=False)
+
+    failed = {name: result['error'] for name, result in results.items() if not result['passed']}
+    LOG.info("Checks summary: {}".format(', '.join(
+        '{} {} ({})'.format(name, 'passed' if result['passed'] else 'FAILED',
+                            '{:.1f}s'.format(result['duration']) if result['duration'] is not None else 'timeout')
+        for name, result in results.items())))
+    if failed and not fail_ok:
+        raise AssertionError("{} check(s) failed:\n{}".format(
+            len(failed), '\n'.join('{}: {}'.format(name, err) for name, err in failed.items())))
+
+    return not failed, results
+
+
 def check_qat_service(vm_id, qat_devs, run_cpa=True, timeout=600):
     """
     Check qat device and service on given vm
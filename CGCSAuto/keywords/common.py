@@ -24,8 +24,10 @@ from consts.proj_vars import ProjVar
 from consts.build_server import YOW_TUXLAB2
 from consts.stx import OAM_IP_v6, Prompt
 from utils import exceptions
+from utils.artifact_cache import ArtifactCache, NATBOX_CACHE_DIR
 from utils.clients.ssh import ControllerClient, NATBoxClient, SSHClient, SSHFromSSH, \
     get_cli_client
+from utils.file_distributor import FileDistributor
 from utils.tis_log import LOG
 
 
@@ -68,7 +70,8 @@ def _scp_from_remote_to_active_controller(source_server, source_path,
                                           source_user=None,
                                           source_password=None,
                                           timeout=900, con_ssh=None,
-                                          is_dir=False, ipv6=None):
+                                          is_dir=False, ipv6=None,
+                                          dest_ip=None):
     """
     SCP file or files under a directory from remote server to TiS server
 
@@ -79,12 +82,16 @@ def _scp_from_remote_to_active_controller(source_server, source_path,
         timeout (int):
         con_ssh:
         is_dir
+        dest_ip (str|None): ip to scp to from NatBox for VBox labs. Default
+            to lab floating ip.
 
     Returns (str|None): destination file/dir path if scp successful else None
 
     """
     if con_ssh is None:
         con_ssh = ControllerClient.get_active_controller()
+    if not dest_ip:
+        dest_ip = ProjVar.get_var('LAB').get('floating ip')
     if not source_user:
         source_user = TestFileServer.get_user()
     if not source_password:
@@ -101,6 +108,15 @@ def _scp_from_remote_to_active_controller(source_server, source_path,
             dest_path))
         return dest_path
 
+    cache = None if is_dir else ArtifactCache.get_cache(con_ssh)
+    if cache:
+        _copy_via_artifact_cache(
+            cache, source_server=source_server, source_path=source_path,
+            dest_path=dest_path, source_user=source_user,
+            source_password=source_password, timeout=timeout,
+            dest_ip=dest_ip)
+        return dest_path
+
     LOG.info('Create destination directory on tis server if not already exists')
     cmd = 'mkdir -p {}'.format(dest_dir)
     con_ssh.exec_cmd(cmd, fail_ok=False)
@@ -129,7 +145,6 @@ def _scp_from_remote_to_active_controller(source_server, source_path,
             'scp file from natbox {} to active controller'.format(nat_name))
         dest_user = HostLinuxUser.get_user()
         dest_pswd = HostLinuxUser.get_password()
-        dest_ip = ProjVar.get_var('LAB').get('floating ip')
         nat_ssh.scp_on_source(source_path=nat_dest_path, dest_user=dest_user,
                               dest_ip=dest_ip, dest_path=dest_path,
                               dest_password=dest_pswd, timeout=timeout,
@@ -144,6 +159,76 @@ def _scp_from_remote_to_active_controller(source_server, source_path,
 
     return dest_path
 
+
+def _is_vbox():
+    nat_name = ProjVar.get_var('NATBOX')
+    if nat_name:
+        nat_name = nat_name.get('name')
+    return bool(nat_name and (nat_name == 'localhost' or
+                              nat_name.startswith('128.224.')))
+
+
+def _copy_via_artifact_cache(cache, source_server, source_path, dest_path,
+                             source_user, source_password, timeout=900,
+                             dest_ip=None):
+    """
+    Copy a file from remote server to active controller via artifact cache.
+
+    File is only transferred if its content on source server is not already
+    cached. For VBox labs, file is cached on NatBox as well and only scp'ed
+    to active controller if that content is not cached on controller.
+
+    Args:
+        cache (ArtifactCache): cache on active controller
+        source_server (str):
+        source_path (str):
+        dest_path (str):
+        source_user (str):
+        source_password (str):
+        timeout (int):
+        dest_ip (str|None): ip to scp to from NatBox for VBox labs. Default
+            to lab floating ip.
+
+    Returns (str): checksum of the file
+
+    """
+    if not _is_vbox():
+        LOG.info("Fetch {} from {} to artifact cache on tis".format(
+            source_path, source_server))
+        checksum = cache.fetch(source_server=source_server,
+                               source_path=source_path,
+                               source_user=source_user,
+                               source_password=source_password,
+                               timeout=timeout)
+        cache.link(checksum, dest_path)
+        return checksum
+
+    LOG.info('VBox detected, fetch file to NatBox artifact cache')
+    nat_cache = ArtifactCache(NATBoxClient.get_natbox_client(),
+                              cache_dir=NATBOX_CACHE_DIR)
+    checksum = nat_cache.fetch(source_server=source_server,
+                               source_path=source_path,
+                               source_user=source_user,
+                               source_password=source_password,
+                               timeout=timeout)
+
+    if not cache.has(checksum):
+        LOG.info('scp file from NatBox artifact cache to active controller')
+        cache.create_dirs()
+        cache.evict(required_gib=nat_cache.get_size_gib(checksum))
+        con_cached_path = cache.get_source_path(source_server, source_path)
+        nat_cache.ssh_client.scp_on_source(
+            source_path=nat_cache.get_object_path(checksum),
+            dest_user=HostLinuxUser.get_user(),
+            dest_ip=dest_ip or ProjVar.get_var('LAB').get('floating ip'),
+            dest_path=con_cached_path,
+            dest_password=HostLinuxUser.get_password(), timeout=timeout)
+        cache.add(con_cached_path, checksum=checksum)
+
+    cache.link(checksum, dest_path)
+    return checksum
+
+
 def _scp_from_remote_to_active_controllers(source_server, source_path,
                                           dest_dir, dest_name=None,
                                           source_user=None,
@@ -151,14 +236,19 @@ def _scp_from_remote_to_active_controllers(source_server, source_path,
                                           timeout=900, cons_ssh=None,
                                           is_dir=False, ipv6=None):
     """
-    SCP file or files under a directory from remote server to TiS server
+    SCP file or files under a directory from remote server to multiple TiS
+    servers, e.g., system controller and subclouds.
+
+    File is only copied from remote server to the first active controller,
+    and relayed between active controllers concurrently from there. See
+    FileDistributor.
 
     Args:
         source_path (str): remote server file path or directory path
         dest_dir (str): destination directory. should end with '/'
         dest_name (str): destination file name if not dir
         timeout (int):
-        con_ssh:
+        cons_ssh (list|None):
         is_dir
 
     Returns (str|None): destination file/dir path if scp successful else None
@@ -176,51 +266,27 @@ def _scp_from_remote_to_active_controllers(source_server, source_path,
 
     dest_path = dest_dir if not dest_name else os.path.join(dest_dir, dest_name)
 
-    LOG.info('Create destination directory on tis server if not already exists')
-    cmd = 'mkdir -p {}'.format(dest_dir)
-    for con_ssh in cons_ssh:
-        if not con_ssh.file_exists(dest_path):
-            con_ssh.exec_cmd(cmd, fail_ok=False)
-        
-            nat_name = ProjVar.get_var('NATBOX')
-            if nat_name:
-                nat_name = nat_name.get('name')
-            if nat_name and (
-                    nat_name == 'localhost' or nat_name.startswith('128.224.')):
-                LOG.info('VBox detected, performing intermediate scp')
-        
-                nat_dest_path = '/tmp/{}'.format(dest_name)
-                nat_ssh = NATBoxClient.get_natbox_client()
-        
-                if not nat_ssh.file_exists(nat_dest_path):
-                    LOG.info("scp file from {} to NatBox: {}".format(nat_name,
-                                                                     source_server))
-                    nat_ssh.scp_on_dest(source_user=source_user,
-                                        source_ip=source_server,
-                                        source_path=source_path,
-                                        dest_path=nat_dest_path,
-                                        source_pswd=source_password, timeout=timeout,
-                                        is_dir=is_dir)
-        
-                LOG.info(
-                    'scp file from natbox {} to active controller'.format(nat_name))
-                dest_user = HostLinuxUser.get_user()
-                dest_pswd = HostLinuxUser.get_password()
-                dest_ip = con_ssh.host
-                nat_ssh.scp_on_source(source_path=nat_dest_path, dest_user=dest_user,
-                                      dest_ip=dest_ip, dest_path=dest_path,
-                                      dest_password=dest_pswd, timeout=timeout,
-                                      is_dir=is_dir)
-        
-            else:  # if not a VBox lab, scp from remote server directly to TiS server
-                LOG.info("scp file(s) from {} to tis".format(source_server))
-                con_ssh.scp_on_dest(source_user=source_user, source_ip=source_server,
-                                    source_path=source_path,
-                                    dest_path=dest_path, source_pswd=source_password,
-                                    timeout=timeout, is_dir=is_dir, ipv6=ipv6)
-        
+    def _fetch(con_ssh):
+        cache = None if is_dir else ArtifactCache.get_cache(con_ssh)
+        if cache:
+            # checksum of cached origin file to verify all destinations
+            return _copy_via_artifact_cache(
+                cache, source_server=source_server, source_path=source_path,
+                dest_path=dest_path, source_user=source_user,
+                source_password=source_password, timeout=timeout,
+                dest_ip=con_ssh.host)
+        _scp_from_remote_to_active_controller(
+            source_server=source_server, source_path=source_path,
+            dest_dir=dest_dir, dest_name=dest_name, source_user=source_user,
+            source_password=source_password, timeout=timeout,
+            con_ssh=con_ssh, is_dir=is_dir, ipv6=ipv6, dest_ip=con_ssh.host)
+
+    FileDistributor(cons_ssh, dest_path=dest_path, is_dir=is_dir,
+                    timeout=timeout).distribute(fetch_func=_fetch)
+
     return dest_path
 
+
 def scp_from_test_server_to_active_controller(source_path, dest_dir,
                                               dest_name=None, timeout=900,
                                               con_ssh=None,
@@ -1051,7 +1117,8 @@ def ssh_to_stx(lab=None, set_client=False):
     else:
         con_ssh = SSHClient(lab['floating ip'], user=HostLinuxUser.get_user(),
                             password=HostLinuxUser.get_password(),
-                            initial_prompt=Prompt.CONTROLLER_PROMPT)
+                            initial_prompt=Prompt.CONTROLLER_PROMPT,
+                            multiplex=ProjVar.get_var('SSH_MUX'))
 
     con_ssh.connect(retry=True, retry_timeout=30, use_current=False)
     if set_client:
@@ -19,6 +19,7 @@ from consts.timeout import ImageTimeout
 from keywords import common, system_helper, host_helper, dc_helper
 from testfixtures.fixture_resources import ResourceCleanup
 from utils import table_parser, cli, exceptions
+from utils.artifact_cache import ArtifactCache, get_avail_space
 from utils.clients.ssh import ControllerClient, get_cli_client
 from utils.tis_log import LOG
 
@@ -105,10 +106,7 @@ def get_avail_image_space(con_ssh, path='/opt/cgcs'):
     Returns (float): e.g., 9.2
 
     """
-    size = con_ssh.exec_cmd("df {} | awk '{{print $4}}'".format(path),
-                            fail_ok=False)[1]
-    size = float(size.splitlines()[-1].strip()) / (1024 * 1024)
-    return size
+    return get_avail_space(ssh_client=con_ssh, path=path)
 
 
 def is_image_storage_sufficient(img_file_path=None, guest_os=None,
@@ -836,7 +834,8 @@ def get_guest_image(guest_os, rm_image=True, check_disk=False, cleanup=None,
         centos_7, opensuse_11, tis-centos-guest,
                 cgcs-guest, vxworks-guest, debian-8-m-agent
         rm_image (bool): whether or not to rm image from image dir
-        after creating glance image
+        after creating glance image. Image stays in artifact cache if
+        enabled.
         check_disk (bool): whether to check if image storage disk is
         sufficient to create new glance image
         cleanup (str|None)
@@ -896,6 +895,10 @@ def get_guest_image(guest_os, rm_image=True, check_disk=False, cleanup=None,
             # image file should get removed
             if not con_ssh:
                 con_ssh = ControllerClient.get_active_controller()
+            cache = ArtifactCache.get_cache(con_ssh)
+            if cache:
+                # least recently used cached images share the file system
+                cache.evict(required_gib=img_file_size)
             avail_sysadmin_home = get_avail_image_space(con_ssh=con_ssh,
                                                         path=home_dir)
             if avail_sysadmin_home < img_file_size:
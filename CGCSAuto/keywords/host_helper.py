@@ -37,6 +37,8 @@ from consts.stx import HostAvailState, HostAdminState, HostOperState, \
 from utils import cli, exceptions, table_parser
 from utils.clients import telnet as telnetlib
 from utils.clients.ssh import ControllerClient, SSHFromSSH, SSHClient
+from utils.multi_thread import MThreadPool
+from utils.poller import Poller
 from utils.tis_log import LOG
 from keywords import system_helper, common, kube_helper, security_helper, \
     nova_helper
@@ -446,20 +448,30 @@ def wait_for_hosts_ready(hosts, fail_ok=False, check_task_affinity=False,
         auth_info=auth_info)
 
     res_lock = res_unlock = True
-    timeout_args = {'timeout': timeout} if timeout else {}
-    if check_interval:
-        timeout_args['check_interval'] = check_interval
+    # Locked and unlocked hosts are checked against one host-list query per
+    # poll, which is shared with other threads waiting for hosts.
+    lock_conds = [system_helper.get_host_condition(
+        host, con_ssh=con_ssh, auth_info=auth_info, duration=3,
+        availability=HostAvailState.ONLINE) for host in expt_online_hosts]
+    unlock_conds = [system_helper.get_host_condition(
+        host, con_ssh=con_ssh, auth_info=auth_info, duration=3,
+        availability=HostAvailState.AVAILABLE) for host in expt_avail_hosts]
+    if lock_conds or unlock_conds:
+        LOG.info("Wait for hosts to be online: {}; available: {}".format(
+            expt_online_hosts, expt_avail_hosts))
+        Poller.wait_for_conditions(lock_conds + unlock_conds,
+                                   timeout=timeout or HostTimeout.REBOOT,
+                                   check_interval=check_interval or 5)
+        res_lock = all(cond.met for cond in lock_conds)
+        res_unlock = all(cond.met for cond in unlock_conds)
+        if not (res_lock and res_unlock) and not fail_ok:
+            raise exceptions.HostTimeout(
+                "Timed out waiting for hosts ready: {}".format(', '.join(
+                    '{} (actual: {})'.format(cond, cond.actual) for cond in
+                    lock_conds + unlock_conds if not cond.met)))
+
     from keywords import kube_helper, container_helper
     if expt_online_hosts:
-        LOG.info("Wait for hosts to be online: {}".format(hosts))
-        res_lock = system_helper.wait_for_hosts_states(
-            expt_online_hosts,
-            availability=HostAvailState.ONLINE,
-            fail_ok=fail_ok,
-            con_ssh=con_ssh,
-            auth_info=auth_info,
-            **timeout_args)
-
         res_kube = kube_helper.wait_for_nodes_ready(hosts=expt_online_hosts,
                                                     timeout=30,
                                                     con_ssh=con_ssh,
@@ -486,15 +498,6 @@ def wait_for_hosts_ready(hosts, fail_ok=False, check_task_affinity=False,
         controllers = list(
             set(hosts_per_personality['controller']) & set(expt_avail_hosts))
 
-        LOG.info("Wait for hosts to be available: {}".format(hosts))
-        res_unlock = system_helper.wait_for_hosts_states(
-            expt_avail_hosts,
-            availability=HostAvailState.AVAILABLE,
-            fail_ok=fail_ok,
-            con_ssh=con_ssh,
-            auth_info=auth_info,
-            **timeout_args)
-
         if res_unlock:
             res_1 = wait_for_task_clear_and_subfunction_ready(
                 hosts,
@@ -1492,6 +1495,7 @@ def swact_host(hostname=None, swact_start_timeout=HostTimeout.SWACT,
             auth_info=auth_info,
             swact_complete_timeout=swact_complete_timeout, fail_ok=fail_ok)
     if rtn[0] == 0:
+        cli.invalidate_auth_cache(reason='Swacted from {}'.format(hostname))
         nova_auth = Tenant.get('admin', dc_region=auth_info.get(
             'region') if auth_info else None)
         try:
@@ -3401,11 +3405,12 @@ def get_hosts_per_storage_backing(up_only=True, con_ssh=None,
             post_instance_backings.items() if set(hosts_) & set(hosts)}
 
 
-def get_coredumps_and_crashreports(move=True):
+def get_coredumps_and_crashreports(move=True, max_workers=5):
     """
     Get core dumps and crash reports from every host
     Args:
         move: whether to move coredumps and crashreports to local automation dir
+        max_workers (int): max number of hosts to check concurrently
 
     Returns (dict):
 
@@ -3417,46 +3422,29 @@ def get_coredumps_and_crashreports(move=True):
         availability=(HostAvailState.FAILED, HostAvailState.OFFLINE),
         exclude=True)
 
-    core_dumps_and_reports = {}
     active_con = system_helper.get_active_controller_name()
     con_ssh = ControllerClient.get_active_controller()
     con_dir = '{}/coredumps_and_crashreports/'.format(HostLinuxUser.get_home())
     con_ssh.exec_cmd('mkdir -p {}'.format(con_dir))
+
+    if len(hosts_to_check) > 1:
+        # hosts are reached via controller only
+        with MThreadPool(max_workers=min(max_workers, len(hosts_to_check)),
+                         natbox=False) as pool:
+            results = pool.map(_get_host_coredumps_and_crashreports,
+                               hosts_to_check, [active_con] *
+                               len(hosts_to_check), [con_dir] *
+                               len(hosts_to_check), [move] *
+                               len(hosts_to_check))
+    else:
+        results = [_get_host_coredumps_and_crashreports(
+            host, active_con, con_dir, move) for host in hosts_to_check]
+
+    core_dumps_and_reports = {}
     scp_to_local = False
-    ls_cmd = 'ls -l --time-style=+%Y-%m-%d_%H-%M-%S {} | grep --color=never ' \
-             '-v total'
-    core_dump_dir = '/var/lib/systemd/coredump/'
-    crash_report_dir = '/var/crash/'
-    for host in hosts_to_check:
-        with ssh_to_host(hostname=host) as host_ssh:
-            core_dumps_and_reports[host] = []
-
-            for failure_dir in (core_dump_dir, crash_report_dir):
-                failures = host_ssh.exec_cmd(ls_cmd.format(failure_dir),
-                                             fail_ok=True)[1].splitlines()
-                core_dumps_and_reports[host].append(failures)
-
-            if move and failures:
-                for line in failures:
-                    timestamp, name = line.split(sep=' ')[-2:]
-                    new_name = '_'.join((host, timestamp, name))
-                    host_ssh.exec_sudo_cmd(
-                        'mv {}/{} {}/{}'.format(failure_dir, name, failure_dir,
-                                                new_name),
-                        fail_ok=False)
-
-                scp_to_local = True
-                if host_ssh.get_hostname() != active_con:
-                    host_ssh.scp_on_source(
-                        source_path='{}/*'.format(failure_dir),
-                        dest_user=HostLinuxUser.get_user(),
-                        dest_ip=active_con, dest_path=con_dir,
-                        dest_password=HostLinuxUser.get_password())
-                else:
-                    host_ssh.exec_sudo_cmd(
-                        'cp -r {}/* {}'.format(failure_dir, con_dir),
-                        fail_ok=False)
-                host_ssh.exec_sudo_cmd('rm -rf {}/*'.format(failure_dir))
+    for host, (failures, moved) in zip(hosts_to_check, results):
+        core_dumps_and_reports[host] = failures
+        scp_to_local = scp_to_local or moved
 
     if scp_to_local:
         con_ssh.exec_sudo_cmd('chmod -R 755 {}'.format(con_dir))
@@ -3475,6 +3463,51 @@ def get_coredumps_and_crashreports(move=True):
     return core_dumps_and_reports
 
 
+def _get_host_coredumps_and_crashreports(host, active_con, con_dir, move):
+    """
+    Get core dumps and crash reports on given host, and optionally move them
+    to con_dir on active controller
+
+    Returns (tuple): (<failures per dir(list)>, <moved(bool)>)
+
+    """
+    ls_cmd = 'ls -l --time-style=+%Y-%m-%d_%H-%M-%S {} | grep --color=never ' \
+             '-v total'
+    core_dump_dir = '/var/lib/systemd/coredump/'
+    crash_report_dir = '/var/crash/'
+    host_failures = []
+    moved = False
+    with ssh_to_host(hostname=host) as host_ssh:
+        for failure_dir in (core_dump_dir, crash_report_dir):
+            failures = host_ssh.exec_cmd(ls_cmd.format(failure_dir),
+                                         fail_ok=True)[1].splitlines()
+            host_failures.append(failures)
+
+        if move and failures:
+            for line in failures:
+                timestamp, name = line.split(sep=' ')[-2:]
+                new_name = '_'.join((host, timestamp, name))
+                host_ssh.exec_sudo_cmd(
+                    'mv {}/{} {}/{}'.format(failure_dir, name, failure_dir,
+                                            new_name),
+                    fail_ok=False)
+
+            moved = True
+            if host_ssh.get_hostname() != active_con:
+                host_ssh.scp_on_source(
+                    source_path='{}/*'.format(failure_dir),
+                    dest_user=HostLinuxUser.get_user(),
+                    dest_ip=active_con, dest_path=con_dir,
+                    dest_password=HostLinuxUser.get_password())
+            else:
+                host_ssh.exec_sudo_cmd(
+                    'cp -r {}/* {}'.format(failure_dir, con_dir),
+                    fail_ok=False)
+            host_ssh.exec_sudo_cmd('rm -rf {}/*'.format(failure_dir))
+
+    return host_failures, moved
+
+
 def modify_mtu_on_interface(host, interface, mtu_val, network_type='data',
                             lock_unlock=True, fail_ok=False, con_ssh=None):
     mtu_val = int(mtu_val)
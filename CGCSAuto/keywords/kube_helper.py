@@ -12,6 +12,7 @@ import time
 import yaml
 
 from utils import table_parser, exceptions
+from utils.kube_watch import PodWatcher, parse_labels, match_pod
 from utils.tis_log import LOG
 from utils.clients.ssh import ControllerClient
 from keywords import common, system_helper
@@ -60,6 +61,24 @@ def exec_kube_cmd(sub_cmd, args=None, con_ssh=None, fail_ok=False, grep=None):
         raise exceptions.KubeCmdError('CMD: {} Output: {}'.format(cmd, out))
 
 
+def _wait_with_watcher(check_func, timeout, labels=None, con_ssh=None):
+    """
+    Wait for pods via kubectl watch if available
+
+    Returns (tuple|None): (<met>, <info>). None if watch cannot be used, in
+        which case caller should poll instead.
+
+    """
+    if labels and parse_labels(labels) is None:
+        # only equality based label selectors are supported by watcher
+        return None
+
+    watcher = PodWatcher.get_watcher(con_ssh=con_ssh)
+    if not watcher:
+        return None
+    return watcher.wait_for(check_func, timeout=timeout)
+
+
 def __get_resource_tables(namespace=None, all_namespaces=None,
                           resource_types=None, resource_names=None,
                           labels=None, field_selectors=None, wide=True,
@@ -120,6 +139,17 @@ def get_unhealthy_pods(field='NAME', namespace=None, all_namespaces=True,
     Returns (list):
 
     """
+    if field == 'NAME' and not (pod_names or exclude or kwargs):
+        # served from pod watcher cache if available
+        labels_dict = parse_labels(labels)
+        watcher = PodWatcher.get_watcher(con_ssh=con_ssh) if \
+            labels_dict is not None else None
+        if watcher and watcher.synced:
+            return [pod['name'] for pod in watcher.get_pods().values() if
+                    pod['phase'] not in ('Running', 'Succeeded') and
+                    match_pod(pod, namespace=None if all_namespaces else
+                              namespace or 'default', labels=labels_dict)]
+
     field_selector = 'status.phase!=Running,status.phase!=Succeeded'
     return get_pods(field=field, namespace=namespace,
                     all_namespaces=all_namespaces, pod_names=pod_names,
@@ -336,6 +366,7 @@ def wait_for_pods_status(pod_names=None, partial_names=None, labels=None,
 
     """
 
+    use_watch = not kwargs
     pods_to_check = []
     if pod_names:
         if isinstance(pod_names, str):
@@ -355,6 +386,41 @@ def wait_for_pods_status(pod_names=None, partial_names=None, labels=None,
     actual_status = {}
     end_time = time.time() + timeout
 
+    if use_watch:
+        # kubectl get without --all-namespaces only returns pods in default
+        # namespace
+        labels_dict = parse_labels(labels)
+
+        def _check_pods(pods):
+            matched = {pod['name']: pod['status'] for pod in pods.values() if
+                       match_pod(pod, namespace=namespace or 'default',
+                                 pod_names=pod_names,
+                                 partial_names=partial_names,
+                                 labels=labels_dict)}
+            if not matched:
+                return False, matched
+            bad_pods = [pod_name for pod_name, pod_status in matched.items()
+                        if status and pod_status not in status]
+            if pod_names:
+                missing = [pod_name for pod_name in pod_names if
+                           pod_name not in matched]
+            elif partial_names:
+                missing = [partial_name for partial_name in partial_names if
+                           not any(partial_name in pod_name for pod_name in
+                                   matched if pod_name not in bad_pods)]
+            else:
+                missing = []
+            return not bad_pods and not missing, matched
+
+        res = _wait_with_watcher(_check_pods, timeout=timeout, labels=labels,
+                                 con_ssh=con_ssh)
+        if res is not None:
+            met, actual_status = res
+            if met:
+                LOG.info('Pods in expected status: {}'.format(actual_status))
+                return True, actual_status
+            end_time = time.time()
+
     while time.time() < end_time:
         pod_full_names = pods_to_check if pod_names else None
         pods_values = get_pods(pod_names=pod_full_names,
@@ -444,6 +510,25 @@ def wait_for_resources_gone(resource_names=None, resource_type='pod',
     end_time = time.time() + timeout
     resources_to_check = resource_names
 
+    if resource_type == 'pod' and resource_names and not kwargs and \
+            not exclude:
+        if isinstance(resource_names, str):
+            resource_names = [resource_names]
+
+        def _check_pods(pods):
+            remaining = [pod['name'] for pod in pods.values() if
+                         match_pod(pod, namespace=namespace or 'default',
+                                   pod_names=resource_names)]
+            return not remaining, remaining
+
+        res = _wait_with_watcher(_check_pods, timeout=timeout,
+                                 con_ssh=con_ssh)
+        if res is not None:
+            met, resources_to_check = res
+            if met:
+                return True, resources_to_check
+            end_time = time.time()
+
     while time.time() < end_time:
 
         resources_to_check = get_resources(resource_names=resources_to_check,
@@ -762,6 +847,24 @@ def wait_for_pods_healthy(pod_names=None, namespace=None, all_namespaces=True,
 
     bad_pods = None
     end_time = time.time() + timeout
+    if not kwargs and not exclude:
+        ready_check_names = [pod for pod in pod_names if
+                             not re.search('audit-|init-', pod)] if \
+            pod_names else None
+        res = _wait_with_watcher(
+            _get_pods_health_check(namespace=namespace,
+                                   all_namespaces=all_namespaces,
+                                   pod_names=pod_names, labels=labels,
+                                   ready_check_names=ready_check_names),
+            timeout=timeout, labels=labels, con_ssh=con_ssh)
+        if res is not None:
+            met, bad_pods = res
+            if met:
+                LOG.info("Pods are Completed or Running, and Running pods "
+                         "are ready.")
+                return True
+            end_time = time.time()
+
     while time.time() < end_time:
         bad_pods_info = get_unhealthy_pods(labels=labels,
                                            field=('NAME', 'STATUS'),
@@ -820,6 +923,27 @@ def wait_for_running_pods_ready(pod_names=None, namespace=None,
     Returns (bool):
 
     """
+    if not kwargs and not exclude:
+        if isinstance(pod_names, str):
+            pod_names = [pod_names]
+        res = _wait_with_watcher(
+            _get_pods_health_check(namespace=namespace,
+                                   all_namespaces=all_namespaces,
+                                   pod_names=pod_names, labels=labels,
+                                   ready_check_names=pod_names,
+                                   check_phase=False),
+            timeout=timeout, labels=labels, con_ssh=con_ssh)
+        if res is not None:
+            met, unready_pods = res
+            if met:
+                return True
+            msg = "Some pods are not ready within {}s: {}".format(
+                timeout, unready_pods)
+            LOG.warning(msg)
+            if fail_ok:
+                return False
+            raise exceptions.KubeError(msg)
+
     unready_pods = get_unready_running_pods(namespace=namespace,
                                             all_namespaces=all_namespaces,
                                             pod_names=pod_names, labels=labels,
@@ -850,6 +974,36 @@ def wait_for_running_pods_ready(pod_names=None, namespace=None,
     raise exceptions.KubeError(msg)
 
 
+def _get_pods_health_check(namespace=None, all_namespaces=False,
+                           pod_names=None, labels=None,
+                           ready_check_names=None, check_phase=True):
+    """
+    Get check function for PodWatcher.wait_for() that checks pods are
+    Running or Completed, and Running pods are ready.
+    """
+    if not namespace and not all_namespaces:
+        namespace = 'default'
+    labels = parse_labels(labels)
+
+    def _check_pods(pods):
+        bad_pods = {}
+        for pod in pods.values():
+            if not match_pod(pod, namespace=namespace, pod_names=pod_names,
+                             labels=labels):
+                continue
+            if check_phase and pod['phase'] not in ('Running', 'Succeeded'):
+                bad_pods[pod['name']] = pod['status']
+            elif pod['phase'] == 'Running' and \
+                    (ready_check_names is None or
+                     pod['name'] in ready_check_names):
+                ready_count, total_count = pod['ready'].split('/')
+                if ready_count != total_count:
+                    bad_pods[pod['name']] = pod['ready']
+        return not bad_pods, bad_pods
+
+    return _check_pods
+
+
 def get_unready_running_pods(pod_names=None, namespace=None,
                              all_namespaces=False, labels=None,
                              con_ssh=None, exclude=False, strict=False,
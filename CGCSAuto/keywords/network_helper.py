@@ -27,6 +27,11 @@ from utils import table_parser, cli, exceptions
 from utils.clients.ssh import NATBoxClient, get_cli_client, ControllerClient
 from utils.tis_log import LOG
 
+# (<cli table header>, <REST json key>) pairs for REST backend
+NETWORK_LIST_REST_FIELDS = (('ID', 'id'),
+                            ('Name', 'name'),
+                            ('Subnets', lambda net: ', '.join(net['subnets'])))
+
 
 def is_valid_ip_address(ip=None):
     """
@@ -445,7 +450,7 @@ def get_subnets(field='ID', long=False, network=None, subnet_range=None,
 
     table_ = table_parser.table(
         cli.openstack('subnet list', args, ssh_client=con_ssh,
-                      auth_info=auth_info)[1])
+                      auth_info=auth_info, output_format='json')[1])
     if name is not None:
         table_ = table_parser.filter_table(table_, strict=strict, regex=regex,
                                            name=name)
@@ -2579,6 +2584,53 @@ def ping_server(server, ssh_client, num_pings=5, timeout=60,
     return packet_loss_rate, untransmitted_packets
 
 
+__PING_RES_MATCH = re.compile(r'^PING_RES (\S+) (\d+) packets transmitted.*\D(\d{1,3})(?:\.\d+)?% packet loss',
+                              re.MULTILINE)
+
+
+def ping_servers(servers, ssh_client, num_pings=5, timeout=60):
+    """
+    Ping given servers concurrently in one remote command, and parse the packet
+    loss rates of all servers from its output.
+
+    Args:
+        servers (list|tuple|str): server ips to ping
+        ssh_client (SSHClient): ping from this ssh client
+        num_pings (int):
+        timeout (int): max time to wait for ping response in seconds
+
+    Returns (dict): {<server_ip>: <packet_loss_rate (0-100)>(int), ...}.
+        Loss rate is 100 if no ping summary is found for a server.
+
+    """
+    if isinstance(servers, str):
+        servers = [servers]
+    servers = list(servers)
+    if not servers:
+        return {}
+
+    LOG.info('Ping {} from host {}'.format(servers, ssh_client.host))
+    # each ping runs in background and reports its summary line prefixed by
+    # the server ip. -w bounds each ping so the command ends within timeout.
+    cmd = 'for ip in {}; do (echo "PING_RES $ip $(ping -c {} -w {} $ip 2>&1 | grep "packets transmitted")") & ' \
+          'done; wait'.format(' '.join(servers), num_pings, max(int(timeout), num_pings))
+    output = ssh_client.exec_cmd(cmd=cmd, expect_timeout=timeout + 30, fail_ok=True)[1]
+
+    loss_rates = {server: 100 for server in servers}
+    for server, transmitted, loss_rate in __PING_RES_MATCH.findall(output):
+        if server in loss_rates and int(transmitted) > 0:
+            loss_rates[server] = int(loss_rate)
+
+    failed = [server for server, loss_rate in loss_rates.items() if loss_rate == 100]
+    dropped = [server for server, loss_rate in loss_rates.items() if 0 < loss_rate < 100]
+    if dropped:
+        LOG.warning("Some packets dropped when ping from {} ssh session to {}. Packet loss rates: {}".
+                    format(ssh_client.host, dropped, loss_rates))
+    if failed:
+        LOG.warning("Ping from {} to {} failed.".format(ssh_client.host, failed))
+    return loss_rates
+
+
 def get_pci_vm_network(pci_type='pci-sriov', net_name=None, strict=False,
                        con_ssh=None, auth_info=Tenant.get('admin'),
                        rtn_all=False):
@@ -3869,9 +3921,17 @@ def get_networks(field='ID', long=False, full_name=None, external=None,
         '--not-any-tags': not_any_tags,
     }
     args = common.parse_args(args_dict, repeat_arg=False, vals_sep=',')
-    table_ = table_parser.table(
-        cli.openstack('network list', args, ssh_client=con_ssh,
-                      auth_info=auth_info)[1])
+
+    from utils import rest
+    table_ = None
+    if not args and rest.use_rest_backend(auth_info=auth_info):
+        table_ = rest.get_table('neutron', '/v2.0/networks', 'networks',
+                                field_map=NETWORK_LIST_REST_FIELDS,
+                                fail_ok=True)
+    if table_ is None:
+        table_ = table_parser.table(
+            cli.openstack('network list', args, ssh_client=con_ssh,
+                          auth_info=auth_info, output_format='json')[1])
 
     filters = {'name': name, 'subnets': subnets, 'id': net_id}
     filters = {k: v for k, v in filters.items() if str(v)}
@@ -6,8 +6,10 @@
 
 
 import ipaddress
+import json
 import re
 import os
+import threading
 import time
 
 from pytest import skip
@@ -18,10 +20,25 @@ from consts.proj_vars import ProjVar
 from consts.timeout import SysInvTimeout, MiscTimeout, HostTimeout
 from utils import cli, table_parser, exceptions
 from utils.clients.ssh import ControllerClient
+from utils.poller import Poller, Condition
 from utils.tis_log import LOG
 from testfixtures.fixture_resources import ResourceCleanup
 from keywords import common
 
+# (<cli table header>, <REST json key>) pairs for REST backend
+HOST_LIST_REST_FIELDS = (('id', 'id'),
+                         ('hostname', 'hostname'),
+                         ('personality', 'personality'),
+                         ('administrative', 'administrative'),
+                         ('operational', 'operational'),
+                         ('availability', 'availability'))
+ALARM_LIST_REST_FIELDS = (('UUID', 'uuid'),
+                          ('Alarm ID', 'alarm_id'),
+                          ('Reason Text', 'reason_text'),
+                          ('Entity ID', 'entity_instance_id'),
+                          ('Severity', 'severity'),
+                          ('Time Stamp', 'timestamp'))
+
 
 def get_sys_type(con_ssh=None, use_telnet=False, con_telnet=None):
     """
@@ -281,16 +298,8 @@ def get_hosts(personality=None, administrative=None, operational=None,
     Returns (list): hosts
 
     """
-    if not con_ssh and not use_telnet:
-        con_name = auth_info.get('region') if \
-            (auth_info and ProjVar.get_var('IS_DC')) else None
-        con_ssh = ControllerClient.get_active_controller(name=con_name)
-
-    table_ = table_parser.table(
-        cli.system('host-list', ssh_client=con_ssh, use_telnet=use_telnet,
-                   con_telnet=con_telnet,
-                   auth_info=auth_info)[1])
-
+    table_ = _get_hosts_table(con_ssh=con_ssh, use_telnet=use_telnet,
+                              con_telnet=con_telnet, auth_info=auth_info)
     table_ = table_parser.filter_table(table_, exclude=True, hostname='None')
     if hostname:
         table_ = table_parser.filter_table(table_, hostname=hostname)
@@ -321,6 +330,71 @@ def get_hosts(personality=None, administrative=None, operational=None,
     return hostnames
 
 
+def _get_hosts_table(con_ssh=None, use_telnet=False, con_telnet=None,
+                     auth_info=Tenant.get('admin_platform')):
+    """
+    Get system host-list table. This is registered as 'host' resource type in
+    Poller.
+    """
+    if not con_ssh and not use_telnet:
+        con_name = auth_info.get('region') if \
+            (auth_info and ProjVar.get_var('IS_DC')) else None
+        con_ssh = ControllerClient.get_active_controller(name=con_name)
+
+    from utils import rest
+    if rest.use_rest_backend(auth_info=auth_info, use_telnet=use_telnet):
+        table_ = rest.get_table('sysinv', '/ihosts', 'ihosts',
+                                field_map=HOST_LIST_REST_FIELDS, platform=True,
+                                fail_ok=True)
+        if table_ is not None:
+            return table_
+
+    return table_parser.table(
+        cli.system('host-list', ssh_client=con_ssh, use_telnet=use_telnet,
+                   con_telnet=con_telnet, auth_info=auth_info)[1])
+
+
+Poller.register('host', _get_hosts_table)
+
+
+def get_host_condition(host, con_ssh=None, auth_info=Tenant.get('admin_platform'),
+                       duration=0, **states):
+    """
+    Get a Poller condition for host to reach given state(s) in system host-list
+
+    Args:
+        host (str): hostname
+        con_ssh (SSHClient|None):
+        auth_info (dict):
+        duration (int|float): host has to stay in given state(s) for at least
+            <duration> seconds. i.e., in all checks within the duration.
+        **states: such as availability=['available', 'degraded']
+
+    Returns (Condition):
+
+    """
+    states = {k: [v] if isinstance(v, str) else list(v) for k, v in
+              states.items()}
+    in_states_since = [None]
+
+    def _check(table_):
+        actual = table_parser.get_multi_values(table_, list(states.keys()),
+                                               rtn_dict=True, hostname=host)
+        actual = {k: v[0] if v else None for k, v in actual.items()}
+        if not all(actual[k] in v for k, v in states.items()):
+            in_states_since[0] = None
+            return False, actual
+
+        now = time.time()
+        if in_states_since[0] is None:
+            in_states_since[0] = now
+        return now - in_states_since[0] >= duration, actual
+
+    return Condition('host', _check,
+                     name='{} in states {}'.format(host, states),
+                     con_ssh=con_ssh, auth_info=auth_info)
+
+
 def get_hosts_per_personality(availability=None, administrative=None,
                               operational=None, con_ssh=None,
                               auth_info=Tenant.get('admin_platform'),
@@ -477,6 +551,23 @@ def get_alarms_table(uuid=True, show_suppress=False, query_key=None,
     if mgmt_affecting:
         args += ' --mgmt_affecting'
 
+    from utils import rest
+    if rest.use_rest_backend(auth_info=auth_info, use_telnet=use_telnet):
+        params = {'include_suppress': show_suppress}
+        if query_key:
+            params.update({'q.field': query_key, 'q.op': 'eq',
+                           'q.value': query_value})
+            if query_type:
+                params['q.type'] = query_type
+        if mgmt_affecting:
+            params['mgmt_affecting'] = True
+        field_map = ALARM_LIST_REST_FIELDS if uuid else \
+            ALARM_LIST_REST_FIELDS[1:]
+        table_ = rest.get_table('fm', '/alarms', 'alarms', field_map=field_map,
+                                platform=True, params=params, fail_ok=True)
+        if table_ is not None:
+            return table_
+
     fail_ok = True
     if not retry:
         fail_ok = False
@@ -498,6 +589,9 @@ def get_alarms_table(uuid=True, show_suppress=False, query_key=None,
                                      'retries: {}'.format(retry, output))
 
 
+Poller.register('alarm', get_alarms_table)
+
+
 def get_alarms(fields=('Alarm ID', 'Entity ID'), alarm_id=None,
                reason_text=None, entity_id=None,
                severity=None, time_stamp=None, strict=False,
@@ -1113,37 +1207,33 @@ def wait_for_alarm(field='Alarm ID', alarm_id=None, entity_id=None, reason=None,
     if entity_id and isinstance(entity_id, str):
         entity_id = [entity_id]
 
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        current_alarms_tab = get_alarms_table(con_ssh=con_ssh,
-                                              auth_info=auth_info,
-                                              use_telnet=use_telnet,
-                                              con_telnet=con_telnet)
+    def _check(current_alarms_tab):
         if kwargs:
             current_alarms_tab = table_parser.filter_table(
                 table_=current_alarms_tab, strict=strict, regex=regex,
                 **kwargs)
-        if entity_id:
-            val = []
-            for entity in entity_id:
-                entity_filter = {'Entity ID': entity}
-                val_ = table_parser.get_values(current_alarms_tab, field,
-                                               strict=strict, regex=regex,
-                                               **entity_filter)
-                if not val_:
-                    LOG.info(
-                        "Alarm for entity {} has not appeared".format(entity))
-                    time.sleep(check_interval)
-                    continue
-                val += val_
-        else:
+        if not entity_id:
             val = table_parser.get_values(current_alarms_tab, field)
-
-        if val:
-            LOG.info('Expected alarm appeared. Filters: {}'.format(kwargs))
-            return True, val
-
-        time.sleep(check_interval)
+            return bool(val), val
+
+        val = []
+        for entity in entity_id:
+            val_ = table_parser.get_values(current_alarms_tab, field,
+                                           strict=strict, regex=regex,
+                                           **{'Entity ID': entity})
+            if not val_:
+                LOG.info("Alarm for entity {} has not appeared".format(entity))
+                return False, None
+            val += val_
+        return True, val
+
+    cond = Condition('alarm', _check, name='alarm {}'.format(kwargs),
+                     con_ssh=con_ssh, auth_info=auth_info,
+                     use_telnet=use_telnet, con_telnet=con_telnet)
+    if Poller.wait_for_conditions(cond, timeout=timeout,
+                                  check_interval=check_interval)[0]:
+        LOG.info('Expected alarm appeared. Filters: {}'.format(kwargs))
+        return True, cond.actual
 
     entity_str = ' for entity {}'.format(entity_id) if entity_id else ''
     err_msg = "Alarm {}{} did not appear in fm alarm-list within {} " \
@@ -1271,6 +1361,282 @@ def wait_for_all_alarms_gone(timeout=120, check_interval=3, fail_ok=False,
             raise exceptions.TimeoutException(err_msg)
 
 
+class AlarmTracker:
+    """
+    Track active alarms in memory from 'fm event-list' deltas.
+
+    A baseline is taken from 'fm alarm-list' once. Each update then only
+    queries alarm set/clear events since the last seen event timestamp, so
+    before/after alarm checks do not need to list all active alarms again.
+    Named snapshots are kept in memory and saved to
+    <log_dir>/alarm_snapshots.json.
+
+    e.g.,
+        tracker = AlarmTracker.get_tracker()
+        if tracker:
+            before_alarms = tracker.take_snapshot('function')
+            ...
+            new_alarms, cleared_alarms = tracker.diff('function')
+    """
+    __trackers = {}
+    __lock = threading.Lock()
+
+    def __init__(self, host, con_ssh=None,
+                 auth_info=Tenant.get('admin_platform'), limit=500):
+        """
+
+        Args:
+            host (str): floating ip of the system
+            con_ssh (SSHClient|None): active controller client of current
+                thread is used if None, so tracker can be shared by threads
+            auth_info (dict):
+            limit (int): max events to fetch per update. Full alarm-list is
+                used instead if more events than this are returned.
+        """
+        self.host = host
+        self.con_ssh = con_ssh
+        self.con_name = auth_info.get('region') if auth_info and \
+            ProjVar.get_var('IS_DC') else None
+        self.auth_info = auth_info
+        self.limit = limit
+        # {(<alarm_id>, <entity_id>), ...}
+        self.alarms = set()
+        # {<name>: [<alarm_id>::::<entity_id>, ...]}
+        self.snapshots = {}
+        self.stats = {'updates': 0, 'resyncs': 0, 'events': 0}
+        self.last_timestamp = None
+        self._last_uuids = set()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def get_tracker(cls, con_ssh=None, auth_info=Tenant.get('admin_platform')):
+        """
+        Get alarm tracker for the system of given ssh client and region
+
+        Args:
+            con_ssh (SSHClient|None):
+            auth_info (dict|None):
+
+        Returns (AlarmTracker|None): None if alarm tracking is disabled
+
+        """
+        if not ProjVar.get_var('ALARM_TRACKER'):
+            return None
+        host = con_ssh.host if con_ssh else None
+        if not host:
+            con_name = auth_info.get('region') if auth_info and \
+                ProjVar.get_var('IS_DC') else None
+            host = ControllerClient.get_active_controller(name=con_name).host
+
+        key = (host, auth_info.get('region') if auth_info else None)
+        with cls.__lock:
+            tracker = cls.__trackers.get(key)
+            if tracker is None:
+                tracker = cls.__trackers[key] = cls(host, con_ssh=con_ssh,
+                                                    auth_info=auth_info)
+        return tracker
+
+    @classmethod
+    def clear_trackers(cls):
+        cls.__trackers.clear()
+
+    def _get_con_ssh(self):
+        if self.con_ssh:
+            return self.con_ssh
+        return ControllerClient.get_active_controller(name=self.con_name)
+
+    def _get_system_time(self):
+        # fm event timestamps are in UTC
+        return self._get_con_ssh().exec_cmd("date -u '+%Y-%m-%dT%H:%M:%S'",
+                                     fail_ok=False)[1].strip()
+
+    def resync(self):
+        """
+        Reload active alarms from fm alarm-list
+
+        """
+        with self._lock:
+            last_timestamp = self._get_system_time()
+            alarms_tab = get_alarms_table(uuid=False,
+                                          con_ssh=self._get_con_ssh(),
+                                          auth_info=self.auth_info)
+            self.alarms = set(_get_alarms(alarms_tab))
+            self.last_timestamp = last_timestamp
+            self._last_uuids = set()
+            self.stats['resyncs'] += 1
+
+    def update(self):
+        """
+        Apply alarm set/clear events since last update. Fall back to full
+        alarm-list if events cannot be fetched or too many events occurred.
+
+        Returns (tuple): (<new alarms(list)>, <cleared alarms(list)>) since
+            last update. e.g., ([('100.101', 'host=controller-0')], [])
+
+        """
+        with self._lock:
+            return self._update()
+
+    def _update(self):
+        pre_alarms = set(self.alarms)
+        if self.last_timestamp is None:
+            self.resync()
+            return sorted(self.alarms), []
+
+        self.stats['updates'] += 1
+        try:
+            start = self.last_timestamp[:19].replace('-', '').replace(
+                'T', ' ')
+            events_tab = get_events_table(limit=self.limit, show_uuid=True,
+                                          show_only='alarms', start=start,
+                                          con_ssh=self._get_con_ssh(),
+                                          auth_info=self.auth_info)
+            events = table_parser.get_multi_values(
+                events_tab, fields=('UUID', 'Time Stamp', 'State',
+                                    'Event Log ID', 'Entity Instance ID'),
+                zip_values=True)
+        except Exception as e:
+            LOG.warning("Failed to get alarm events, reload alarm list. "
+                        "{}".format(e.__str__()))
+            events = None
+
+        if events is None or len(events) >= self.limit:
+            self.resync()
+        else:
+            # start query is inclusive at seconds level. Skip events applied
+            # in last update.
+            events = [event for event in events if event[0] not in
+                      self._last_uuids and event[1][:19] >=
+                      self.last_timestamp[:19]]
+            for uuid, timestamp, state, alarm_id, entity_id in sorted(
+                    events, key=lambda event_: event_[1]):
+                alarm = (alarm_id, entity_id)
+                if state == 'set':
+                    self.alarms.add(alarm)
+                elif state == 'clear':
+                    self.alarms.discard(alarm)
+
+            self.stats['events'] += len(events)
+            if events:
+                last_timestamp = max(event[1] for event in events)
+                if last_timestamp[:19] != self.last_timestamp[:19]:
+                    self._last_uuids = set()
+                self.last_timestamp = last_timestamp
+                self._last_uuids.update(
+                    event[0] for event in events if
+                    event[1][:19] == last_timestamp[:19])
+
+        return sorted(self.alarms - pre_alarms), sorted(pre_alarms -
+                                                        self.alarms)
+
+    def get_alarms(self, update=True, combine_entries=True):
+        """
+        Get active alarms
+
+        Args:
+            update (bool): whether to apply new events before returning
+            combine_entries (bool): return alarms in format
+                <alarm_id>::::<entity_id> if True, else list of tuples
+
+        Returns (list):
+
+        """
+        with self._lock:
+            if update:
+                self._update()
+            alarms = sorted(self.alarms)
+        if combine_entries:
+            alarms = ['::::'.join(alarm) for alarm in alarms]
+        return alarms
+
+    def take_snapshot(self, name, update=True):
+        """
+        Save current active alarms under given name
+
+        Args:
+            name (str): such as session, module, function
+            update (bool):
+
+        Returns (list): active alarms in format <alarm_id>::::<entity_id>
+
+        """
+        alarms = self.get_alarms(update=update)
+        self.snapshots[name] = alarms
+        self.save()
+        return list(alarms)
+
+    def get_snapshot(self, name):
+        alarms = self.snapshots.get(name)
+        return list(alarms) if alarms is not None else None
+
+    def diff(self, name, update=True):
+        """
+        Compare active alarms with given snapshot
+
+        Args:
+            name (str): snapshot name
+            update (bool):
+
+        Returns (tuple): (<new alarms(list)>, <cleared alarms(list)>) in
+            format <alarm_id>::::<entity_id>
+
+        """
+        before_alarms = self.snapshots[name]
+        after_alarms = self.get_alarms(update=update)
+        return [alarm for alarm in after_alarms if alarm not in
+                before_alarms], [alarm for alarm in before_alarms if
+                                 alarm not in after_alarms]
+
+    def save(self):
+        log_dir = ProjVar.get_var('LOG_DIR')
+        if not log_dir:
+            return
+        try:
+            with open(os.path.join(log_dir, 'alarm_snapshots.json'),
+                      mode='w') as f:
+                json.dump({'host': self.host,
+                           'last_timestamp': self.last_timestamp,
+                           'snapshots': self.snapshots,
+                           'stats': self.stats}, f, indent=2)
+        except OSError as e:
+            LOG.debug("Failed to save alarm snapshots: {}".format(e))
+
+    def wait_for_alarms_gone(self, alarms, timeout=120, check_interval=3,
+                             fail_ok=False):
+        """
+        Wait for given alarms to be cleared
+
+        Args:
+            alarms (list): list of tuple. [(<alarm_id1>, <entity_id1>), ...]
+            timeout (int):
+            check_interval (int):
+            fail_ok (bool):
+
+        Returns (tuple): (res(bool), remaining_alarms(list of tuple))
+
+        """
+        alarms = [tuple(alarm) for alarm in alarms]
+        LOG.info("Waiting for alarms to be cleared: {}".format(alarms))
+        end_time = time.time() + timeout
+        while True:
+            current_alarms = self.get_alarms(combine_entries=False)
+            remaining_alarms = [alarm for alarm in alarms if alarm in
+                                current_alarms]
+            if not remaining_alarms:
+                LOG.info("Following alarms cleared: {}".format(alarms))
+                return True, []
+            if time.time() >= end_time:
+                break
+            time.sleep(check_interval)
+
+        err_msg = "Following alarms did not clear within {} seconds: " \
+                  "{}".format(timeout, remaining_alarms)
+        if fail_ok:
+            LOG.warning(err_msg)
+            return False, remaining_alarms
+        raise exceptions.TimeoutException(err_msg)
+
+
 def host_exists(host, field='hostname', con_ssh=None,
                 auth_info=Tenant.get('admin_platform')):
     """
@@ -6,7 +6,7 @@ from pytest import skip
 
 from utils import cli, table_parser
 from utils.tis_log import LOG
-from utils.multi_thread import MThread
+from utils.multi_thread import MThread, MThreadPool
 from utils.clients.ssh import ControllerClient, NATBoxClient
 from consts.auth import HostLinuxUser, Tenant
 from consts.stx import GuestImages
@@ -162,7 +162,6 @@ def sys_lock_unlock_hosts(number_of_hosts_to_lock):
     vms_by_compute_dic = vm_helper.get_vms_per_host()
     compute_to_lock = []
     vms_to_check = []
-    hosts_threads = []
     timeout = 1000
 
     for k, v in vms_by_compute_dic.items():
@@ -179,13 +178,10 @@ def sys_lock_unlock_hosts(number_of_hosts_to_lock):
     else:
         LOG.warning("There are only {} computes available with more than 5 vms ".format(len(compute_to_lock)))
 
-    for host in compute_to_lock:
-        new_thread = MThread(host_helper.lock_host, host)
-        new_thread.start_thread(timeout=timeout+30)
-        hosts_threads.append(new_thread)
-
-    for host_thr in hosts_threads:
-        host_thr.wait_for_thread_end()
+    with MThreadPool(max_workers=len(compute_to_lock) or 1, timeout=timeout+30) as pool:
+        for host in compute_to_lock:
+            pool.submit(host_helper.lock_host, host)
+        pool.wait_for_all()
 
     LOG.tc_step("Verify lock succeeded and vms still in good state")
     for vm_list in vms_to_check:
@@ -197,14 +193,10 @@ def sys_lock_unlock_hosts(number_of_hosts_to_lock):
             assert vm_host != host, "VM is still on {} after lock".format(host)
             vm_helper.wait_for_vm_pingable_from_natbox(vm_id=vm, timeout=VMTimeout.DHCP_RETRY)
 
-    hosts_threads = []
-    for host in compute_to_lock:
-        new_thread = MThread(host_helper.unlock_host, host)
-        new_thread.start_thread(timeout=timeout+30)
-        hosts_threads.append(new_thread)
-
-    for host_thr in hosts_threads:
-        host_thr.wait_for_thread_end()
+    with MThreadPool(max_workers=len(compute_to_lock) or 1, timeout=timeout+30) as pool:
+        for host in compute_to_lock:
+            pool.submit(host_helper.unlock_host, host)
+        pool.wait_for_all()
 
 
 def sys_evacuate_from_hosts(number_of_hosts_to_evac):
@@ -216,7 +208,6 @@ def sys_evacuate_from_hosts(number_of_hosts_to_evac):
     vms_by_compute_dic = vm_helper.get_vms_per_host()
     computes_to_reboot = []
     vms_to_check = []
-    hosts_threads = []
     timeout = 1000
 
     for k, v in vms_by_compute_dic.items():
@@ -233,13 +224,10 @@ def sys_evacuate_from_hosts(number_of_hosts_to_evac):
     else:
         LOG.warning("There are only {} computes available with more than 5 vms ".format(len(computes_to_reboot)))
 
-    for host, vms in zip(computes_to_reboot, vms_to_check):
-        new_thread = MThread(vm_helper.evacuate_vms, host, vms, vlm=False)
-        new_thread.start_thread(timeout=timeout+30)
-        hosts_threads.append(new_thread)
-
-    for host_thr in hosts_threads:
-        host_thr.wait_for_thread_end()
+    with MThreadPool(max_workers=len(computes_to_reboot) or 1, timeout=timeout+30) as pool:
+        for host, vms in zip(computes_to_reboot, vms_to_check):
+            pool.submit(vm_helper.evacuate_vms, host, vms, vlm=False)
+        pool.wait_for_all()
 
     LOG.tc_step("Verify reboot succeeded and vms still in good state")
     for vm_list in vms_to_check:
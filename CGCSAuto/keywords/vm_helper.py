@@ -6,6 +6,7 @@
 
 
 import copy
+import functools
 import math
 import os
 import random
@@ -30,6 +31,7 @@ from utils.clients.ssh import NATBoxClient, VMSSHClient, ControllerClient, \
 from utils.clients.local import LocalHostClient
 from utils.guest_scripts.scripts import TisInitServiceScript
 from utils.multi_thread import MThread, Events
+from utils.poller import Poller, Condition
 from utils.tis_log import LOG
 from keywords import network_helper, nova_helper, cinder_helper, \
     host_helper, glance_helper, common, system_helper, \
@@ -38,6 +40,76 @@ from testfixtures.fixture_resources import ResourceCleanup
 from testfixtures.recover_hosts import HostsToRecover
 
 
+def _format_vm_networks(server):
+    # Same format as openstack server list. e.g., net1=10.0.0.3, 10.0.0.4; net2=...
+    return '; '.join('{}={}'.format(net, ', '.join(addr['addr'] for addr in addrs))
+                     for net, addrs in sorted(server['addresses'].items()))
+
+
+def _format_vm_image(server, image_names):
+    # Same as openstack server list. image is '' if booted from volume.
+    if not server['image']:
+        return 'N/A (booted from volume)'
+    return image_names.get(server['image']['id'], '')
+
+
+def _format_vm_flavor(server, flavor_names):
+    flavor = server['flavor']
+    if 'original_name' in flavor:
+        # nova api microversion 2.47 and later
+        return flavor['original_name']
+    return flavor_names.get(flavor['id'], '')
+
+
+# (<cli table header>, <REST json key>) pairs for REST backend. Image and
+# Flavor names are looked up via glance and nova apis, see
+# _get_servers_rest_table()
+SERVER_LIST_REST_FIELDS = (('ID', 'id'),
+                           ('Name', 'name'),
+                           ('Status', 'status'),
+                           ('Networks', _format_vm_networks),
+                           ('Image', _format_vm_image),
+                           ('Flavor', _format_vm_flavor))
+
+
+def _get_servers_rest_table(params=None):
+    """
+    Get openstack server list table via nova REST api, including image and
+    flavor names as displayed by cli.
+
+    Returns (dict|None): None if any REST request failed
+    """
+    from utils import rest
+    images = rest.get_json('glance', '/v2/images', params={'limit': 1000},
+                           fail_ok=True)
+    flavors = rest.get_json('nova', '/flavors',
+                            params={'is_public': 'None'}, fail_ok=True)
+    if images is None or flavors is None:
+        return None
+
+    try:
+        image_names = {image['id']: image['name'] for image in
+                       images['images']}
+        flavor_names = {flavor['id']: flavor['name'] for flavor in
+                        flavors['flavors']}
+    except (KeyError, TypeError) as e:
+        LOG.warning("Unexpected image or flavor list from REST api. "
+                    "{}".format(e))
+        return None
+
+    field_map = []
+    for header, key in SERVER_LIST_REST_FIELDS:
+        if key is _format_vm_image:
+            key = functools.partial(_format_vm_image, image_names=image_names)
+        elif key is _format_vm_flavor:
+            key = functools.partial(_format_vm_flavor,
+                                    flavor_names=flavor_names)
+        field_map.append((header, key))
+
+    return rest.get_table('nova', '/servers/detail', 'servers',
+                          field_map=field_map, params=params, fail_ok=True)
+
+
 def set_vm(vm_id, name=None, state=None, properties=None, con_ssh=None, auth_info=None,
            fail_ok=False):
     """
@@ -1749,21 +1821,19 @@ def wait_for_vm_status(vm_id, status=VMStatus.ACTIVE,
     Returns: The Status of the vm_id depend on what Status it is looking for
 
     """
-    end_time = time.time() + timeout
     if isinstance(status, str):
         status = [status]
 
-    current_status = get_vm_values(vm_id, 'status', strict=True,
-                                   con_ssh=con_ssh, auth_info=auth_info)[0]
-    while time.time() < end_time:
-        for expected_status in status:
-            if current_status == expected_status:
-                LOG.info("VM status has reached {}".format(expected_status))
-                return expected_status
-
-        time.sleep(check_interval)
-        current_status = get_vm_values(vm_id, 'status', strict=True,
-                                       con_ssh=con_ssh, auth_info=auth_info)[0]
+    # Use server list, so that the query is shared with other threads waiting
+    # for vm status at the same time
+    condition = get_vm_condition(vm_id, header='Status', value=status,
+                                 con_ssh=con_ssh, auth_info=auth_info)
+    Poller.wait_for_conditions(condition, timeout=timeout,
+                               check_interval=check_interval)
+    current_status = condition.actual
+    if condition.met:
+        LOG.info("VM status has reached {}".format(current_status))
+        return current_status
 
     err_msg = "Timed out waiting for vm status: {}. Actual vm status: " \
               "{}".format(status, current_status)
@@ -1841,7 +1911,7 @@ def _get_vms_ips(vm_ids, net_types='mgmt', exclude_nets=None, con_ssh=None,
 def _ping_vms(ssh_client, vm_ids=None, con_ssh=None, num_pings=5, timeout=15,
               fail_ok=False, net_types='mgmt', retry=3,
               retry_interval=3, vshell=False, sep_file=None,
-              source_net_types=None):
+              source_net_types=None, parallel=True):
     """
 
     Args:
@@ -1863,6 +1933,9 @@ def _ping_vms(ssh_client, vm_ids=None, con_ssh=None, num_pings=5, timeout=15,
                 use net_type_data for data IPs
                 use net_type_internal for internal IPs
             list:   same as tuple
+        parallel (bool): whether to ping all non-vshell ips concurrently in
+            one command. If True, only ips with 100% packet loss are pinged
+            again on retry.
 
     Returns (tuple): (res (bool), packet_loss_dict (dict))
         Packet loss rate dictionary format:
@@ -1879,11 +1952,17 @@ def _ping_vms(ssh_client, vm_ids=None, con_ssh=None, num_pings=5, timeout=15,
     res_bool = False
     res_dict = {}
     for i in range(retry + 1):
-        for ip in vms_ips:
-            packet_loss_rate = network_helper.ping_server(
-                server=ip, ssh_client=ssh_client, num_pings=num_pings,
-                timeout=timeout, fail_ok=True, vshell=False)[0]
-            res_dict[ip] = packet_loss_rate
+        if parallel:
+            ips_to_ping = [ip for ip in vms_ips if res_dict.get(ip, 100) == 100]
+            res_dict.update(network_helper.ping_servers(
+                servers=ips_to_ping, ssh_client=ssh_client,
+                num_pings=num_pings, timeout=timeout))
+        else:
+            for ip in vms_ips:
+                packet_loss_rate = network_helper.ping_server(
+                    server=ip, ssh_client=ssh_client, num_pings=num_pings,
+                    timeout=timeout, fail_ok=True, vshell=False)[0]
+                res_dict[ip] = packet_loss_rate
 
         for net_type, vshell_ips in vshell_ips_dict.items():
 
@@ -2967,28 +3046,22 @@ def wait_for_vms_values(vms, header='Status', value=VMStatus.ACTIVE,
     if isinstance(vms, str):
         vms = [vms]
 
-    if isinstance(value, str):
-        value = [value]
-
-    res_fail = res_pass = None
-    end_time = time.time() + timeout
-    while time.time() < end_time:
-        res_pass = {}
-        res_fail = {}
-        vms_values = get_vms(vms=vms, con_ssh=con_ssh, auth_info=auth_info,
-                             field=header)
-        for i in range(len(vms)):
-            vm = vms[i]
-            vm_value = vms_values[i]
-            if vm_value in value:
-                res_pass[vm] = vm_value
-            else:
-                res_fail[vm] = vm_value
-
-        if not res_fail:
-            return True, res_pass, res_fail
+    conditions = [get_vm_condition(vm, header=header, value=value,
+                                   con_ssh=con_ssh, auth_info=auth_info)
+                  for vm in vms]
+    Poller.wait_for_conditions(conditions, timeout=timeout,
+                               check_interval=check_interval)
+
+    res_pass = {}
+    res_fail = {}
+    for vm, cond in zip(vms, conditions):
+        if cond.met:
+            res_pass[vm] = cond.actual
+        else:
+            res_fail[vm] = cond.actual
 
-        time.sleep(check_interval)
+    if not res_fail:
+        return True, res_pass, res_fail
 
     fail_msg = "Some vm(s) did not reach given status from nova list within " \
                "{} seconds: {}".format(timeout, res_fail)
@@ -2998,6 +3071,58 @@ def wait_for_vms_values(vms, header='Status', value=VMStatus.ACTIVE,
     raise exceptions.VMPostCheckFailed(fail_msg)
 
 
+def _get_servers_table(con_ssh=None, auth_info=Tenant.get('admin')):
+    """
+    Get openstack server list table for all vms visible to given user. This is
+    registered as 'server' resource type in Poller.
+    """
+    all_projects = auth_info and auth_info['user'] == 'admin'
+    from utils import rest
+    if rest.use_rest_backend(auth_info=auth_info):
+        params = {'all_tenants': 1} if all_projects else None
+        table_ = _get_servers_rest_table(params=params)
+        if table_ is not None:
+            return table_
+
+    args = '--a' if all_projects else ''
+    return table_parser.table(cli.openstack('server list', args,
+                                            ssh_client=con_ssh,
+                                            auth_info=auth_info,
+                                            output_format='json')[1])
+
+
+Poller.register('server', _get_servers_table)
+
+
+def get_vm_condition(vm_id, header='Status', value=VMStatus.ACTIVE,
+                     con_ssh=None, auth_info=Tenant.get('admin')):
+    """
+    Get a Poller condition for vm to reach any of the given value(s) in
+    openstack server list
+
+    Args:
+        vm_id (str):
+        header (str): header in openstack server list. such as 'Status'
+        value (str|list|tuple): expected value(s)
+        con_ssh (SSHClient|None):
+        auth_info (dict|None):
+
+    Returns (Condition):
+
+    """
+    if isinstance(value, str):
+        value = [value]
+
+    def _check(table_):
+        vals = table_parser.get_values(table_, header, ID=vm_id)
+        actual = vals[0] if vals else None
+        return actual in value, actual
+
+    return Condition('server', _check,
+                     name='vm {} {} in {}'.format(vm_id, header, value),
+                     con_ssh=con_ssh, auth_info=auth_info)
+
+
 def set_vm_state(vm_id, check_first=False, error_state=True, fail_ok=False,
                  auth_info=Tenant.get('admin'),
                  con_ssh=None):
@@ -6596,9 +6721,21 @@ def get_vms(vms=None, field='ID', long=False, all_projects=True, host=None,
                  '--project': project,
                  '--project-domain': project_domain}
     args = common.parse_args(args_dict)
-    table_ = table_parser.table(
-        cli.openstack('server list', args, ssh_client=con_ssh,
-                      auth_info=auth_info)[1])
+
+    table_ = None
+    from utils import rest
+    fields = [field] if isinstance(field, str) else list(field)
+    rest_headers = [header.lower() for header, key in SERVER_LIST_REST_FIELDS]
+    if not (long or host or project or project_domain) and \
+            {k.lower() for k in fields + list(kwargs)} <= set(rest_headers) and \
+            rest.use_rest_backend(auth_info=auth_info):
+        params = {'all_tenants': 1} if args_dict['--a'] else None
+        table_ = _get_servers_rest_table(params=params)
+
+    if table_ is None:
+        table_ = table_parser.table(
+            cli.openstack('server list', args, ssh_client=con_ssh,
+                          auth_info=auth_info)[1])
     if vms:
         table_ = table_parser.filter_table(table_, ID=vms)
 
@@ -6667,6 +6804,12 @@ def get_vm_values(vm_id, fields, strict=True, con_ssh=None,
     if isinstance(fields, str):
         fields = [fields]
 
+    from utils import rest
+    if rest.use_rest_backend(auth_info=auth_info):
+        values = _get_vm_values_rest(vm_id, fields=fields, strict=strict)
+        if values is not None:
+            return values
+
     table_ = table_parser.table(
         cli.openstack('server show', vm_id, ssh_client=con_ssh,
                       auth_info=auth_info)[1])
@@ -6688,6 +6831,37 @@ def get_vm_values(vm_id, fields, strict=True, con_ssh=None,
     return values
 
 
+def _get_vm_values_rest(vm_id, fields, strict=True):
+    """
+    Get vm values via nova REST api. Only fields with plain values (such as
+    status, OS-EXT-STS:task_state, OS-EXT-SRV-ATTR:host) are supported, since
+    values of other fields are reformatted by openstack cli.
+
+    Returns (list|None): values for given fields, or None if any field is not
+        supported or REST request failed
+    """
+    from utils import rest
+    server = rest.get_json('nova', '/servers/{}'.format(vm_id), fail_ok=True)
+    if not isinstance(server, dict) or 'server' not in server:
+        return None
+
+    server = server['server']
+    values = []
+    for field in fields:
+        if strict:
+            keys = [key for key in server if key == field]
+        else:
+            keys = [key for key in server if field.lower() in key.lower()]
+
+        if len(keys) != 1 or isinstance(server[keys[0]], (dict, list)):
+            return None
+
+        value = server[keys[0]]
+        values.append(str(value) if value is not None else 'None')
+
+    return values
+
+
 def get_vm_fault_message(vm_id, con_ssh=None, auth_info=None):
     return get_vm_values(vm_id=vm_id, fields='fault', con_ssh=con_ssh,
                          auth_info=auth_info)[0]
@@ -10,7 +10,6 @@ import re
 import ast
 import time
 import ipaddress
-import threading
 import configparser
 
 from consts.auth import Tenant, HostLinuxUser, TestFileServer, CliAuth, Guest
@@ -28,7 +27,9 @@ from utils import local_host
 from utils.clients.ssh import SSHClient, CONTROLLER_PROMPT, ControllerClient, SSHFromSSH, \
     NATBoxClient, PASSWORD_PROMPT
 from utils.clients.local import RemoteCLIClient
-from utils.clients.telnet import TELNET_LOGIN_PROMPT, TelnetClient
+from utils.clients.telnet import TELNET_LOGIN_PROMPT
+from utils.clients.console_collector import ConsoleCollector
+from utils.multi_thread import MThreadPool
 from utils.node import create_node_boot_dict, create_node_dict, \
     VBOX_BOOT_INTERFACES
 from utils.tis_log import LOG
@@ -436,19 +437,28 @@ def _rsync_files_to_con1(con_ssh=None, central_region=False,
                 "Timed out rsync files to controller-1")
 
 
+def _rsync_region_files_to_con1(region_name, file_to_check=None,
+                                central_region=False):
+    # Look up ssh client in current thread, so each pool worker uses its own
+    # session
+    con_ssh = ControllerClient.get_active_controller(name=region_name)
+    _rsync_files_to_con1(con_ssh=con_ssh, file_to_check=file_to_check,
+                         central_region=central_region)
+
+
 def copy_test_files():
-    con_ssh = None
-    central_region = False
-    if ProjVar.get_var('IS_DC'):
-        _rsync_files_to_con1(
-            con_ssh=ControllerClient.get_active_controller(
-                name=ProjVar.get_var('PRIMARY_SUBCLOUD')),
-            file_to_check='~/heat/README',
-            central_region=central_region)
-        con_ssh = ControllerClient.get_active_controller(name='RegionOne')
-        central_region = True
+    if not ProjVar.get_var('IS_DC'):
+        _rsync_files_to_con1()
+        return
 
-    _rsync_files_to_con1(con_ssh=con_ssh, central_region=central_region)
+    # rsync within system controller and primary subcloud concurrently
+    with MThreadPool(max_workers=2, timeout=3600) as pool:
+        pool.submit(_rsync_region_files_to_con1,
+                    ProjVar.get_var('PRIMARY_SUBCLOUD'),
+                    file_to_check='~/heat/README')
+        pool.submit(_rsync_region_files_to_con1, 'RegionOne',
+                    central_region=True)
+        pool.wait_for_all()
 
 
 def get_auth_via_openrc(con_ssh, use_telnet=False, con_telnet=None):
@@ -650,53 +660,26 @@ def get_nodes_info(lab=None):
 
 
 def collect_telnet_logs_for_nodes(end_event):
+    """
+    Collect console logs of all nodes in one collector thread until end_event
+    is set. Install steps can wait for console output via
+    ConsoleCollector.get_collector().wait_for(<pattern>, hostnames=<hosts>)
+
+    Args:
+        end_event (threading.Event):
+
+    Returns (list): collector thread in a list
+
+    """
     nodes_info = get_nodes_info()
-    node_threads = []
-    kwargs = {'prompt': r'{}|:~\$'.format(TELNET_LOGIN_PROMPT),
-              'end_event': end_event}
+    collector = ConsoleCollector(
+        end_event=end_event, prompt=r'{}|:~\$'.format(TELNET_LOGIN_PROMPT))
     for node_name in nodes_info:
-        kwargs['hostname'] = node_name
-        kwargs['telnet_ip'] = nodes_info[node_name].telnet_ip
-        kwargs['telnet_port'] = nodes_info[node_name].telnet_port
-        node_thread = threading.Thread(name='Telnet-{}'.format(node_name),
-                                       target=_collect_telnet_logs,
-                                       kwargs=kwargs)
-        node_thread.start()
-        node_threads.append(node_thread)
-
-    return node_threads
-
-
-def _collect_telnet_logs(telnet_ip, telnet_port, end_event, prompt, hostname,
-                         timeout=None, collect_interval=60):
-    node_telnet = TelnetClient(host=telnet_ip, prompt=prompt, port=telnet_port,
-                               hostname=hostname)
-    if not timeout:
-        timeout = 3600 * 48
-    end_time = time.time() + timeout
-    failure_count = 0
-    while time.time() < end_time:
-        if end_event.is_set():
-            node_telnet.close()
-            break
-        try:
-            # Read out everything in output buffer every minute
-            node_telnet.connect(login=False)
-            time.sleep(collect_interval)
-            node_telnet.flush()
-        except Exception as e:
-            node_telnet.logger.error(
-                'Failed to collect telnet log. {}'.format(e))
-            node_telnet.close()
-            failure_count += 1
-            if failure_count >= 5:
-                node_telnet.logger.error(
-                    "5 failures encountered to collect telnet logs. Abort.")
-                raise
-            time.sleep(60)      # cool down period if telnet connection fails
-    else:
-        node_telnet.logger.warning('Collect telnet log timed out')
-        node_telnet.close()
+        collector.add_node(node_name,
+                           telnet_ip=nodes_info[node_name].telnet_ip,
+                           telnet_port=nodes_info[node_name].telnet_port)
+    ConsoleCollector.set_collector(collector)
+    return [collector.start()]
 
 
 def set_install_params(installconf_path, lab=None, skip=None, resume=False,
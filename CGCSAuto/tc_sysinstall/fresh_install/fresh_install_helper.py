@@ -21,6 +21,8 @@ from consts.filepaths import BuildServerPath, TuxlabServerPath
 from consts.proj_vars import ProjVar, InstallVars
 from keywords import install_helper, system_helper, vlm_helper, host_helper, dc_helper, \
     kube_helper, storage_helper, keystone_helper, common
+from tc_sysinstall.fresh_install.install_pipeline import InstallCheckpoint, InstallPipeline, \
+    normalize_step_name, record_step_time
 
 DEPLOY_TOOL = 'deploy'
 DEPLOY_SOUCE_PATH = '/folk/cgts/lab/bin/'
@@ -28,9 +30,12 @@ DEPLOY_RESULTS_DEST_PATH = '/folk/cgts/lab/deployment-manager/generated-configs/
 DEPLOY_INTITIAL = 'initial'
 DEPLOY_INTERIM = 'interim'
 DEPLOY_LAST = 'last'
+PXELINUX_CFG_DIR = '/pxeboot/pxelinux.cfg'
 
 lab_setup_count = 0
 completed_resume_step = False
+# name and start time of the install step in progress
+step_timer = {}
 
 
 def set_lab_setup_count(val=0):
@@ -48,12 +53,42 @@ def set_completed_resume_step(val=False):
 
 
 def reset_global_vars():
+    end_step_timer()
     lab_setup_count_ = set_lab_setup_count(0)
     completed_resume_step_ = set_completed_resume_step(False)
 
     return lab_setup_count_, completed_resume_step_
 
 
+def get_install_checkpoint(lab=None):
+    if lab is None:
+        lab = InstallVars.get_install_var("LAB")
+    if not lab or not lab.get('short_name'):
+        return None
+    return InstallCheckpoint.get_checkpoint(lab)
+
+
+def start_step_timer(step_name):
+    step_timer.clear()
+    step_timer.update(name=step_name, start_time=time.time())
+
+
+def end_step_timer():
+    """
+    Record wall time of the install step in progress to kpi file, and mark it
+    completed in install checkpoint. Called when next step starts or install
+    stops, i.e., the step has passed.
+    """
+    if not step_timer:
+        return
+    step_name = step_timer.pop('name')
+    duration = time.time() - step_timer.pop('start_time')
+    record_step_time(step_name, duration)
+    checkpoint = get_install_checkpoint()
+    if checkpoint:
+        checkpoint.mark_step_done(step_name, duration=duration)
+
+
 #
 # def set_preinstall_projvars(build_dir, build_server):
 #     ProjVar.set_var(SOURCE_OPENRC=True)
@@ -103,6 +138,7 @@ def reset_global_vars():
 
 def do_step(step_name=None):
     global completed_resume_step
+    end_step_timer()
     skip_list = InstallVars.get_install_var("SKIP")
     current_step_num = str(LOG.test_step)
     resume_step = InstallVars.get_install_var("RESUME")
@@ -133,8 +169,10 @@ def do_step(step_name=None):
     do = (completed_resume_step or on_resume_step) and not in_skip_list
     if not do:
         LOG.info("Skipping step")
-    elif not completed_resume_step:
-        set_completed_resume_step(True)
+    else:
+        start_step_timer(step_name or 'step_{}'.format(current_step_num))
+        if not completed_resume_step:
+            set_completed_resume_step(True)
     return do
 
 
@@ -212,10 +250,19 @@ def download_lab_files(lab_files_server, build_server, guest_server, sys_version
                 con0_v4_ip = '128.224.150.{}'.format(con0_v4_ip[-3:])
             lab['controller-0 ip'] = con0_v4_ip
 
+        # Guest image and helm charts are not needed until hosts are installed. Download them
+        # while other hosts are booting if possible. See boot_hosts().
+        defer_downloads = is_download_deferrable(lab)
+        deferred_downloads = []
+
         LOG.info("Downloading heat templates with best effort")
         install_helper.download_heat_templates(lab, build_server, load_path, heat_path=heat_path)
-        LOG.info("Downloading guest image")
-        install_helper.download_image(lab, guest_server, guest_path)
+        if defer_downloads:
+            deferred_downloads.append({'name': 'download_guest_image',
+                                       'server': guest_server.name, 'path': guest_path})
+        else:
+            LOG.info("Downloading guest image")
+            install_helper.download_image(lab, guest_server, guest_path)
         LOG.info("Copying license")
         install_helper.download_license(lab, build_server, license_path, dest_name="license")
         LOG.info("Downloading lab config files")
@@ -223,12 +270,21 @@ def download_lab_files(lab_files_server, build_server, guest_server, sys_version
                                                  conf_server=lab_files_server,
                                                  lab_file_dir=lab_files_dir)
 
-        LOG.info("Download helm charts to active controller ...")
         helm_chart_path = InstallVars.get_install_var("HELM_CHART_PATH")
         if not helm_chart_server:
             helm_chart_server = build_server
-        install_helper.download_stx_helm_charts(lab, helm_chart_server,
-                                                stx_helm_charts_path=helm_chart_path)
+        if defer_downloads:
+            deferred_downloads.append({'name': 'download_helm_charts',
+                                       'server': helm_chart_server.name, 'path': helm_chart_path})
+        else:
+            LOG.info("Download helm charts to active controller ...")
+            install_helper.download_stx_helm_charts(lab, helm_chart_server,
+                                                    stx_helm_charts_path=helm_chart_path)
+
+        if deferred_downloads:
+            LOG.info("Defer {} to overlap with booting other hosts".format(
+                [download['name'] for download in deferred_downloads]))
+            get_install_checkpoint(lab).set_pending('downloads', deferred_downloads)
 
         if ProjVar.get_var('IPV6_OAM'):
             lab['controller-0 ip'] = con0_v6_ip
@@ -248,6 +304,85 @@ def download_lab_files(lab_files_server, build_server, guest_server, sys_version
         controller0_node.telnet_conn.exec_cmd("touch .no_openstack_install")
 
 
+def is_download_deferrable(lab):
+    """
+    Whether guest image and helm charts downloads could be deferred to overlap with booting
+    other hosts. Downloads go to controller-0 over separate ssh sessions to the file servers.
+
+    Args:
+        lab (dict):
+
+    Returns (bool):
+
+    """
+    return bool(ProjVar.get_var('DEFER_INSTALL_DOWNLOADS') and
+                len(lab.get('hosts') or []) > 1 and
+                'vbox' not in lab['name'] and
+                not InstallVars.get_install_var('IPV6_OAM') and
+                not InstallVars.get_install_var('INSTALL_SUBCLOUD'))
+
+
+def _download_file(download, lab):
+    # each deferred download uses its own ssh session, so downloads could run in parallel
+    server = setups.initialize_server(download['server'])
+    try:
+        if download['name'] == 'download_guest_image':
+            LOG.info("Downloading guest image")
+            install_helper.download_image(lab, server, download['path'])
+        else:
+            LOG.info("Download helm charts to active controller ...")
+            install_helper.download_stx_helm_charts(lab, server,
+                                                    stx_helm_charts_path=download['path'])
+    finally:
+        server.ssh_conn.close()
+
+
+def add_deferred_download_steps(pipeline, lab=None):
+    """
+    Add downloads deferred by download_lab_files() to given install pipeline
+
+    Args:
+        pipeline (InstallPipeline):
+        lab (dict|None):
+
+    Returns (list): names of download steps added
+
+    """
+    if lab is None:
+        lab = InstallVars.get_install_var('LAB')
+    checkpoint = get_install_checkpoint(lab)
+    downloads = checkpoint.get_pending('downloads') if checkpoint else None
+    if not downloads:
+        return []
+
+    step_names = []
+    for download in downloads:
+        pipeline.add_step(download['name'], _download_file, args=(download, lab))
+        step_names.append(download['name'])
+    return step_names
+
+
+def run_deferred_downloads(lab=None):
+    """
+    Download files deferred by download_lab_files() if not yet done by boot_hosts(), e.g.,
+    there was no other host to boot.
+
+    Args:
+        lab (dict|None):
+
+    """
+    if lab is None:
+        lab = InstallVars.get_install_var('LAB')
+    checkpoint = get_install_checkpoint(lab)
+    if not checkpoint:
+        return
+    pipeline = InstallPipeline('deferred downloads', checkpoint=checkpoint, resume=True,
+                               lab=lab)
+    if add_deferred_download_steps(pipeline, lab=lab):
+        pipeline.run()
+        checkpoint.pop_pending('downloads')
+
+
 def set_license_var(sys_version=None, sys_type=None):
     if sys_version is None:
         sys_version = ProjVar.get_var('SW_VERSION')[0]
@@ -490,57 +625,117 @@ def boot_hosts(boot_device_dict=None, hostnames=None, lab=None, final_step=None,
     else:
         test_step += " other lab hosts"
 
-    threads = []
-
     LOG.tc_step(test_step)
     if do_step(test_step):
-        hosts_online = False
-        if not use_bmc:
-            LOG.info("Wait for 2 minutes before power on other hosts")
-            time.sleep(120)
-        else:
-            LOG.info("Wait for 2 minutes for mtcAgent to power on hosts: {}".format(hostnames))
-            wait_for_mtc_to_power_on_hosts(hostnames, lab=lab)
-
-        for hostname in hostnames:
-            threads.append(install_helper.open_vlm_console_thread(hostname, lab=lab,
-                                                                  boot_interface=boot_device_dict,
-                                                                  wait_for_thread=False,
-                                                                  vlm_power_on=True,
-                                                                  close_telnet_conn=True))
-        for thread in threads:
-            thread.join(timeout=InstallTimeout.INSTALL_LOAD)
+        controller0_node = lab['controller-0']
+        if not controller0_node.ssh_conn:
+            controller0_node.ssh_conn = install_helper.ssh_to_controller(controller0_node.host_ip)
 
+        step_name = normalize_step_name(test_step)
+        pipeline = InstallPipeline(test_step, checkpoint=get_install_checkpoint(lab),
+                                   resume=bool(InstallVars.get_install_var("RESUME")), lab=lab)
+        if use_bmc:
+            LOG.info("Wait for mtcAgent to power on hosts: {}".format(hostnames))
+            power_on_step = pipeline.add_step('{}-power_on'.format(step_name),
+                                              wait_for_mtc_to_power_on_hosts, args=(hostnames,),
+                                              kwargs={'lab': lab})
+            boot_deps = [power_on_step.name]
+            ready = None
+        else:
+            # Power on hosts once their pxeboot configs are generated on active controller,
+            # instead of waiting for a fixed 2 minutes
+            boot_deps = []
+            ready = get_pxe_ready_check(hostnames, con_ssh=controller0_node.ssh_conn)
+        boot_step = pipeline.add_step('{}-nodes'.format(step_name), _boot_host, nodes=hostnames,
+                                      kwargs={'lab': lab, 'boot_device_dict': boot_device_dict},
+                                      deps=boot_deps, ready=ready, ready_timeout=120,
+                                      timeout=InstallTimeout.INSTALL_LOAD)
+
+        online_steps = []
         if wait_for_online:
-            wait_for_hosts_to_be_online(hosts=hostnames, lab=lab, fail_ok=False)
-            hosts_online = True
+            online_step = pipeline.add_step('{}-wait_for_online'.format(step_name),
+                                            wait_for_hosts_to_be_online,
+                                            kwargs={'hosts': hostnames, 'lab': lab,
+                                                    'fail_ok': False},
+                                            deps=[boot_step.name])
+            online_steps.append(online_step.name)
+
+        # downloads deferred by download_lab_files() overlap with hosts booting
+        download_steps = add_deferred_download_steps(pipeline, lab=lab)
 
         if InstallVars.get_install_var("DEPLOY_OPENSTACK_FROM_CONTROLLER1") and \
-                'controller-1' in hostnames and hosts_online:
-            controller0_node = lab['controller-0']
-            controller1_node = lab['controller-1']
-            if controller1_node.telnet_conn:
-                controller1_node.telnet_conn.close()
+                'controller-1' in hostnames and online_steps:
+            pipeline.add_step('{}-sync_controller1'.format(step_name), _sync_files_to_controller1,
+                              args=(lab,), deps=online_steps + download_steps)
 
-            controller1_node.telnet_conn = install_helper.open_telnet_session(controller1_node)
-            controller1_node.telnet_conn.set_prompt(r'-[\d]+:~\$ ')
-            controller1_node.telnet_conn.login(handle_init_login=True)
-            controller1_node.telnet_conn.close()
+        pipeline.run()
+        if download_steps:
+            get_install_checkpoint(lab).pop_pending('downloads')
 
-            if not controller0_node.ssh_conn:
-                controller0_node.ssh_conn = install_helper.ssh_to_controller(
-                    controller0_node.host_ip)
+    if LOG.test_step == final_step or test_step == final_step:
+        skip("stopping at install step: {}".format(LOG.test_step))
 
-            pre_opts = 'sshpass -p "{0}"'.format(HostLinuxUser.get_password())
 
-            controller0_node.ssh_conn.rsync(HostLinuxUser.get_home() + '*', 'controller-1',
-                                            HostLinuxUser.get_home(),
-                                            dest_user=HostLinuxUser.get_user(),
-                                            dest_password=HostLinuxUser.get_password(),
-                                            pre_opts=pre_opts)
+def get_pxe_ready_check(hostnames, con_ssh):
+    """
+    Get readiness predicate for powering on hosts. Hosts are ready to pxeboot once their
+    pxelinux configs are generated on active controller after host-add.
 
-    if LOG.test_step == final_step or test_step == final_step:
-        skip("stopping at install step: {}".format(LOG.test_step))
+    Args:
+        hostnames (list):
+        con_ssh (SSHClient):
+
+    Returns (runnable): returns True if all hosts are ready to pxeboot
+
+    """
+    mgmt_macs = {}
+
+    def _is_pxe_ready():
+        for host in hostnames:
+            if not mgmt_macs.get(host):
+                mac = system_helper.get_host_values(host, 'mgmt_mac', con_ssh=con_ssh)[0]
+                mgmt_macs[host] = str(mac).lower().replace(':', '-')
+
+        output = con_ssh.exec_cmd('ls {}'.format(PXELINUX_CFG_DIR), fail_ok=True)[1]
+        configs = output.lower().split()
+        not_ready = [host for host, mac in mgmt_macs.items() if
+                     not any(config.endswith('01-{}'.format(mac)) for config in configs)]
+        if not_ready:
+            LOG.info("pxeboot configs are not ready for {}".format(not_ready))
+            return False
+        return True
+
+    return _is_pxe_ready
+
+
+def _boot_host(hostname, lab, boot_device_dict):
+    install_helper.open_vlm_console_thread(hostname, lab=lab, boot_interface=boot_device_dict,
+                                           wait_for_thread=True, vlm_power_on=True,
+                                           close_telnet_conn=True)
+
+
+def _sync_files_to_controller1(lab):
+    controller0_node = lab['controller-0']
+    controller1_node = lab['controller-1']
+    if controller1_node.telnet_conn:
+        controller1_node.telnet_conn.close()
+
+    controller1_node.telnet_conn = install_helper.open_telnet_session(controller1_node)
+    controller1_node.telnet_conn.set_prompt(r'-[\d]+:~\$ ')
+    controller1_node.telnet_conn.login(handle_init_login=True)
+    controller1_node.telnet_conn.close()
+
+    if not controller0_node.ssh_conn:
+        controller0_node.ssh_conn = install_helper.ssh_to_controller(
+            controller0_node.host_ip)
+
+    pre_opts = 'sshpass -p "{0}"'.format(HostLinuxUser.get_password())
+
+    controller0_node.ssh_conn.rsync(HostLinuxUser.get_home() + '*', 'controller-1',
+                                    HostLinuxUser.get_home(),
+                                    dest_user=HostLinuxUser.get_user(),
+                                    dest_password=HostLinuxUser.get_password(),
+                                    pre_opts=pre_opts)
 
 
 def unlock_hosts(hostnames=None, lab=None, con_ssh=None, final_step=None):
@@ -589,15 +784,30 @@ def unlock_hosts(hostnames=None, lab=None, con_ssh=None, final_step=None):
 
     LOG.tc_step(test_step)
     if do_step(test_step):
+        # skip hosts unlocked before install was interrupted
+        checkpoint = get_install_checkpoint(lab)
+        if checkpoint and InstallVars.get_install_var("RESUME"):
+            unlocked_hosts = checkpoint.get_done_nodes(test_step)
+            if unlocked_hosts:
+                LOG.info("{} already unlocked. Skip.".format(unlocked_hosts))
+            hostnames = [host for host in hostnames if host not in unlocked_hosts]
+
+        unlocked_hosts = []
         if len(hostnames) == 1:
             host_helper.unlock_host(hostnames[0], con_ssh=con_ssh, available_only=available_only,
                                     timeout=2400,
                                     check_hypervisor_up=False, check_webservice_up=False)
             kube_helper.wait_for_nodes_ready(hosts=hostnames, con_ssh=con_ssh,
                                              timeout=HostTimeout.NODES_STATUS_READY)
-        else:
-            host_helper.unlock_hosts(hostnames, con_ssh=con_ssh, fail_ok=False,
-                                     check_nodes_ready=False)
+            unlocked_hosts = hostnames
+        elif hostnames:
+            res = host_helper.unlock_hosts(hostnames, con_ssh=con_ssh, fail_ok=False,
+                                           check_nodes_ready=False)
+            unlocked_hosts = [host for host, host_res in res.items() if host_res[0] in (-1, 0, 4)]
+
+        if checkpoint:
+            for host in unlocked_hosts:
+                checkpoint.mark_node_done(test_step, host)
 
     if LOG.test_step == final_step or test_step == final_step:
         skip("stopping at install step: {}".format(LOG.test_step))
@@ -683,6 +893,8 @@ def clear_post_install_alarms(con_ssh=None):
 def attempt_to_run_post_install_scripts(controller0_node=None):
     test_step = "Attempt to run post install scripts"
     LOG.tc_step(test_step)
+    # downloads deferred to boot hosts step but not done yet
+    run_deferred_downloads()
     LOG.info("Skipping step")
     # if do_step(test_step):
     #     rc, msg = install_helper.post_install(controller0_node=controller0_node)
@@ -1112,6 +1324,12 @@ def setup_fresh_install(lab, dist_cloud=False, subcloud=None):
     skip_list = InstallVars.get_install_var("SKIP")
     active_con = lab["controller-0"] if not dist_cloud else lab['central_region']["controller-0"]
 
+    if not InstallVars.get_install_var("RESUME"):
+        # completed steps and nodes of previous install do not apply to a new install
+        checkpoint = get_install_checkpoint(lab)
+        if checkpoint:
+            checkpoint.reset()
+
     build_server = InstallVars.get_install_var('BUILD_SERVER')
     build_dir = InstallVars.get_install_var("TIS_BUILD_DIR")
     boot_server = InstallVars.get_install_var('BOOT_SERVER')
@@ -0,0 +1,476 @@
+import json
+import os
+import threading
+import time
+
+from consts.proj_vars import ProjVar, InstallVars
+from utils import exceptions
+from utils.kpi import kpi, kpi_log_parser
+from utils.multi_thread import MThread
+from utils.tis_log import LOG
+
+
+KPI_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _start_thread(target, args=()):
+    thread = threading.Thread(target=target, args=args,
+                              name=MThread.next_thread_name(), daemon=True)
+    thread.start()
+    return thread
+
+
+def normalize_step_name(step_name):
+    return str(step_name).strip().lower().replace(' ', '_')
+
+
+def record_step_time(step_name, duration, lab=None):
+    """
+    Record wall time of an install step to session KPI timers and to the KPI
+    file (ProjVar KPI_PATH) as install_<step_name>
+
+    Args:
+        step_name (str):
+        duration (int|float): seconds
+        lab (dict|None):
+
+    """
+    step_name = normalize_step_name(step_name)
+    LOG.info("Install step {} took {:.1f} seconds".format(step_name, duration))
+    kpi.KPI.record('install {}'.format(step_name), duration)
+
+    kpi_file = ProjVar.get_var('KPI_PATH')
+    if not kpi_file:
+        return
+    if lab is None:
+        lab = InstallVars.get_install_var('LAB') or {}
+    kpi_dict = {'lab': lab.get('name'), 'unit': 'Time(s)',
+                'value': round(duration, 1),
+                # kpi upload parses timestamps as UTC
+                'timestamp': time.strftime(KPI_TIMESTAMP_FORMAT,
+                                           time.gmtime())}
+    try:
+        kpi_log_parser.append_to_kpi_file(
+            local_kpi_file=kpi_file, kpi_name='install_{}'.format(step_name),
+            kpi_dict=kpi_dict)
+    except Exception as e:
+        # kpi failure should not fail the install
+        LOG.warning("Failed to record install kpi for {}: {}".format(
+            step_name, e))
+
+
+class InstallCheckpoint:
+    """
+    Completed install steps and nodes of a lab persisted to
+    <LOG_DIR>/../<lab>_install_checkpoint.json, so that --resumeinstall
+    skips the steps and nodes already completed in previous run.
+
+    File content:
+        {"steps": {<step>: {"duration": <seconds>, "end_time": <epoch>}},
+         "nodes": {<step>: [<hostname>, ...]},
+         "pending": {<key>: <info>}}
+    """
+    __checkpoints = {}
+    __lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = {}
+        self.nodes = {}
+        self.pending = {}
+        self._lock = threading.RLock()
+        self.load()
+
+    @classmethod
+    def get_checkpoint(cls, lab=None, checkpoint_path=None):
+        """
+        Get checkpoint of given lab
+
+        Args:
+            lab (dict|None): install lab dict. InstallVars LAB if None.
+            checkpoint_path (str|None): default path if None
+
+        Returns (InstallCheckpoint):
+
+        """
+        if checkpoint_path is None:
+            if lab is None:
+                lab = InstallVars.get_install_var('LAB')
+            checkpoint_path = '{}/../{}_install_checkpoint.json'.format(
+                ProjVar.get_var('LOG_DIR'), lab['short_name'])
+        checkpoint_path = os.path.normpath(os.path.expanduser(checkpoint_path))
+
+        with cls.__lock:
+            checkpoint = cls.__checkpoints.get(checkpoint_path)
+            if checkpoint is None:
+                checkpoint = cls(checkpoint_path)
+                cls.__checkpoints[checkpoint_path] = checkpoint
+            return checkpoint
+
+    def load(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path) as f:
+                    content = json.load(f)
+            except (OSError, ValueError) as e:
+                LOG.warning("Failed to load install checkpoint {}: {}".format(
+                    self.path, e))
+                return
+            self.steps = content.get('steps', {})
+            self.nodes = content.get('nodes', {})
+            self.pending = content.get('pending', {})
+
+    def save(self):
+        with self._lock:
+            content = {'steps': self.steps, 'nodes': self.nodes,
+                       'pending': self.pending}
+            # write to temp file first so an interrupted install does not
+            # leave a corrupted checkpoint
+            tmp_path = self.path + '.tmp'
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(content, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                LOG.warning("Failed to save install checkpoint {}: {}".format(
+                    self.path, e))
+
+    def reset(self):
+        with self._lock:
+            self.steps = {}
+            self.nodes = {}
+            self.pending = {}
+            self.save()
+
+    def mark_step_done(self, step_name, duration=None):
+        step_name = normalize_step_name(step_name)
+        with self._lock:
+            self.steps[step_name] = {'duration': duration,
+                                     'end_time': time.time()}
+            self.save()
+
+    def is_step_done(self, step_name):
+        with self._lock:
+            return normalize_step_name(step_name) in self.steps
+
+    def mark_node_done(self, step_name, node):
+        step_name = normalize_step_name(step_name)
+        with self._lock:
+            nodes = self.nodes.setdefault(step_name, [])
+            if node not in nodes:
+                nodes.append(node)
+                self.save()
+
+    def get_done_nodes(self, step_name):
+        with self._lock:
+            return list(self.nodes.get(normalize_step_name(step_name), []))
+
+    def set_pending(self, key, info):
+        """
+        Persist info of work deferred to a later step, such as downloads
+        overlapped with host boot
+        """
+        with self._lock:
+            self.pending[key] = info
+            self.save()
+
+    def pop_pending(self, key):
+        with self._lock:
+            info = self.pending.pop(key, None)
+            self.save()
+            return info
+
+    def get_pending(self, key=None):
+        with self._lock:
+            if key is None:
+                return dict(self.pending)
+            return self.pending.get(key)
+
+
+class InstallStep:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    PASSED = 'passed'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    def __init__(self, name, func, args=(), kwargs=None, deps=(), ready=None,
+                 ready_timeout=600, check_interval=10, nodes=None,
+                 timeout=None):
+        """
+
+        Args:
+            name (str): step name. Used for checkpoint and kpi.
+            func (runnable): step function. Called as func(*args, **kwargs),
+                or func(<node>, *args, **kwargs) for each node if nodes given.
+            args (tuple|list):
+            kwargs (dict|None):
+            deps (list|tuple): names of steps to complete before this step
+            ready (runnable|None): readiness predicate polled after deps are
+                completed. Step starts once it returns True, or after
+                ready_timeout as if a fixed wait was used.
+            ready_timeout (int): max seconds to wait for ready
+            check_interval (int): seconds between ready checks
+            nodes (list|tuple|None): run func per node in parallel. Completed
+                nodes are checkpointed individually.
+            timeout (int|None): max seconds to wait for per node threads
+        """
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.deps = tuple(deps)
+        self.ready = ready
+        self.ready_timeout = ready_timeout
+        self.check_interval = check_interval
+        self.nodes = list(nodes) if nodes is not None else None
+        self.timeout = timeout
+        self.status = self.PENDING
+        self.output = None
+        self.error = None
+        self.duration = None
+
+    def is_finished(self):
+        return self.status in (self.PASSED, self.FAILED, self.SKIPPED)
+
+    def __str__(self):
+        return '{}: {}'.format(self.name, self.status)
+
+
+class InstallPipeline:
+    """
+    Run install steps as a DAG. Each step starts as soon as the steps it
+    depends on are completed and its readiness predicate is met, so
+    independent steps overlap, e.g., downloading guest image while hosts are
+    booting.
+
+    Wall time of each step is recorded to KPI file, and completed steps and
+    nodes are recorded to install checkpoint. When resume is set, steps and
+    nodes found in checkpoint are skipped.
+
+    e.g.,
+        pipeline = InstallPipeline('boot hosts', checkpoint=checkpoint)
+        pipeline.add_step('download_guest_image', download_func)
+        pipeline.add_step('boot', boot_host_func, nodes=hostnames,
+                          ready=is_pxe_ready_func, ready_timeout=120)
+        pipeline.add_step('wait_for_online', wait_func, deps=['boot'])
+        pipeline.run()
+    """
+
+    def __init__(self, name, checkpoint=None, resume=False, record_kpi=True,
+                 lab=None):
+        """
+
+        Args:
+            name (str): pipeline name for logging
+            checkpoint (InstallCheckpoint|None): record completed steps and
+                nodes if given
+            resume (bool): skip steps and nodes completed per checkpoint
+            record_kpi (bool): record step wall time to kpi file
+            lab (dict|None): lab for kpi
+        """
+        self.name = name
+        self.checkpoint = checkpoint
+        self.resume = resume and checkpoint is not None
+        self.record_kpi = record_kpi
+        self.lab = lab
+        self.steps = {}
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def add_step(self, name, func, args=(), kwargs=None, deps=(), ready=None,
+                 ready_timeout=600, check_interval=10, nodes=None,
+                 timeout=None):
+        """
+        Add a step. See InstallStep for args.
+
+        Returns (InstallStep):
+
+        """
+        if name in self.steps:
+            raise ValueError("Step {} already exists in {}".format(name,
+                                                                   self.name))
+        if self._threads:
+            raise exceptions.InstallError(
+                "Cannot add step to started pipeline {}".format(self.name))
+
+        step = InstallStep(name, func, args=args, kwargs=kwargs, deps=deps,
+                           ready=ready, ready_timeout=ready_timeout,
+                           check_interval=check_interval, nodes=nodes,
+                           timeout=timeout)
+        self.steps[name] = step
+        return step
+
+    def start(self):
+        """
+        Start all steps. Each step waits for its dependencies in its own thread.
+        """
+        for step in self.steps.values():
+            unknown = [dep for dep in step.deps if dep not in self.steps]
+            if unknown:
+                raise ValueError("Unknown dependencies for step {}: {}".format(
+                    step.name, unknown))
+
+        LOG.info("Start install pipeline {}: {}".format(self.name,
+                                                        list(self.steps)))
+        for step in self.steps.values():
+            self._threads.append(_start_thread(self._run_step, args=(step,)))
+
+    def wait(self, step_names=None, timeout=None, fail_ok=False):
+        """
+        Wait for given steps to finish
+
+        Args:
+            step_names (list|tuple|None): all steps if None
+            timeout (int|None): max seconds to wait. Wait forever if None.
+            fail_ok (bool):
+
+        Returns (tuple): (<all passed(bool)>, <steps(dict)>)
+
+        Raises (exceptions.InstallError): if any step failed or timed out and
+            fail_ok=False
+
+        """
+        if step_names is None:
+            step_names = list(self.steps)
+        steps = [self.steps[name] for name in step_names]
+
+        with self._cond:
+            finished = self._cond.wait_for(
+                lambda: all(step.is_finished() for step in steps),
+                timeout=timeout)
+
+        failed = [step for step in steps if step.status != InstallStep.PASSED]
+        if not failed:
+            return True, {step.name: step for step in steps}
+
+        if not finished:
+            msg = "Install steps did not finish within {} seconds: {}".format(
+                timeout, [str(step) for step in failed])
+        else:
+            msg = "Install steps failed: {}".format(
+                '; '.join('{} - {}'.format(step, step.error) for step in
+                          failed))
+        if fail_ok:
+            LOG.warning(msg)
+            return False, {step.name: step for step in steps}
+        raise exceptions.InstallError(msg)
+
+    def run(self, timeout=None, fail_ok=False):
+        """
+        Start all steps and wait for them to finish. See wait().
+        """
+        self.start()
+        return self.wait(timeout=timeout, fail_ok=fail_ok)
+
+    def _finish(self, step, status, error=None):
+        with self._cond:
+            step.status = status
+            step.error = error
+            self._cond.notify_all()
+
+    def _run_step(self, step):
+        deps = [self.steps[dep] for dep in step.deps]
+        with self._cond:
+            self._cond.wait_for(lambda: all(dep.is_finished() for dep in deps))
+
+        failed_deps = [dep.name for dep in deps if
+                       dep.status != InstallStep.PASSED]
+        if failed_deps:
+            LOG.warning("Skip install step {} due to failed dependencies "
+                        "{}".format(step.name, failed_deps))
+            self._finish(step, InstallStep.SKIPPED,
+                         error='{} failed'.format(failed_deps))
+            return
+
+        if self.resume and self.checkpoint.is_step_done(step.name):
+            LOG.info("Install step {} already completed. Skip.".format(
+                step.name))
+            self._finish(step, InstallStep.PASSED)
+            return
+
+        with self._cond:
+            step.status = InstallStep.RUNNING
+
+        start_time = time.time()
+        try:
+            if step.ready:
+                self._wait_for_ready(step)
+            if step.nodes is None:
+                step.output = step.func(*step.args, **step.kwargs)
+            else:
+                step.output = self._run_nodes(step)
+        except Exception as e:
+            LOG.error("Install step {} failed: {}".format(step.name, e))
+            self._finish(step, InstallStep.FAILED, error=e.__str__())
+            return
+
+        step.duration = time.time() - start_time
+        if self.checkpoint:
+            self.checkpoint.mark_step_done(step.name, duration=step.duration)
+        if self.record_kpi:
+            record_step_time(step.name, step.duration, lab=self.lab)
+        self._finish(step, InstallStep.PASSED)
+
+    @staticmethod
+    def _wait_for_ready(step):
+        end_time = time.time() + step.ready_timeout
+        while True:
+            try:
+                if step.ready():
+                    LOG.info("Install step {} is ready".format(step.name))
+                    return
+            except Exception as e:
+                LOG.warning("Readiness check for {} failed: {}".format(
+                    step.name, e))
+            if time.time() >= end_time:
+                LOG.warning("Install step {} is not ready after {} seconds. "
+                            "Proceed anyway.".format(step.name,
+                                                     step.ready_timeout))
+                return
+            time.sleep(min(step.check_interval,
+                           max(end_time - time.time(), 0)))
+
+    def _run_nodes(self, step):
+        nodes = list(step.nodes)
+        if self.resume:
+            done_nodes = self.checkpoint.get_done_nodes(step.name)
+            if done_nodes:
+                LOG.info("Install step {} already completed on {}. "
+                         "Skip.".format(step.name, done_nodes))
+            nodes = [node for node in nodes if node not in done_nodes]
+
+        outputs = {}
+        errors = {}
+
+        def _run_node(node_):
+            try:
+                outputs[node_] = step.func(node_, *step.args, **step.kwargs)
+            except Exception as e:
+                LOG.error("Install step {} failed on {}: {}".format(
+                    step.name, node_, e))
+                errors[node_] = e.__str__()
+                return
+            if self.checkpoint:
+                self.checkpoint.mark_node_done(step.name, node_)
+
+        threads = {node: _start_thread(_run_node, args=(node,)) for node in
+                   nodes}
+
+        end_time = time.time() + step.timeout if step.timeout else None
+        for thread in threads.values():
+            thread.join(max(end_time - time.time(), 0) if end_time else None)
+
+        unfinished = [node for node, thread in threads.items() if
+                      thread.is_alive()]
+        if unfinished:
+            raise exceptions.InstallError(
+                "{} did not finish within {} seconds".format(unfinished,
+                                                             step.timeout))
+        if errors:
+            raise exceptions.InstallError(
+                "Failed on {}".format(errors))
+        return outputs
@@ -108,24 +108,21 @@ def test_lock_unlock_host(host_type, collect_kpi):
                 unlock_host_type = 'compute_platform'
 
         LOG.info("Collect kpi for lock/unlock {}".format(host_type))
-        code_lock, out_lock = kpi_log_parser.record_kpi(
-            local_kpi_file=collect_kpi,
-            kpi_name=lock_kpi_name,
-            host=None, log_path=HostLock.LOG_PATH,
-            end_pattern=HostLock.END.format(host),
-            start_pattern=HostLock.START.format(host),
-            start_path=HostLock.START_PATH,
-            init_time=init_time)
-
         time.sleep(30)      # delay in sysinv log vs nova hypervisor list
-        code_unlock, out_unlock = kpi_log_parser.record_kpi(
+        kpi_res = kpi_log_parser.record_kpis(
             local_kpi_file=collect_kpi,
-            kpi_name=unlock_kpi_name, host=None,
-            log_path=HostUnlock.LOG_PATH,
-            end_pattern=HostUnlock.END[unlock_host_type].format(host),
-            init_time=init_time,
-            start_pattern=HostUnlock.START.format(host),
-            start_path=HostUnlock.START_PATH)
+            kpi_specs=[dict(kpi_name=lock_kpi_name, host=None, log_path=HostLock.LOG_PATH,
+                            end_pattern=HostLock.END.format(host),
+                            start_pattern=HostLock.START.format(host),
+                            start_path=HostLock.START_PATH,
+                            init_time=init_time),
+                       dict(kpi_name=unlock_kpi_name, host=None, log_path=HostUnlock.LOG_PATH,
+                            end_pattern=HostUnlock.END[unlock_host_type].format(host),
+                            init_time=init_time,
+                            start_pattern=HostUnlock.START.format(host),
+                            start_path=HostUnlock.START_PATH)])
+        code_lock, out_lock = kpi_res[lock_kpi_name]
+        code_unlock, out_unlock = kpi_res[unlock_kpi_name]
 
         assert code_lock == 0, 'Failed to collect kpi for host-lock {}. ' \
                                'Error: \n'.format(host, out_lock)
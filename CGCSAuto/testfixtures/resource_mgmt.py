@@ -1,7 +1,10 @@
+import time
+
 from pytest import fixture
 
 from utils.tis_log import LOG
 from utils import exceptions
+from utils.multi_thread import MThreadPool
 
 from consts.auth import Tenant
 from consts.heat import Heat
@@ -10,6 +13,39 @@ from testfixtures.fixture_resources import ResourceCleanup, GuestLogs
 
 # SIMPLEX_RECOVERED = False
 
+# Max number of resource types/resources being deleted at the same time
+TEARDOWN_WORKERS = 5
+_TEARDOWN_POOL = None
+
+# resource_type: resource types that have to be deleted before it.
+# heat_stack is deleted before all other types.
+DEL_DEPENDENCIES = {
+    'port_chain': (),
+    'flow_classifier': ('port_chain', ),
+    'vm': ('port_chain', ),
+    'vm_with_vol': ('port_chain', ),
+    'vol_snapshot': ('vm', 'vm_with_vol'),
+    'volume': ('vm', 'vm_with_vol', 'vol_snapshot'),
+    'volume_type': ('volume', ),
+    'volume_qos': ('volume_type', ),
+    'flavor': ('vm', 'vm_with_vol'),
+    'image': ('vm', 'vm_with_vol', 'volume'),
+    'server_group': ('vm', 'vm_with_vol'),
+    'floating_ip': ('vm', 'vm_with_vol'),
+    'trunk': ('vm', 'vm_with_vol'),
+    'port_pair_group': ('port_chain', ),
+    'port_pair': ('port_pair_group', ),
+    'port': ('vm', 'vm_with_vol', 'floating_ip', 'trunk', 'port_pair'),
+    'router': ('port', 'floating_ip'),
+    'subnet': ('port', 'router'),
+    'network_qos': ('port', ),
+    'network': ('port', 'router', 'subnet', 'network_qos'),
+    'security_group_rule': ('vm', 'vm_with_vol', 'port'),
+    'security_group': ('security_group_rule', ),
+    'aggregate': ('vm', 'vm_with_vol'),
+    'datanetwork': ('network', ),
+}
+
 
 @fixture(scope='function', autouse=True)
 def delete_resources_func(request):
@@ -111,6 +147,62 @@ def flavor_id_module():
     return flavor
 
 
+def _get_del_level(resource_type, levels=None):
+    """
+    Get deletion level of given resource type. Resource types on the same level
+    have no dependency on each other and can be deleted in parallel.
+
+    Args:
+        resource_type (str):
+        levels (dict|None): cache of calculated levels
+
+    Returns (int): 0 for heat_stack. Otherwise 1 + max level of dependencies.
+
+    """
+    if levels is None:
+        levels = {}
+    if resource_type == 'heat_stack':
+        return 0
+
+    if resource_type not in levels:
+        deps = DEL_DEPENDENCIES.get(resource_type, ())
+        levels[resource_type] = 1 + max([_get_del_level(dep, levels) for dep in deps] or [0])
+    return levels[resource_type]
+
+
+def _delete_resource(del_fun, resource_id, fun_kwargs):
+    """
+    Returns (str|None): error message if deletion failed
+    """
+    try:
+        code, msg = del_fun(resource_id, fail_ok=True, **fun_kwargs)[0:2]
+        if code > 0:
+            return msg
+    except exceptions.TiSError as e:
+        return e.__str__()
+
+
+def _get_teardown_pool():
+    """
+    Get the pool shared by resource teardowns. Workers only set up controller
+    sessions, once for the whole session instead of per teardown.
+    """
+    global _TEARDOWN_POOL
+    if _TEARDOWN_POOL is None:
+        _TEARDOWN_POOL = MThreadPool(max_workers=TEARDOWN_WORKERS, natbox=False)
+    return _TEARDOWN_POOL
+
+
+def shutdown_teardown_pool(wait=True):
+    """
+    Shut down the pool used by resource teardowns and close its worker sessions
+    """
+    global _TEARDOWN_POOL
+    if _TEARDOWN_POOL is not None:
+        pool, _TEARDOWN_POOL = _TEARDOWN_POOL, None
+        pool.shutdown(wait=wait, cancel_pending=True)
+
+
 def _delete_resources(resources, scope):
     # global SIMPLEX_RECOVERED
     # if not SIMPLEX_RECOVERED and system_helper.is_simplex():
@@ -160,26 +252,47 @@ def _delete_resources(resources, scope):
         ('datanetwork', system_helper.delete_data_network, {}, False),
     ]
 
-    err_msgs = []
+    # Group resources by deletion level. Deletions on the same level are
+    # issued in parallel, and next level starts after all of them are done.
+    del_levels = {}
+    levels_cache = {}
     for item in del_list:
         resource_type, del_fun, fun_kwargs, del_all = item
         resource_ids = resources.get(resource_type, [])
         if not resource_ids:
             continue
 
-        LOG.fixture_step("({}) Attempt to delete following {}: {}".format(scope, resource_type, resource_ids))
         if 'auth_info' not in fun_kwargs:
             fun_kwargs['auth_info'] = Tenant.get('admin')
 
         if del_all:
             resource_ids = [resource_ids]
-        for resource_id in resource_ids:
-            try:
-                code, msg = del_fun(resource_id, fail_ok=True, **fun_kwargs)[0:2]
-                if code > 0:
-                    err_msgs.append(msg)
-            except exceptions.TiSError as e:
-                err_msgs.append(e.__str__())
+        level = _get_del_level(resource_type, levels_cache)
+        del_levels.setdefault(level, []).append((resource_type, del_fun, fun_kwargs, resource_ids))
+
+    if not del_levels:
+        return
+
+    err_msgs = []
+    start_time = time.time()
+    try:
+        for level in sorted(del_levels):
+            tasks = []
+            for resource_type, del_fun, fun_kwargs, resource_ids in del_levels[level]:
+                LOG.fixture_step("({}) Attempt to delete following {}: {}".format(scope, resource_type, resource_ids))
+                tasks += [(del_fun, resource_id, fun_kwargs) for resource_id in resource_ids]
+
+            if len(tasks) == 1:
+                results = [_delete_resource(*tasks[0])]
+            else:
+                pool = _get_teardown_pool()
+                futures_ = [pool.submit(_delete_resource, *task) for task in tasks]
+                results = [future.result() for future in futures_]
+
+            err_msgs += [msg for msg in results if msg]
+    finally:
+        LOG.info("({}) Teardown of {} resource type(s) in {} level(s) took {:.1f} seconds".format(
+            scope, sum(len(types_) for types_ in del_levels.values()), len(del_levels), time.time() - start_time))
 
     # Attempt all deletions before raising exception.
     if err_msgs:
@@ -41,21 +41,26 @@ def check_alarms_module(request):
 
 
 def __verify_alarms(request, scope):
-    before_alarms = __get_alarms(scope=scope)
-    prev_bad_pods = kube_helper.get_unhealthy_pods(all_namespaces=True)
-    prev_applied_apps = container_helper.get_apps(field='application',
-                                                  status=AppStatus.APPLIED)
-
-    def verify_():
-        LOG.fixture_step(
-            "({}) Verify system alarms, applications and pods status after "
-            "test {} ended...".format(scope, scope))
+    LOG.fixture_step("({}) Gathering system health info before test {} "
+                     "begins.".format(scope, scope))
+    # alarms, pods and apps are gathered concurrently
+    results = check_helper.run_checks({
+        'alarms': (__get_alarms_snapshot, (scope,)),
+        'pods': (kube_helper.get_unhealthy_pods, (), {'all_namespaces': True}),
+        'apps': (container_helper.get_apps, (),
+                 {'field': 'application', 'status': AppStatus.APPLIED})})[1]
+    before_alarms = results['alarms']['output']
+    prev_bad_pods = results['pods']['output']
+    prev_applied_apps = results['apps']['output']
+
+    def check_alarms_():
         alarm_res, new_alarms = check_helper.check_alarms(
             before_alarms=before_alarms, fail_ok=True)
-        post_apps_status = container_helper.get_apps(
-            field=('application', 'status'), application=prev_applied_apps)
-        LOG.info('prev bad pods: {}'.format(prev_bad_pods))
+        assert alarm_res, "New alarm(s) appeared within test {}: {}".format(
+            scope, new_alarms)
 
+    def check_pods_():
+        LOG.info('prev bad pods: {}'.format(prev_bad_pods))
         exclude = False
         prev_name = None
         if prev_bad_pods:
@@ -65,8 +70,11 @@ def __verify_alarms(request, scope):
                                           name=prev_name, exclude=exclude,
                                           strict=True)
 
+    def check_apps_():
         # check no new bad application
         LOG.info("Check applications status...")
+        post_apps_status = container_helper.get_apps(
+            field=('application', 'status'), application=prev_applied_apps)
         new_bad_apps = [item for item in post_apps_status if
                         item[1] != AppStatus.APPLIED]
         if new_bad_apps:
@@ -78,9 +86,13 @@ def __verify_alarms(request, scope):
             new_bad_apps = [item for item in new_bad_apps if item[0] not in applying_apps]
         assert not new_bad_apps, "Applications no longer applied after test " \
                                  "{}: {}".format(scope, new_bad_apps)
-        # check no new alarms
-        assert alarm_res, "New alarm(s) appeared within test {}: {}".format(
-            scope, new_alarms)
+
+    def verify_():
+        LOG.fixture_step(
+            "({}) Verify system alarms, applications and pods status after "
+            "test {} ended...".format(scope, scope))
+        check_helper.run_checks({'alarms': check_alarms_, 'pods': check_pods_,
+                                 'apps': check_apps_}, timeout=900)
 
     request.addfinalizer(verify_)
 
@@ -96,14 +108,15 @@ def check_i40e_hosts(request):
         cmd = """cat /var/log/kern.log | grep -i --color=never "(i40e): 
         transmit queue" | awk '$0 > "{}"'""". \
             format(start_time)
-        i40e_errs = []
         host_helper.wait_for_hosts_ready(hosts=hosts)
-        for host in hosts:
+
+        def _check_host(host):
             with host_helper.ssh_to_host(hostname=host) as host_ssh:
                 output = host_ssh.exec_cmd(cmd)[1]
-                if output:
-                    i40e_errs.append("{}: {}".format(host, output))
-        assert not i40e_errs, "i40e errors: {}".format(i40e_errs)
+                assert not output, "i40e errors: {}".format(output)
+
+        check_helper.run_checks({host: (_check_host, (host, )) for host in
+                                 hosts})
 
     request.addfinalizer(check_kern_log)
 
@@ -156,6 +169,13 @@ def pre_alarms_function():
 def __get_alarms(scope):
     LOG.fixture_step("({}) Gathering system health info before test {} "
                      "begins.".format(scope, scope))
+    return __get_alarms_snapshot(scope)
+
+
+def __get_alarms_snapshot(scope):
+    tracker = system_helper.AlarmTracker.get_tracker()
+    if tracker:
+        return tracker.take_snapshot(scope)
     alarms = system_helper.get_alarms()
     return alarms
 
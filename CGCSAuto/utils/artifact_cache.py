@@ -0,0 +1,435 @@
+import os
+import re
+import threading
+
+from consts.auth import HostLinuxUser, TestFileServer
+from consts.proj_vars import ProjVar
+from utils import exceptions
+from utils.tis_log import LOG
+
+
+CHECKSUM_CMD = 'sha256sum'
+NATBOX_CACHE_DIR = '/tmp/artifact_cache'
+
+
+def get_avail_space(ssh_client, path):
+    """
+    Get available disk space in GiB on given path
+
+    Args:
+        ssh_client (SSHClient):
+        path (str):
+
+    Returns (float): e.g., 9.2
+
+    """
+    size = ssh_client.exec_cmd("df {} | awk '{{print $4}}'".format(path),
+                               fail_ok=False)[1]
+    size = float(size.splitlines()[-1].strip()) / (1024 * 1024)
+    return size
+
+
+def get_fs_usage(ssh_client, path):
+    """
+    Get size and available space in GiB of the file system of given path
+
+    Args:
+        ssh_client (SSHClient):
+        path (str):
+
+    Returns (tuple): (<total>, <available>), e.g., (19.5, 9.2)
+
+    """
+    output = ssh_client.exec_cmd("df -P {} | awk '{{print $2, $4}}'".format(
+        path), fail_ok=False)[1]
+    total, avail = output.splitlines()[-1].split()
+    return float(total) / (1024 * 1024), float(avail) / (1024 * 1024)
+
+
+def get_checksum(ssh_client, path, is_dir=False, timeout=1800,
+                 fail_ok=False):
+    """
+    Get sha256 checksum of a file, or of all files under a directory
+
+    Args:
+        ssh_client (SSHClient):
+        path (str):
+        is_dir (bool):
+        timeout (int):
+        fail_ok (bool):
+
+    Returns (str|None): None if failed and fail_ok=True
+
+    """
+    if is_dir:
+        cmd = "cd {} && find . -type f -print0 | sort -z | xargs -0 {} | " \
+              "{}".format(path, CHECKSUM_CMD, CHECKSUM_CMD)
+    else:
+        cmd = '{} {}'.format(CHECKSUM_CMD, path)
+    code, output = ssh_client.exec_cmd(cmd, fail_ok=True,
+                                       expect_timeout=timeout)
+    checksum = re.search(r'\b([0-9a-f]{64})\b', output)
+    if code != 0 or not checksum:
+        if fail_ok:
+            return None
+        raise exceptions.CommonError(
+            "Failed to get checksum of {}: {}".format(path, output))
+    return checksum.group(1)
+
+
+class ArtifactCache:
+    """
+    Content addressed file cache on a remote host, such as guest images
+    copied from test server to active controller.
+
+    Files are pulled via rsync --partial, so interrupted transfers resume and
+    unchanged source files are not transferred again. Cached files are
+    stored by sha256 checksum and hard linked to requested destinations, so
+    removing the destination file (e.g., after glance image is created) keeps
+    the cached copy. Cached files are read-only, since writing to a linked
+    destination in place would modify the cached file as well. Least recently used files are evicted before a file is
+    fetched if free space on the cache file system would be insufficient, or
+    if file system usage would exceed max_used_percent, e.g., to stay below
+    platform filesystem alarm threshold. Files still linked outside of the
+    cache are not evicted, since removing them frees no space.
+
+    Layout under cache_dir:
+        objects/<sha256>                cached files
+        sources/<server>:<path>         last rsync'ed copy of a source file.
+                                        Hard link of its object if complete.
+        sources/<server>:<path>.sha256  checksum of the source file copy
+
+    e.g.,
+        cache = ArtifactCache.get_cache(con_ssh)
+        if cache:
+            checksum = cache.fetch(source_server, '/sandbox/images/img.qcow2')
+            cache.link(checksum, '/home/sysadmin/images/img.qcow2')
+    """
+    # Serialize transfers of the same source to the same cache
+    __key_locks = {}
+    __lock = threading.Lock()
+
+    def __init__(self, ssh_client, cache_dir=None, reserve_gib=2,
+                 max_used_percent=75):
+        """
+
+        Args:
+            ssh_client (SSHClient): ssh client of the host to cache files on
+            cache_dir (str|None): <home>/.artifact_cache if None
+            reserve_gib (int|float): min free space in GiB to keep on cache
+                file system after a file is cached
+            max_used_percent (int|float|None): max usage of cache file system
+                after a file is cached. No limit if None.
+        """
+        if not cache_dir:
+            cache_dir = os.path.join(HostLinuxUser.get_home(),
+                                     '.artifact_cache')
+        self.ssh_client = ssh_client
+        self.cache_dir = cache_dir.rstrip('/')
+        self.objects_dir = '{}/objects'.format(self.cache_dir)
+        self.sources_dir = '{}/sources'.format(self.cache_dir)
+        self.reserve_gib = reserve_gib
+        self.max_used_percent = max_used_percent
+        self._dirs_created = False
+
+    @classmethod
+    def get_cache(cls, ssh_client, cache_dir=None):
+        """
+        Get artifact cache on host of given ssh client
+
+        Args:
+            ssh_client (SSHClient):
+            cache_dir (str|None):
+
+        Returns (ArtifactCache|None): None if artifact cache is disabled
+
+        """
+        if not ProjVar.get_var('ARTIFACT_CACHE'):
+            return None
+        return cls(ssh_client, cache_dir=cache_dir)
+
+    def __get_key_lock(self, key):
+        with ArtifactCache.__lock:
+            lock_key = (self.ssh_client.host, self.cache_dir, key)
+            lock = ArtifactCache.__key_locks.get(lock_key)
+            if lock is None:
+                lock = ArtifactCache.__key_locks[lock_key] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def get_key(source_server, source_path):
+        return '{}:{}'.format(source_server, source_path).replace('/', '%')
+
+    def get_object_path(self, checksum):
+        return '{}/{}'.format(self.objects_dir, checksum)
+
+    def get_source_path(self, source_server, source_path):
+        """
+        Get path of cached copy of given source file, which is the rsync
+        destination of the source file
+        """
+        return '{}/{}'.format(self.sources_dir,
+                              self.get_key(source_server, source_path))
+
+    def _exec(self, cmd, fail_ok=False, expect_timeout=60):
+        return self.ssh_client.exec_cmd(cmd, fail_ok=fail_ok,
+                                        expect_timeout=expect_timeout)
+
+    def create_dirs(self):
+        if not self._dirs_created:
+            self._exec('mkdir -p {} {}'.format(self.objects_dir,
+                                               self.sources_dir))
+            self._dirs_created = True
+
+    def get_checksum(self, file_path, timeout=1800):
+        return get_checksum(self.ssh_client, file_path, timeout=timeout)
+
+    def has(self, checksum):
+        return self._exec('test -f {}'.format(self.get_object_path(checksum)),
+                          fail_ok=True)[0] == 0
+
+    def get_size_gib(self, checksum):
+        size = self._exec('stat -c %s {}'.format(
+            self.get_object_path(checksum)))[1]
+        return int(size.splitlines()[-1].strip()) / (1024 * 1024 * 1024)
+
+    def get_transfer_size_gib(self, source_server, source_path, source_user,
+                              source_password, timeout=600):
+        """
+        Get size of source file to be transferred to cache via rsync dry run.
+        0 if cached copy of source file is up to date.
+
+        Returns (float|None): None if failed to get the size
+
+        """
+        code, output = self.ssh_client.rsync_on_dest(
+            source_user=source_user, source_ip=source_server,
+            source_path=source_path,
+            dest_path=self.get_source_path(source_server, source_path),
+            source_pswd=source_password, extra_opts=['--dry-run', '--stats'],
+            timeout=timeout, fail_ok=True)
+        size = re.search(r'Total transferred file size: ([\d,]+) bytes',
+                         output)
+        if code != 0 or not size:
+            LOG.warning("Failed to get size of {}:{}: {}".format(
+                source_server, source_path, output))
+            return None
+        return int(size.group(1).replace(',', '')) / (1024 * 1024 * 1024)
+
+    def __get_source_checksum(self, cached_path):
+        """
+        Get recorded checksum of a complete source file copy
+
+        Returns (str|None): None if source copy is not complete
+
+        """
+        checksum = self._exec('cat {}.sha256'.format(cached_path),
+                              fail_ok=True)[1].strip()
+        return checksum if re.fullmatch(r'[0-9a-f]{64}', checksum) else None
+
+    def add(self, file_path, checksum=None):
+        """
+        Add a file on the cache host to cache. File has to be under
+        sources dir, so it is hard linked to its object.
+
+        Args:
+            file_path (str): see get_source_path()
+            checksum (str|None): expected checksum. CommonError is raised if
+                file checksum is different, e.g., corrupted transfer.
+
+        Returns (str): checksum
+
+        """
+        actual_checksum = self.get_checksum(file_path)
+        if checksum and checksum != actual_checksum:
+            self._exec('rm -f {} {}.sha256'.format(file_path, file_path),
+                       fail_ok=True)
+            raise exceptions.CommonError(
+                "Checksum mismatch for {}. Expected: {}, actual: {}".format(
+                    file_path, checksum, actual_checksum))
+
+        self._exec('chmod a-w {} && ln -f {} {} && echo {} > {}.sha256'.format(
+            file_path, file_path, self.get_object_path(actual_checksum),
+            actual_checksum, file_path))
+        return actual_checksum
+
+    def fetch(self, source_server, source_path, source_user=None,
+              source_password=None, size_gib=None, timeout=3600):
+        """
+        Pull a file from remote server to cache if not already cached
+
+        Args:
+            source_server (str): server ip or hostname
+            source_path (str): file path on source server
+            source_user (str|None): test file server user if None
+            source_password (str|None): test file server password if None
+            size_gib (int|float|None): expected file size to ensure free
+                space for. Size to be transferred from source server is used
+                if None.
+            timeout (int):
+
+        Returns (str): checksum of the cached file
+
+        """
+        if not source_user:
+            source_user = TestFileServer.get_user()
+        if not source_password:
+            source_password = TestFileServer.get_password()
+
+        key = self.get_key(source_server, source_path)
+        with self.__get_key_lock(key):
+            self.create_dirs()
+            if size_gib is None:
+                size_gib = self.get_transfer_size_gib(
+                    source_server, source_path, source_user=source_user,
+                    source_password=source_password)
+            self.evict(required_gib=size_gib or 0)
+
+            cached_path = self.get_source_path(source_server, source_path)
+            prev_checksum = self.__get_source_checksum(cached_path)
+            try:
+                output = self.ssh_client.rsync_on_dest(
+                    source_user=source_user, source_ip=source_server,
+                    source_path=source_path, dest_path=cached_path,
+                    source_pswd=source_password,
+                    extra_opts=['--partial', '--itemize-changes'],
+                    timeout=timeout)[1]
+            except Exception as e:
+                # partial copy is kept for next fetch to resume from, but its
+                # checksum is unknown
+                self._exec('rm -f {}.sha256'.format(cached_path),
+                           fail_ok=True)
+                if prev_checksum and self.has(prev_checksum):
+                    # e.g., source server unreachable. Previously cached
+                    # content is used.
+                    LOG.warning("Failed to rsync {}:{}. Use cached {}. "
+                                "Details: {}".format(source_server,
+                                                     source_path,
+                                                     prev_checksum, e))
+                    return prev_checksum
+                raise
+
+            # rsync itemizes transferred files only
+            if not re.search(r'^>f', output, re.MULTILINE) and \
+                    prev_checksum and self.has(prev_checksum):
+                LOG.info("{}:{} is cached as {}".format(
+                    source_server, source_path, prev_checksum))
+                return prev_checksum
+
+            checksum = self.add(cached_path)
+            LOG.info("{}:{} is added to cache as {}".format(
+                source_server, source_path, checksum))
+            return checksum
+
+    def link(self, checksum, dest_path):
+        """
+        Place cached file at given destination. Hard link if on the same file
+        system as cache, which is read-only, otherwise writable copy.
+
+        Args:
+            checksum (str):
+            dest_path (str):
+
+        Returns (str): dest_path
+
+        """
+        object_path = self.get_object_path(checksum)
+        # access time is used for LRU eviction
+        code, output = self._exec(
+            'touch -a -c {obj} && chmod a-w {obj} && mkdir -p {dest_dir} && '
+            '(ln -f {obj} {dest} 2>/dev/null || '
+            '(cp -f {obj} {dest} && chmod u+w {dest}))'.format(
+                obj=object_path, dest_dir=os.path.dirname(dest_path),
+                dest=dest_path), fail_ok=True, expect_timeout=1800)
+        if code != 0:
+            raise exceptions.CommonError(
+                "Failed to place cached {} at {}: {}".format(
+                    checksum, dest_path, output))
+        return dest_path
+
+    def _has_space(self, required_gib):
+        """
+        Whether cache file system has enough space for required_gib
+
+        Returns (tuple): (<bool>, <avail>, <used_percent>)
+
+        """
+        total, avail = get_fs_usage(self.ssh_client, self.cache_dir)
+        used_percent = (total - avail + required_gib) * 100 / total
+        enough = avail - required_gib >= self.reserve_gib
+        if self.max_used_percent is not None:
+            enough = enough and used_percent <= self.max_used_percent
+        return enough, avail, used_percent
+
+    def _get_eviction_candidates(self):
+        """
+        Get cached checksums from least to most recently used. Objects
+        linked outside of cache, e.g., destination file not removed after
+        use, are excluded since evicting them frees no space.
+
+        Returns (list):
+
+        """
+        output = self._exec(
+            "find {} -type f -printf '%A@ %n %f\\n' | sort -n".format(
+                self.objects_dir), fail_ok=True)[1]
+        checksums = []
+        for line in output.splitlines():
+            if not re.fullmatch(r'[\d.]+ \d+ [0-9a-f]{64}', line.strip()):
+                continue
+            links, checksum = line.split()[1:]
+            if int(links) > 1:
+                # object itself plus source copies are linked in cache
+                cache_links = self._exec(
+                    'find {} -samefile {} | wc -l'.format(
+                        self.cache_dir, self.get_object_path(checksum)),
+                    fail_ok=True)[1].strip()
+                if not cache_links.isdigit() or int(links) > int(
+                        cache_links):
+                    LOG.info("{} is linked outside of artifact cache on {}. "
+                             "Skip eviction.".format(checksum,
+                                                     self.ssh_client.host))
+                    continue
+            checksums.append(checksum)
+        return checksums
+
+    def evict(self, required_gib=0):
+        """
+        Remove least recently used files from cache until free space on cache
+        file system is at least required_gib plus reserve_gib, and its usage
+        is at most max_used_percent after required_gib is used.
+
+        Args:
+            required_gib (int|float):
+
+        Returns (float): available space in GiB
+
+        """
+        enough, avail, used_percent = self._has_space(required_gib)
+        if enough:
+            return avail
+
+        for checksum in self._get_eviction_candidates():
+            LOG.info("Evict {} from artifact cache on {}. Available: "
+                     "{:.1f}G, required: {:.1f}G, used after caching: "
+                     "{:.0f}%".format(checksum, self.ssh_client.host, avail,
+                                      required_gib, used_percent))
+            # source copies are hard links of the object, remove them too
+            self._exec(
+                "grep -l {checksum} {sources}/*.sha256 2>/dev/null | "
+                "sed 's/\\.sha256$//' | xargs -r -I{{}} rm -f {{}} {{}}.sha256; "
+                "rm -f {obj}".format(checksum=checksum,
+                                     sources=self.sources_dir,
+                                     obj=self.get_object_path(checksum)),
+                fail_ok=True)
+            enough, avail, used_percent = self._has_space(required_gib)
+            if enough:
+                break
+        else:
+            LOG.warning("Available space on {} is {:.1f}G and usage after "
+                        "caching is {:.0f}% after evicting artifact cache. "
+                        "Required: {:.1f}G, reserved: {}G, max usage: "
+                        "{}%".format(self.cache_dir, avail, used_percent,
+                                     required_gib, self.reserve_gib,
+                                     self.max_used_percent))
+        return avail
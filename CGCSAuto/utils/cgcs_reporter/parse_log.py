@@ -1,4 +1,10 @@
+import gzip
+import json
+import mmap
+import os
 import re
+import zlib
+from glob import glob
 from os import path
 
 write_command_pattern = "^(?!.*((system|nova|cinder|fm|openstack|ceilometer|heat|glance|gnocchi).*(show|list)|echo \$\?|whoami|hostname|exit|stat|ls|Send '')).*"
@@ -31,6 +37,292 @@ def _get_failed_test_names(log_dir):
         return failed_tests
 
 
+class LogIndex:
+    """
+    Byte offset index of test boundaries in TIS_AUTOMATION.log and test
+    entries in pytestlog.log.
+
+    The index is updated incrementally, i.e., only bytes appended since last
+    update are scanned, and test logs/tracebacks are read by seeking to the
+    recorded offsets via mmap instead of scanning whole log files.
+
+    The index is saved to log_index.json in log dir, so it can be reused by
+    post-processing in another process.
+
+    If TIS_AUTOMATION.log is rotated (see --log-rotate-size) or truncated,
+    recorded offsets no longer match the file. The index is then marked stale,
+    and tests are indexed on demand from the full log, i.e., rotated
+    <log>.<n>.gz files followed by the current log.
+    """
+    INDEX_FILE = 'log_index.json'
+    TIS_LOG = 'TIS_AUTOMATION.log'
+    PYTEST_LOG = 'pytestlog.log'
+    # bytes at the start of TIS_AUTOMATION.log used to tell whether it was replaced
+    HEAD_SIZE = 1024
+
+    # marker in TIS_AUTOMATION.log: test phase
+    __PHASE_MARKERS = {b'Setup started for: ': 'setup',
+                       b'Test steps started for: ': 'call',
+                       b'Teardown started for: ': 'teardown',
+                       b'Test Result for: ': 'result'}
+    __pytest_entry = re.compile(rb'^(\S) (\S+)[ \t]*$', re.M)
+    __instances = {}
+
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.tis_offset = 0
+        self.tis_inode = None
+        # [<length>, <crc32>] of the head of TIS_AUTOMATION.log. Inode may be reused after rotation.
+        self.tis_head = None
+        self.stale = False
+        self.pytest_offset = 0
+        # [{'name': <test_name>, 'setup': <offset>, 'call': .., 'teardown': .., 'result': .., 'end': ..}, ...]
+        self.tests = []
+        # [[<status>, <test_name>, <start>, <end>], ...]
+        self.pytest_entries = []
+        # (<full log content>, <tests indexed from it>) when stale
+        self.__full_index = None
+        self.__load()
+
+    @classmethod
+    def get_index(cls, log_dir):
+        """
+        Get the index of given log dir. Index is cached per log dir.
+
+        Args:
+            log_dir (str):
+
+        Returns (LogIndex):
+
+        """
+        if log_dir not in cls.__instances:
+            cls.__instances[log_dir] = cls(log_dir)
+        return cls.__instances[log_dir]
+
+    def __load(self):
+        index_path = path.join(self.log_dir, self.INDEX_FILE)
+        if not path.exists(index_path):
+            return
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            self.tis_offset = index['tis_offset']
+            self.tis_inode = index.get('tis_inode')
+            self.tis_head = index.get('tis_head')
+            self.stale = index.get('stale', False)
+            self.pytest_offset = index['pytest_offset']
+            self.tests = index['tests']
+            self.pytest_entries = index['pytest_entries']
+        except (ValueError, KeyError):
+            pass
+
+    def save(self):
+        with open(path.join(self.log_dir, self.INDEX_FILE), 'w') as f:
+            json.dump({'tis_offset': self.tis_offset, 'tis_inode': self.tis_inode, 'tis_head': self.tis_head,
+                       'stale': self.stale,
+                       'pytest_offset': self.pytest_offset, 'tests': self.tests,
+                       'pytest_entries': self.pytest_entries}, f)
+
+    @staticmethod
+    def __mmap(file_path):
+        if not path.exists(file_path) or not path.getsize(file_path):
+            return None
+        with open(file_path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def update(self):
+        """
+        Index bytes appended to the logs since last update
+        """
+        self.__full_index = None
+        self.__update_tis_log()
+        self.__update_pytest_log()
+
+    def __update_tis_log(self):
+        log_path = path.join(self.log_dir, self.TIS_LOG)
+        if self.stale or not path.exists(log_path):
+            return
+
+        inode = os.stat(log_path).st_ino
+        if self.tis_inode is not None and (inode != self.tis_inode or path.getsize(log_path) < self.tis_offset):
+            # Rotated or truncated. Fall back to indexing the full log on demand.
+            self.stale = True
+            return
+
+        mm = self.__mmap(log_path)
+        if mm is None:
+            return
+        with mm:
+            if self.tis_head and zlib.crc32(mm[:self.tis_head[0]]) != self.tis_head[1]:
+                self.stale = True
+                return
+            self.tis_inode = inode
+            head_len = min(len(mm), self.HEAD_SIZE)
+            self.tis_head = [head_len, zlib.crc32(mm[:head_len])]
+            self.tis_offset = self.__index_tis_log(mm, self.tis_offset, self.tests)
+
+    def __index_tis_log(self, content, offset, tests):
+        """
+        Index test boundaries in given TIS_AUTOMATION.log content from offset
+
+        Args:
+            content (mmap|bytes):
+            offset (int):
+            tests (list): indexed tests to append to
+
+        Returns (int): offset indexed up to
+
+        """
+        size = len(content)
+        # only index complete lines
+        end = content.rfind(b'\n', offset, size) + 1
+        pos = offset
+        while pos < end:
+            pos = content.find(b' for: ', pos, end)
+            if pos < 0:
+                break
+            line_start = content.rfind(b'\n', 0, pos) + 1
+            line_end = content.find(b'\n', pos, end)
+            line = content[line_start:line_end]
+            pos = line_end
+            for marker, phase in self.__PHASE_MARKERS.items():
+                if line.startswith(marker):
+                    break
+            else:
+                continue
+
+            name = line[len(marker):].decode(errors='replace').strip()
+            if phase == 'result':
+                name = name.rsplit(' - ', 1)[0]
+            name = _normalize_test_name(name)
+            if phase == 'setup' or not tests or tests[-1]['name'] != name:
+                tests.append({'name': name})
+            tests[-1][phase] = line_start
+            if phase == 'result':
+                tests[-1]['end'] = line_end + 1
+
+        return max(end, offset)
+
+    def __get_full_index(self):
+        """
+        Index full TIS_AUTOMATION.log including rotated files. Used when index
+        is stale.
+
+        Returns (tuple): (<full log content(bytes)>, <tests(list)>)
+
+        """
+        if self.__full_index is None:
+            log_path = path.join(self.log_dir, self.TIS_LOG)
+            # <log>.1.gz is the most recent rotated file
+            rotated = sorted(glob(log_path + '.*.gz'), key=lambda file_path: int(file_path.split('.')[-2]),
+                             reverse=True)
+            parts = []
+            for file_path in rotated:
+                with gzip.open(file_path, 'rb') as f:
+                    parts.append(f.read())
+            if path.exists(log_path):
+                with open(log_path, 'rb') as f:
+                    parts.append(f.read())
+            content = b''.join(parts)
+            tests = []
+            self.__index_tis_log(content, 0, tests)
+            self.__full_index = (content, tests)
+        return self.__full_index
+
+    def __update_pytest_log(self):
+        mm = self.__mmap(path.join(self.log_dir, self.PYTEST_LOG))
+        if mm is None:
+            return
+        with mm:
+            end = mm.rfind(b'\n', self.pytest_offset, len(mm)) + 1
+            for match in self.__pytest_entry.finditer(mm, self.pytest_offset, end):
+                if self.pytest_entries:
+                    self.pytest_entries[-1][3] = match.start()
+                self.pytest_entries.append([match.group(1).decode(), _normalize_test_name(match.group(2).decode()),
+                                            match.start(), end])
+            if self.pytest_entries and self.pytest_entries[-1][3] < end:
+                self.pytest_entries[-1][3] = end
+            self.pytest_offset = max(end, self.pytest_offset)
+
+    def get_tests(self, test_name=None):
+        """
+        Get indexed test runs
+
+        Args:
+            test_name (str|None): such as test_xxx[param]. Return all tests if None.
+
+        Returns (list): list of dict with name and offsets of test phases
+
+        """
+        tests = self.__get_full_index()[1] if self.stale else self.tests
+        if test_name is None:
+            return list(tests)
+        test_name = _normalize_test_name(test_name)
+        return [test for test in tests if test['name'] == test_name]
+
+    def get_test_log(self, test, phase=None):
+        """
+        Get TIS_AUTOMATION.log content of a test run
+
+        Args:
+            test (dict): test run from get_tests() since last update()
+            phase (str|None): setup, call, teardown. Whole test if None.
+
+        Returns (str):
+
+        """
+        start = test.get(phase or 'setup')
+        if start is None:
+            return ''
+        phases = ('setup', 'call', 'teardown', 'result')
+        end = test.get('end')
+        if phase:
+            next_offsets = [test[phase_] for phase_ in phases[phases.index(phase) + 1:] if phase_ in test]
+            end = next_offsets[0] if next_offsets else end
+        if self.stale:
+            content = self.__get_full_index()[0]
+            return content[start:end or len(content)].decode(errors='replace')
+
+        mm = self.__mmap(path.join(self.log_dir, self.TIS_LOG))
+        if mm is None:
+            return ''
+        with mm:
+            return mm[start:end or self.tis_offset].decode(errors='replace')
+
+    def get_pytest_entry(self, test_name, statuses='EF'):
+        """
+        Get the last pytestlog.log entry of given test with given status
+
+        Args:
+            test_name (str):
+            statuses (str): status letters in pytestlog. Such as 'EF' for failure and error
+
+        Returns (list): lines of the entry excluding the status line
+
+        """
+        test_name = _normalize_test_name(test_name)
+        for status, name, start, end in reversed(self.pytest_entries):
+            if name == test_name and status in statuses:
+                mm = self.__mmap(path.join(self.log_dir, self.PYTEST_LOG))
+                with mm:
+                    return mm[start:end].decode(errors='replace').splitlines()[1:]
+        return []
+
+
+def _normalize_test_name(test_name):
+    if '::test_' in test_name:
+        test_name = 'test_' + test_name.split('::test_', 1)[1]
+    return test_name.strip()
+
+
+def update_log_index(log_dir):
+    """
+    Index logs written so far. Called after each test so that post-run parsing
+    only needs to seek to the recorded offsets.
+    """
+    LogIndex.get_index(log_dir).update()
+
+
 def get_tracebacks_from_pytestlog(log_dir, traceback_lines=10, search_forward=False):
     """
         Parses pytestlog for the traceback of any failures up to a specified line count
@@ -49,33 +341,14 @@ def get_tracebacks_from_pytestlog(log_dir, traceback_lines=10, search_forward=Fa
     if not failed_tests:
         return traceback_dict
 
-    new_test_pattern = '(E|F|.|S) \S'
-    current_failure = None
-    next_failure = failed_tests.pop(0)
-    traceback_for_test = []
-    with open(path.join(log_dir, 'pytestlog.log'), 'r') as file:
-        for line in file:
-            if current_failure is not None:
-                if re.match(new_test_pattern, line):
-                    traceback = parse_traceback(traceback_for_test, traceback_lines=traceback_lines,
-                                                         search_forward=search_forward)
-                    traceback_dict[current_failure] = traceback
-                    current_failure = None
-                    try:
-                        next_failure = failed_tests.pop(0)
-                    except IndexError:
-                        break
-                else:
-                    traceback_for_test.append(line[1:].strip())
-                    continue
-
-            if next_failure in line:
-                current_failure = next_failure
-        else:
-            # Meaning last test is a failed test
-            traceback = parse_traceback(traceback_for_test, traceback_lines=traceback_lines,
-                                        search_forward=search_forward)
-            traceback_dict[current_failure] = traceback
+    log_index = LogIndex.get_index(log_dir)
+    log_index.update()
+    for test_name in failed_tests:
+        entry_lines = log_index.get_pytest_entry(test_name)
+        if entry_lines:
+            traceback_for_test = [line[1:].strip() for line in entry_lines]
+            traceback_dict[test_name] = parse_traceback(traceback_for_test, traceback_lines=traceback_lines,
+                                                        search_forward=search_forward)
 
     return traceback_dict
 
@@ -126,62 +399,55 @@ def parse_test_steps(log_dir, failures_only=True):
     failed_tests = []
     if failures_only:
         failed_tests = _get_failed_test_names(log_dir)
-    test_found = False
-    test_steps_length = 0
-    test_steps = []
-
-    if failures_only and not failed_tests:
-        return
+        if not failed_tests:
+            return
 
-    with open("{}/TIS_AUTOMATION.log".format(log_dir), 'r') as file, \
-            open("{}/test_steps.log".format(log_dir), 'w') as log:
-        for line in file:
+    log_index = LogIndex.get_index(log_dir)
+    log_index.update()
+    log_index.save()
 
-            if test_steps_length >= 500:
-                log.write(''.join(test_steps))
-                test_steps_length = 0
-                test_steps = []
-
-            if not test_found:
-                if "Setup started for:" in line:
-                    if failures_only:
-                        split_line = line.split('::test_', 1)
-                        if len(split_line) is 2:
-                            test_name = 'test_' + split_line[1].replace('\n', '')
-                            if test_name in failed_tests:
-                                test_found = True
-                                test_steps.append(line)
-                                test_steps_length += 1
-                    else:
-                        test_found = True
-                        test_steps.append(line)
-                        test_steps_length += 1
+    with open("{}/test_steps.log".format(log_dir), 'w') as log:
+        for test in log_index.get_tests():
+            if failures_only and test['name'] not in failed_tests:
                 continue
+            log.write(''.join(_get_test_steps(log_index.get_test_log(test))))
 
-            if ":: Send " in line:
-                if re.search(write_command_pattern, line):
-                    test_steps.append(line)
-                    test_steps_length += 1
-                continue
 
-            if " started for:" in line:
-                test_steps.append("\n" + line)
-                test_steps_length += 1
-                continue
+def _get_test_steps(test_log):
+    """
+    Filter test steps and write commands from log of a test run
 
-            if "***Failure at" in line:
-                test_steps.append("\n" + line)
-                test_steps_length += 1
-                continue
+    Args:
+        test_log (str): TIS_AUTOMATION.log content from setup start to test result
+
+    Returns (list): lines of test steps
+
+    """
+    lines = test_log.splitlines(keepends=True)
+    if not lines:
+        return []
 
-            if re.search(test_steps_pattern, line):
+    test_steps = [lines[0]]
+    for line in lines[1:]:
+        if ":: Send " in line:
+            if re.search(write_command_pattern, line):
                 test_steps.append(line)
-                test_steps_length += 1
-                continue
+            continue
+
+        if " started for:" in line:
+            test_steps.append("\n" + line)
+            continue
+
+        if "***Failure at" in line:
+            test_steps.append("\n" + line)
+            continue
 
-            if "Test Result for:" in line:
-                test_found = False
-                test_steps.append("\n\n\n\n\n\n")
-                test_steps_length += 6
+        if re.search(test_steps_pattern, line):
+            test_steps.append(line)
+            continue
+
+        if "Test Result for:" in line:
+            test_steps.append("\n\n\n\n\n\n")
+            break
 
-        log.write(''.join(test_steps))
+    return test_steps
@@ -333,26 +333,45 @@ def upload_test_result(session_id, test_name, result, start_time, end_time, trac
     Returns (str|None): exec_id or None if record already exists
     """
 
+    with open_conn_and_get_cur(dbname=DB_NAME, user=USER, host=HOST, password=PASSWORD) as cursor:
+        return _insert_test_result(cursor, session_id=session_id, test_name=test_name, result=result,
+                                   start_time=start_time, end_time=end_time, traceback=traceback,
+                                   search_forward=search_forward, parse_name=parse_name, **extra_info)
+
+
+def upload_test_result_batch(results):
+    """
+    Upload results for multiple testcases to database via one connection
+    Args:
+        results (list): list of kwargs dicts for upload_test_result()
+
+    Returns (list): exec_id or None if record already exists, for each result
+    """
+    with open_conn_and_get_cur(dbname=DB_NAME, user=USER, host=HOST, password=PASSWORD) as cursor:
+        return [_insert_test_result(cursor, **result) for result in results]
+
+
+def _insert_test_result(cursor, session_id, test_name, result, start_time, end_time, traceback=None,
+                        search_forward=False, parse_name=False, **extra_info):
     if parse_name:
         test_name = 'test_{}'.format(test_name.split('::test_', 1)[-1])
 
-    with open_conn_and_get_cur(dbname=DB_NAME, user=USER, host=HOST, password=PASSWORD) as cursor:
-        test_id = get_test_id(test_name, cursor=cursor)
-        test_info = dict(session_id=session_id, test_id=test_id, result=result, start_time=start_time,
-                         end_time=end_time)
+    test_id = get_test_id(test_name, cursor=cursor)
+    test_info = dict(session_id=session_id, test_id=test_id, result=result, start_time=start_time,
+                     end_time=end_time)
 
-        if traceback:
-            if isinstance(traceback, list):
-                traceback = traceback[0]
-            traceback = parse_log.parse_traceback(traceback, search_forward=search_forward)
-            test_info['comments'] = "<pre>" + html.escape(traceback) + "</pre>"
+    if traceback:
+        if isinstance(traceback, list):
+            traceback = traceback[0]
+        traceback = parse_log.parse_traceback(traceback, search_forward=search_forward)
+        test_info['comments'] = "<pre>" + html.escape(traceback) + "</pre>"
 
-        for key in 'jira':
-            val = extra_info.get(key, None)
-            if val:
-                test_info[key] = val
+    for key in 'jira':
+        val = extra_info.get(key, None)
+        if val:
+            test_info[key] = val
 
-        return insert_test_history(cursor, **test_info)
+    return insert_test_history(cursor, **test_info)
 
 
 def upload_test_session(lab_name, build_id, log_dir, tag=None, build_server=None, sw_version=None, patches=None,
@@ -1,4 +1,9 @@
 import os
+import re
+import json
+import calendar
+import threading
+import time
 
 from pytest import skip
 
@@ -9,11 +14,27 @@ from consts.timeout import CLI_TIMEOUT
 from utils import exceptions
 from utils.clients.ssh import ControllerClient
 from utils.clients.local import RemoteCLIClient
+from utils.kpi.kpi import KPI, get_cli_kpi_name
+from utils.tis_log import LOG
+
+AUTH_CACHE_TTL = 1800
+_auth_cache = {}
+_auth_cache_stats = {'hits': 0, 'misses': 0}
+_auth_cache_lock = threading.Lock()
+
+# Refresh keystone token this many seconds before it expires
+TOKEN_EXPIRY_MARGIN = 300
+TOKEN_AUTH_CLIS = ('openstack', )
+_token_cache = {}
+
+# clis that support '-f json' output. system and fm clients only provide
+# ascii tables.
+JSON_OUTPUT_CLIS = ('openstack', )
 
 
 def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False, con_telnet=None, flags='',
              fail_ok=False, cli_dir='', auth_info=None, source_openrc=None, err_only=False, timeout=CLI_TIMEOUT,
-             force_source=False):
+             force_source=False, token_auth=None, output_format=None):
     """
 
     Args:
@@ -38,6 +59,11 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
         cli_dir:
         err_only:
         timeout:
+        token_auth (None|bool): whether to authenticate with a cached keystone token instead of username/password.
+            Only applies to clis in TOKEN_AUTH_CLIS. Default to ProjVar CLI_TOKEN_AUTH when None.
+        output_format (None|str): 'json' to request json output and return the parsed object instead of the ascii
+            table. Only applies to clis in JSON_OUTPUT_CLIS, ascii output is returned for other clis.
+            The parsed object can be passed to table_parser.table() in place of the ascii output.
 
     Returns:
         if command executed successfully: return command_output
@@ -51,7 +77,6 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
     # Determine region and auth_url
     raw_cmd = cmd.strip().split()[0]
     is_dc = ProjVar.get_var('IS_DC')
-    platform_cmds = ('system', 'fm')
 
     if auth_info is None:
         auth_info = Tenant.get_primary()
@@ -61,27 +86,17 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
     if not platform and ProjVar.get_var('OPENSTACK_DEPLOYED') is False:
         skip('stx-openstack application is not applied.')
 
-    region = auth_info.get('region')
-    dc_region = region if region and is_dc else None
-    default_region_and_url = Tenant.get_region_and_url(platform=platform, dc_region=dc_region)
-
-    region = region if region else default_region_and_url['region']
-    auth_url = auth_info.get('auth_url', default_region_and_url['auth_url'])
-
-    if is_dc:
-        # Set proper region when cmd is against DC central cloud. This is needed due to the same auth_info may be
-        # passed to different keywords that require different region
-        if region in ('RegionOne', 'SystemController'):
-            region = 'RegionOne' if raw_cmd in platform_cmds else 'SystemController'
-
-        # # Reset auth_url if cmd is against DC central cloud RegionOne containerized services. This is needed due to
-        # # the default auth_url for central controller RegionOne is platform auth_url
-        # if region == 'RegionOne' and not platform:
-        #     auth_url = default_region_and_url['auth_url']
+    auth_context = _get_auth_context(raw_cmd=raw_cmd, auth_info=auth_info, platform=platform, is_dc=is_dc)
+    region = auth_context['region']
 
     positional_args = __convert_args(positional_args)
     flags = __convert_args(flags)
 
+    json_output = output_format == 'json' and raw_cmd in JSON_OUTPUT_CLIS
+    user_sub_cmd = sub_cmd
+    if json_output:
+        sub_cmd = '{} -f json'.format(sub_cmd)
+
     use_remote_cli = False
     remote_cli_flag = ProjVar.get_var('REMOTE_CLI')
     if not use_telnet:
@@ -102,6 +117,11 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
     if source_openrc is None:
         source_openrc = ProjVar.get_var('SOURCE_OPENRC')
 
+    if token_auth is None:
+        token_auth = ProjVar.get_var('CLI_TOKEN_AUTH')
+    token_auth = token_auth and raw_cmd in TOKEN_AUTH_CLIS and not use_telnet and not source_openrc
+
+    user_flags = flags
     if source_openrc:
         source_file = _get_rc_path(user=auth_info['user'], remote_cli=use_remote_cli, platform=platform)
         if use_telnet:
@@ -110,26 +130,13 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
             source_openrc_file(ssh_client=ssh_client, auth_info=auth_info, rc_file=source_file, fail_ok=fail_ok,
                                remote_cli=use_remote_cli, force=force_source)
         flags = ''
+    elif token_auth:
+        flags = '{} {}'.format(_get_token_args(ssh_client, auth_context=auth_context, cli_dir=cli_dir),
+                               flags.strip())
     elif auth_info:
-        # auth params
-        auth_args = ("--os-username '{}' --os-password '{}' --os-project-name {} --os-auth-url {} "
-                     "--os-user-domain-name Default --os-project-domain-name Default".
-                     format(auth_info['user'], auth_info['password'], auth_info['tenant'], auth_url))
-
-        flags = '{} {}'.format(auth_args.strip(), flags.strip())
+        flags = '{} {}'.format(auth_context['auth_args'], flags.strip())
 
-    # internal URL handling
-    if raw_cmd in ('openstack', 'sw-manager'):
-        flags += ' --os-interface internal'
-    else:
-        flags += ' --os-endpoint-type internalURL'
-
-    # region handling
-    if raw_cmd != 'dcmanager':
-        if raw_cmd == 'cinder':
-            flags += ' --os_region_name {}'.format(region)
-        else:
-            flags += ' --os-region-name {}'.format(region)
+    flags += auth_context['endpoint_args']
 
     complete_cmd = ' '.join([os.path.join(cli_dir, cmd), flags.strip(), sub_cmd, positional_args]).strip()
 
@@ -137,13 +144,24 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
     if complete_cmd.startswith('dcmanager'):
         complete_cmd = complete_cmd.replace('--os-project-name', '--os-tenant-name')
 
-    if use_telnet:
-        exit_code, cmd_output = con_telnet.exec_cmd(complete_cmd, expect_timeout=timeout)
-    else:
-        exit_code, cmd_output = ssh_client.exec_cmd(complete_cmd, err_only=err_only, expect_timeout=timeout,
-                                                    searchwindowsize=100)
+    with KPI(get_cli_kpi_name(cmd, sub_cmd)):
+        if use_telnet:
+            exit_code, cmd_output = con_telnet.exec_cmd(complete_cmd, expect_timeout=timeout)
+        else:
+            exit_code, cmd_output = ssh_client.exec_cmd(complete_cmd, err_only=err_only, expect_timeout=timeout,
+                                                        searchwindowsize=100)
+
+    if token_auth and exit_code != 0 and '(HTTP 401)' in cmd_output:
+        LOG.info("Keystone token rejected. Retry with a new token.")
+        _token_cache.pop(auth_context['token_key'], None)
+        return exec_cli(cmd, user_sub_cmd, positional_args=positional_args, ssh_client=ssh_client,
+                        flags=user_flags, fail_ok=fail_ok, cli_dir=cli_dir, auth_info=auth_info,
+                        source_openrc=source_openrc, err_only=err_only, timeout=timeout, force_source=force_source,
+                        token_auth=False, output_format=output_format)
 
     if exit_code == 0:
+        if json_output:
+            return 0, _parse_json_output(cmd_output)
         return 0, cmd_output
 
     if fail_ok and exit_code in [1, 2]:
@@ -152,6 +170,161 @@ def exec_cli(cmd, sub_cmd, positional_args='', ssh_client=None, use_telnet=False
     raise exceptions.CLIRejected("CLI '{}' failed to execute. Output: {}".format(complete_cmd, cmd_output))
 
 
+def _parse_json_output(cmd_output):
+    """
+    Parse output of cli with '-f json'. Lines before the json document, such as deprecation warnings, are skipped.
+
+    Args:
+        cmd_output (str):
+
+    Returns (list|dict):
+
+    """
+    start = min([i for i in (cmd_output.find('['), cmd_output.find('{')) if i >= 0] or [0])
+    try:
+        return json.loads(cmd_output[start:])
+    except ValueError:
+        raise exceptions.InvalidStructure("Unable to parse json output: {}".format(cmd_output))
+
+
+def _get_auth_context(raw_cmd, auth_info, platform, is_dc):
+    """
+    Get region and auth flags for given cli and auth_info. Results are cached
+    until AUTH_CACHE_TTL expires or invalidate_auth_cache() is called.
+
+    Args:
+        raw_cmd (str): cli name. such as 'openstack', 'system'
+        auth_info (dict):
+        platform (bool):
+        is_dc (bool):
+
+    Returns (dict): {'region': <region>,
+                     'auth_args': <--os-username ... flags>,
+                     'endpoint_args': <interface and region flags>}
+
+    """
+    key = (raw_cmd, platform, is_dc, auth_info.get('user'), auth_info.get('password'), auth_info.get('tenant'),
+           auth_info.get('region'), auth_info.get('auth_url'))
+    with _auth_cache_lock:
+        cached = _auth_cache.get(key)
+        if cached and time.time() < cached['expiry']:
+            _auth_cache_stats['hits'] += 1
+            return cached
+        _auth_cache_stats['misses'] += 1
+
+    region = auth_info.get('region')
+    dc_region = region if region and is_dc else None
+    default_region_and_url = Tenant.get_region_and_url(platform=platform, dc_region=dc_region)
+
+    region = region if region else default_region_and_url['region']
+    auth_url = auth_info.get('auth_url', default_region_and_url['auth_url'])
+
+    if is_dc:
+        # Set proper region when cmd is against DC central cloud. This is needed due to the same auth_info may be
+        # passed to different keywords that require different region
+        if region in ('RegionOne', 'SystemController'):
+            region = 'RegionOne' if raw_cmd in ('system', 'fm') else 'SystemController'
+
+        # # Reset auth_url if cmd is against DC central cloud RegionOne containerized services. This is needed due to
+        # # the default auth_url for central controller RegionOne is platform auth_url
+        # if region == 'RegionOne' and not platform:
+        #     auth_url = default_region_and_url['auth_url']
+
+    # auth params
+    auth_args = ("--os-username '{}' --os-password '{}' --os-project-name {} --os-auth-url {} "
+                 "--os-user-domain-name Default --os-project-domain-name Default".
+                 format(auth_info['user'], auth_info['password'], auth_info['tenant'], auth_url))
+
+    # internal URL handling
+    if raw_cmd in ('openstack', 'sw-manager'):
+        endpoint_args = ' --os-interface internal'
+    else:
+        endpoint_args = ' --os-endpoint-type internalURL'
+
+    # region handling
+    if raw_cmd != 'dcmanager':
+        if raw_cmd == 'cinder':
+            endpoint_args += ' --os_region_name {}'.format(region)
+        else:
+            endpoint_args += ' --os-region-name {}'.format(region)
+
+    token_key = (auth_info['user'], auth_info['password'], auth_info['tenant'], auth_url, region)
+    token_args = ("--os-auth-type token --os-token {{}} --os-project-name {} --os-auth-url {} "
+                  "--os-project-domain-name Default".format(auth_info['tenant'], auth_url))
+
+    auth_context = {'region': region,
+                    'auth_args': auth_args,
+                    'token_key': token_key,
+                    'token_args': token_args,
+                    'endpoint_args': endpoint_args,
+                    'expiry': time.time() + AUTH_CACHE_TTL}
+    with _auth_cache_lock:
+        _auth_cache[key] = auth_context
+
+    return auth_context
+
+
+def invalidate_auth_cache(reason=''):
+    """
+    Clear cached cli auth contexts. Should be called when region, auth url or
+    user credentials are changed, or active controller is swacted.
+
+    Args:
+        reason (str): for logging purpose
+
+    """
+    with _auth_cache_lock:
+        _auth_cache.clear()
+        _token_cache.clear()
+    LOG.debug("CLI auth cache invalidated. {}".format(reason).strip())
+
+
+# Region, auth url and credentials are global Tenant state
+Tenant.add_change_callback(invalidate_auth_cache)
+
+
+def _get_token_args(ssh_client, auth_context, cli_dir=''):
+    """
+    Get keystone token auth flags for openstack cli. A new token is issued
+    via 'openstack token issue' if there is no valid token cached for the
+    user/project/region.
+
+    Args:
+        ssh_client:
+        auth_context (dict): auth context returned by _get_auth_context()
+        cli_dir (str):
+
+    Returns (str): such as '--os-auth-type token --os-token <id> --os-project-name admin --os-auth-url <url> ...'
+
+    """
+    token_key = auth_context['token_key']
+    token = _token_cache.get(token_key)
+    if not token or time.time() > token['expiry'] - TOKEN_EXPIRY_MARGIN:
+        issue_cmd = ' '.join([os.path.join(cli_dir, 'openstack'), auth_context['auth_args'],
+                              auth_context['endpoint_args'].strip(), '--os-identity-api-version 3',
+                              'token issue -f json -c id -c expires'])
+        code, output = ssh_client.exec_cmd(issue_cmd, searchwindowsize=100)
+        if code != 0:
+            raise exceptions.CLIRejected("Failed to issue keystone token. Output: {}".format(output))
+
+        token_info = json.loads(output[output.index('{'):])
+        expires = re.match(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', token_info['expires']).group(0)
+        token = {'id': token_info['id'],
+                 'expiry': calendar.timegm(time.strptime(expires, '%Y-%m-%dT%H:%M:%S'))}
+        _token_cache[token_key] = token
+        LOG.info("Keystone token issued for {}. Expires at {}".format(token_key[0], token_info['expires']))
+
+    return auth_context['token_args'].format(token['id'])
+
+
+def get_auth_cache_stats():
+    """
+    Returns (dict): cli auth cache hits and misses. e.g., {'hits': 20, 'misses': 2}
+    """
+    with _auth_cache_lock:
+        return dict(_auth_cache_stats)
+
+
 def __convert_args(args):
     if args is None:
         args = ''
@@ -229,12 +402,14 @@ def source_openrc_file(ssh_client, auth_info, rc_file, fail_ok=False, remote_cli
 
 
 def openstack(cmd, positional_args='', ssh_client=None, flags='', fail_ok=False, cli_dir='', auth_info=None,
-              err_only=False, timeout=CLI_TIMEOUT, source_openrc=False, use_telnet=False, con_telnet=None):
+              err_only=False, timeout=CLI_TIMEOUT, source_openrc=False, use_telnet=False, con_telnet=None,
+              token_auth=None, output_format=None):
     flags += ' --os-identity-api-version 3'
 
     return exec_cli('openstack', sub_cmd=cmd, positional_args=positional_args, ssh_client=ssh_client,
                     use_telnet=use_telnet, con_telnet=con_telnet, flags=flags, fail_ok=fail_ok, cli_dir=cli_dir,
-                    auth_info=auth_info, source_openrc=source_openrc, err_only=err_only, timeout=timeout)
+                    auth_info=auth_info, source_openrc=source_openrc, err_only=err_only, timeout=timeout,
+                    token_auth=token_auth, output_format=output_format)
 
 
 def nova(cmd, positional_args='', ssh_client=None, flags='', fail_ok=False, cli_dir='', auth_info=None, err_only=False,
@@ -0,0 +1,324 @@
+import re
+import selectors
+import threading
+import time
+
+from utils import exceptions
+from utils.clients.telnet import TelnetClient
+from utils.tis_log import LOG
+
+
+class ConsoleSubscription:
+    """
+    Console output pattern subscribed via ConsoleCollector.subscribe()
+    """
+    def __init__(self, pattern, hostnames=None, callback=None):
+        """
+
+        Args:
+            pattern (str|re.Pattern): regex to search in console output
+            hostnames (list|tuple|None): nodes to match. All nodes if None.
+            callback (runnable|None): called with (hostname, match) in
+                collector thread on each match. Should return quickly.
+        """
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else \
+            pattern
+        self.hostnames = hostnames
+        self.callback = callback
+        # [(<hostname>, <matched text>), ...]
+        self.matches = []
+        self.event = threading.Event()
+
+    def _match(self, hostname, text, new_start):
+        if self.hostnames and hostname not in self.hostnames:
+            return
+        for match in self.pattern.finditer(text):
+            # skip matches within text already searched
+            if match.end() <= new_start:
+                continue
+            self.matches.append((hostname, match.group(0)))
+            self.event.set()
+            if self.callback:
+                try:
+                    self.callback(hostname, match)
+                except Exception as e:
+                    LOG.warning("Console subscription callback failed: "
+                                "{}".format(e))
+
+    def wait(self, timeout=None):
+        """
+        Wait for pattern to appear in console output
+
+        Returns (tuple|None): (<hostname>, <matched text>) of first match
+
+        """
+        if self.event.wait(timeout):
+            return self.matches[0]
+        return None
+
+
+class _ConsoleNode:
+    # Search window kept from previous output, so that patterns split
+    # across reads still match
+    TAIL_SIZE = 1024
+
+    def __init__(self, hostname, telnet_ip, telnet_port):
+        self.hostname = hostname
+        self.telnet_ip = telnet_ip
+        self.telnet_port = telnet_port
+        self.client = None
+        self.failure_count = 0
+        self.next_connect = 0
+        self.partial_line = ''
+        self.tail = ''
+        self.last_data = 0
+
+
+class ConsoleCollector:
+    """
+    Collect console output of all nodes in one selector loop thread.
+
+    Console sockets are drained as soon as data arrives and complete lines
+    are written to per node telnet logs (<log_dir>/telnet/telnet_<host>.log).
+    Install steps can subscribe to console output patterns instead of polling
+    consoles.
+
+    e.g.,
+        collector = ConsoleCollector(end_event=end_event)
+        for node in nodes:
+            collector.add_node(node.name, node.telnet_ip, node.telnet_port)
+        collector.start()
+        ...
+        # subscribe before triggering the event to wait for
+        sub = collector.subscribe(r'controller-1 login:', hostnames=['controller-1'])
+        host_helper.reboot_hosts('controller-1')
+        sub.wait(timeout=1800)
+        collector.unsubscribe(sub)
+    """
+    __collector = None
+
+    def __init__(self, end_event=None, prompt=None, select_timeout=1,
+                 reconnect_interval=60, max_failures=5, connect_timeout=10,
+                 partial_line_timeout=2, timeout=3600*48):
+        """
+
+        Args:
+            end_event (threading.Event|None): collector stops when set
+            prompt (str|None): prompt passed to TelnetClient
+            select_timeout (int|float): max seconds to block in select
+            reconnect_interval (int): seconds to wait before reconnecting to a
+                console after connection failure
+            max_failures (int): stop collecting a node after this many
+                consecutive connection failures
+            connect_timeout (int): telnet connection timeout per node
+            partial_line_timeout (int|float): log incomplete line after this
+                many seconds without more output, such as a login prompt
+            timeout (int): max seconds to collect
+        """
+        self.end_event = end_event or threading.Event()
+        self.prompt = prompt
+        self.select_timeout = select_timeout
+        self.reconnect_interval = reconnect_interval
+        self.max_failures = max_failures
+        self.connect_timeout = connect_timeout
+        self.partial_line_timeout = partial_line_timeout
+        self.timeout = timeout
+        self.nodes = {}
+        self.subscriptions = []
+        self.thread = None
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+
+    @classmethod
+    def get_collector(cls):
+        """
+        Get running collector started via
+        setups.collect_telnet_logs_for_nodes()
+
+        Returns (ConsoleCollector|None):
+
+        """
+        collector = cls.__collector
+        if collector and collector.thread and collector.thread.is_alive():
+            return collector
+        return None
+
+    @classmethod
+    def set_collector(cls, collector):
+        cls.__collector = collector
+
+    def add_node(self, hostname, telnet_ip, telnet_port):
+        with self._lock:
+            self.nodes[hostname] = _ConsoleNode(hostname, telnet_ip,
+                                                telnet_port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run,
+                                       name='Telnet-collector', daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, timeout=30):
+        self.end_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def subscribe(self, pattern, hostnames=None, callback=None):
+        """
+        Subscribe to console output pattern. Only output received after
+        subscribing is matched.
+
+        Args:
+            pattern (str|re.Pattern):
+            hostnames (str|list|tuple|None): all nodes if None
+            callback (runnable|None): called with (hostname, match) on each
+                match
+
+        Returns (ConsoleSubscription):
+
+        """
+        if isinstance(hostnames, str):
+            hostnames = [hostnames]
+        subscription = ConsoleSubscription(pattern, hostnames=hostnames,
+                                           callback=callback)
+        with self._lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def wait_for(self, pattern, hostnames=None, timeout=600, fail_ok=False):
+        """
+        Wait for pattern to appear in console output of given node(s)
+
+        Args:
+            pattern (str|re.Pattern):
+            hostnames (str|list|tuple|None):
+            timeout (int):
+            fail_ok (bool):
+
+        Returns (tuple|None): (<hostname>, <matched text>). None if timed
+            out and fail_ok=True
+
+        """
+        subscription = self.subscribe(pattern, hostnames=hostnames)
+        try:
+            res = subscription.wait(timeout=timeout)
+        finally:
+            self.unsubscribe(subscription)
+
+        if res is None:
+            msg = "{} did not appear on {} console(s) within {} " \
+                  "seconds".format(subscription.pattern.pattern,
+                                   hostnames or 'all', timeout)
+            if fail_ok:
+                LOG.warning(msg)
+                return None
+            raise exceptions.TelnetTimeout(msg)
+        return res
+
+    def _connect(self, node):
+        try:
+            node.client = TelnetClient(host=node.telnet_ip,
+                                       port=node.telnet_port,
+                                       prompt=self.prompt,
+                                       hostname=node.hostname,
+                                       timeout=self.connect_timeout,
+                                       flush_timeout=0)
+            self._selector.register(node.client.sock, selectors.EVENT_READ,
+                                    data=node)
+            node.failure_count = 0
+        except Exception as e:
+            self._handle_failure(node, e)
+
+    def _disconnect(self, node):
+        if node.client:
+            try:
+                self._selector.unregister(node.client.sock)
+            except (KeyError, ValueError):
+                pass
+            node.client.close()
+            node.client = None
+
+    def _handle_failure(self, node, err):
+        LOG.warning("Failed to collect {} console. {}".format(node.hostname,
+                                                             err))
+        self._disconnect(node)
+        node.failure_count += 1
+        if node.failure_count >= self.max_failures:
+            LOG.error("{} failures encountered to collect {} console. "
+                      "Abort.".format(self.max_failures, node.hostname))
+            with self._lock:
+                self.nodes.pop(node.hostname, None)
+        else:
+            # cool down period if telnet connection fails
+            node.next_connect = time.time() + self.reconnect_interval
+
+    def _read(self, node):
+        try:
+            data = node.client.read_very_eager()
+        except (EOFError, OSError) as e:
+            self._handle_failure(node, 'Connection lost. {}'.format(e))
+            return
+        if data:
+            self._process(node, data.decode(errors='ignore'))
+
+    def _process(self, node, text):
+        node.last_data = time.time()
+        with self._lock:
+            subscriptions = list(self.subscriptions)
+        search_text = node.tail + text
+        for subscription in subscriptions:
+            subscription._match(node.hostname, search_text,
+                                new_start=len(node.tail))
+        node.tail = search_text[-node.TAIL_SIZE:]
+
+        lines = (node.partial_line + text).split('\n')
+        node.partial_line = lines.pop()
+        if lines:
+            node.client.logger.debug(
+                '\n'.join(line.rstrip('\r') for line in lines))
+
+    def _flush_partial_line(self, node):
+        if node.partial_line and node.client and \
+                time.time() - node.last_data > self.partial_line_timeout:
+            node.client.logger.debug(node.partial_line.rstrip('\r'))
+            node.partial_line = ''
+
+    def _run(self):
+        end_time = time.time() + self.timeout
+        try:
+            while not self.end_event.is_set() and time.time() < end_time:
+                with self._lock:
+                    nodes = list(self.nodes.values())
+                if not nodes:
+                    LOG.warning("No console to collect")
+                    break
+
+                now = time.time()
+                for node in nodes:
+                    if node.client is None and now >= node.next_connect:
+                        self._connect(node)
+
+                if not self._selector.get_map():
+                    self.end_event.wait(self.select_timeout)
+                    continue
+
+                for key, events in self._selector.select(
+                        timeout=self.select_timeout):
+                    self._read(key.data)
+
+                for node in nodes:
+                    self._flush_partial_line(node)
+            else:
+                if not self.end_event.is_set():
+                    LOG.warning('Collect telnet log timed out')
+        finally:
+            with self._lock:
+                nodes = list(self.nodes.values())
+            for node in nodes:
+                self._disconnect(node)
+            self._selector.close()
@@ -8,9 +8,11 @@
 import pdb
 import os
 import re
+import tempfile
 import threading
 import time
 import ipaddress
+import uuid
 from contextlib import contextmanager
 
 import pexpect
@@ -22,6 +24,7 @@ from consts.lab import Labs, NatBoxes
 from consts.proj_vars import ProjVar
 from utils import exceptions, local_host
 from utils.tis_log import LOG
+from utils.kpi.kpi import KPI
 
 # setup color.format strings
 colorred = "\033[1;31m{0}\033[00m"
@@ -48,11 +51,24 @@ _SSH_OPTS_UBUNTU_VM = (' -o RSAAuthentication=no'
                        + ' -o StrictHostKeyChecking=no'
                        + ' -o UserKnownHostsFile=/dev/null')
 
+# Reuse one authenticated transport for all ssh logins to the same host/user
+_SSH_MUX_OPTS = (' -o ControlMaster=auto'
+                 + ' -o ControlPath={}'
+                 + ' -o ControlPersist={}')
+SSH_MUX_PERSIST = 600
+
 EXIT_CODE_CMD = 'echo $?'
+EXIT_CODE_MARKER = '__EXIT_CODE_{}_'
 TIMEOUT_EXPECT = 10
 
 RSYNC_SSH_OPTIONS = ['-o StrictHostKeyChecking=no',
-                     '-o UserKnownHostsFile=/dev/null']
+                     '-o UserKnownHostsFile=/dev/null',
+                     '-o ConnectTimeout=10']
+
+
+def get_ssh_mux_path():
+    # Keep it short. Unix socket path is limited to 108 chars.
+    return os.path.join(tempfile.gettempdir(), 'stx_mux_%r@%h:%p')
 
 
 def get_ip_version(ip_addr):
@@ -86,7 +102,8 @@ class SSHClient:
                  password=HostLinuxUser.get_password(),
                  force_password=True, initial_prompt=CONTROLLER_PROMPT,
                  timeout=60, session=None,
-                 searchwindownsize=None, port=None):
+                 searchwindownsize=None, port=None, fused_exit_code=True,
+                 multiplex=False):
         """
         Initiate an object for connecting to remote host
         Args:
@@ -94,6 +111,13 @@ class SSHClient:
             "128.224.151.212"
             user: linux username for login to host. such as "sysadmin"
             password: password for given user. such as "Li69nux*"
+            fused_exit_code (bool): whether exec_cmd appends an exit code
+                marker to the command, so that output and exit code are
+                collected with a single prompt match
+            multiplex (bool): whether to share one ssh transport with other
+                sessions to the same host/user via ssh ControlMaster. The
+                first session authenticates, subsequent sessions skip the
+                handshake.
 
         Returns:
 
@@ -112,6 +136,10 @@ class SSHClient:
         self.searchwindowsize = searchwindownsize
         self.logpath = None
         self.port = port
+        self.fused_exit_code = fused_exit_code
+        self.multiplex = multiplex
+        self.exit_code_marker = EXIT_CODE_MARKER.format(uuid.uuid4().hex[:8])
+        self.exec_stats = {'count': 0, 'round_trips': 0, 'duration': 0.0}
 
     def _get_logpath(self):
         lab_list = [getattr(Labs, attr) for attr in dir(Labs) if
@@ -171,6 +199,9 @@ class SSHClient:
 
                 # set to ignore ssh host fingerprinting
                 self.session.SSH_OPTS = _SSH_OPTS
+                if self.multiplex:
+                    self.session.SSH_OPTS += _SSH_MUX_OPTS.format(
+                        get_ssh_mux_path(), SSH_MUX_PERSIST)
                 self.session.force_password = self.force_password
                 self.session.maxread = 100000
                 self.logpath = self._get_logpath()
@@ -207,8 +238,8 @@ class SSHClient:
                         LOG.warning(
                             "Still getting prompt from the buffer. Buffer "
                             "might not be cleared yet.")
-                    self.exec_cmd('unset PROMPT_COMMAND', get_exit_code=False)
-                    self.exec_cmd('export TMOUT=0', get_exit_code=False)
+                    self.exec_cmd('unset PROMPT_COMMAND; export TMOUT=0',
+                                  get_exit_code=False)
                     return
 
                 # retry if this line is reached. it would've returned if
@@ -434,7 +465,7 @@ class SSHClient:
         self.cmd_output = output
         extra_str = ''  # extra logging info
 
-        LOG.debug("Output{}: {}".format(extra_str, output))
+        LOG.debug("Output%s: %s", extra_str, output)
         return index
 
     def __force_end(self, force):
@@ -484,7 +515,12 @@ class SSHClient:
         if prefix_space:
             cmd = ' {}'.format(cmd)
 
-        self.send(cmd, reconnect, reconnect_timeout)
+        start_time = time.monotonic()
+        sent_cmd = cmd
+        if get_exit_code and blob == self.prompt:
+            sent_cmd = self._append_exit_code_marker(cmd)
+
+        self.send(sent_cmd, reconnect, reconnect_timeout)
         code_force = 0
         try:
             self.expect(blob_list=blob, timeout=expect_timeout,
@@ -504,6 +540,7 @@ class SSHClient:
             code = code_force
 
         self.__force_end(force_end)
+        self._update_exec_stats(start_time, cmd)
 
         if code > 0 and not fail_ok:
             raise exceptions.SSHExecCommandFailed(
@@ -512,7 +549,86 @@ class SSHClient:
 
         return code, output
 
+    def _append_exit_code_marker(self, cmd):
+        """
+        Append an echo of the exit code marker to given cmd, so that the exit
+        code is printed right before the prompt and no extra 'echo $?' round
+        trip is needed.
+        The echoed command line contains '<marker>$?' which will not match
+        '<marker>[0-9]+', thus only the real exit code is picked up.
+
+        Args:
+            cmd (str):
+
+        Returns (str): cmd with exit code marker appended, or the original cmd
+            if it is not safe to append anything to it.
+
+        """
+        if not self.fused_exit_code:
+            return cmd
+
+        stripped_cmd = cmd.rstrip()
+        if not stripped_cmd.strip() or '\n' in stripped_cmd or \
+                '<<' in stripped_cmd or stripped_cmd.endswith(('\\', '|')):
+            return cmd
+
+        if stripped_cmd.endswith('&') and not stripped_cmd.endswith('&&'):
+            separator = ' '
+        elif stripped_cmd.endswith('&&'):
+            return cmd
+        else:
+            separator = '; '
+            stripped_cmd = stripped_cmd.rstrip(';')
+
+        return '{}{}echo {}$?'.format(stripped_cmd, separator,
+                                      self.exit_code_marker)
+
+    def _pop_exit_code_marker(self):
+        """
+        Remove the exit code marker from cmd_output if any.
+
+        Returns (int|None): exit code found in the marker, or None if marker
+            is not found in the output
+
+        """
+        marker_pattern = '{}([0-9]+)'.format(re.escape(self.exit_code_marker))
+        matches = list(re.finditer(marker_pattern, self.cmd_output))
+        if not matches:
+            return None
+
+        last_match = matches[-1]
+        self.cmd_output = self.cmd_output[:last_match.start()] + \
+            self.cmd_output[last_match.end():]
+        # remove the new line left by the marker echo
+        self.cmd_output = re.sub(r'\n\r?\n([^\n]*)$', r'\n\1',
+                                 self.cmd_output)
+        return int(last_match.group(1))
+
+    def _update_exec_stats(self, start_time, cmd=''):
+        delta = time.monotonic() - start_time
+        self.exec_stats['count'] += 1
+        self.exec_stats['duration'] += delta
+        cmd_words = cmd.split()
+        KPI.record('ssh {}'.format(cmd_words[0].split('/')[-1] if cmd_words else
+                                   '<enter>'), delta)
+
+    def get_exec_stats(self):
+        """
+        Get command execution statistics for current ssh session
+
+        Returns (dict): {'count': <number of exec_cmd calls>,
+            'round_trips': <number of prompt matches waited for>,
+            'duration': <total seconds>, 'average': <seconds per call>}
+
+        """
+        stats = dict(self.exec_stats)
+        stats['average'] = stats['duration'] / stats['count'] if \
+            stats['count'] else 0.0
+        return stats
+
     def _process_exec_result(self, rm_date=True, get_exit_code=True):
+        self.exec_stats['round_trips'] += 1
+        fused_code = self._pop_exit_code_marker()
         cmd_output_list = self.cmd_output.split('\n')[0:-1]  # exclude prompt
         # LOG.info("cmd output list: {}".format(cmd_output_list))
         # cmd_output_list[0] = ''                                       #
@@ -524,10 +640,12 @@ class SSHClient:
 
         cmd_output = '\n'.join(cmd_output_list)
 
-        if get_exit_code:
-            exit_code = self.get_exit_code()
-        else:
+        if not get_exit_code:
             exit_code = -1
+        elif fused_code is not None:
+            exit_code = fused_code
+        else:
+            exit_code = self.get_exit_code()
 
         cmd_output = cmd_output.strip()
         return exit_code, cmd_output
@@ -549,6 +667,7 @@ class SSHClient:
         return self.prompt
 
     def get_exit_code(self):
+        self.exec_stats['round_trips'] += 1
         self.send(EXIT_CODE_CMD)
         self.expect(timeout=30, fail_ok=False)
         matches = re.findall("\n([-+]?[0-9]+)\n", self.cmd_output)
@@ -672,6 +791,51 @@ class SSHClient:
                               get_exit_code=False)
             raise
 
+    def rsync_on_dest(self, source_user, source_ip, source_path, dest_path,
+                      source_pswd, extra_opts=None, timeout=3600,
+                      fail_ok=False):
+        """
+        Pull file(s) from remote server to current host via rsync
+
+        Args:
+            source_user (str):
+            source_ip (str):
+            source_path (str):
+            dest_path (str):
+            source_pswd (str):
+            extra_opts (list|None): e.g., ['--partial', '--itemize-changes']
+            timeout (int):
+            fail_ok (bool):
+
+        Returns (tuple): (<code>, <output>)
+
+        """
+        if get_ip_version(source_ip) == 6:
+            source_ip = '[{}]'.format(source_ip)
+        extra_opts_str = ' '.join(extra_opts) + ' ' if extra_opts else ''
+        ssh_opts = 'ssh {}'.format(' '.join(RSYNC_SSH_OPTIONS))
+        cmd = 'rsync -ae "{}" {}{}@{}:{} {}'.format(ssh_opts, extra_opts_str,
+                                                   source_user, source_ip,
+                                                   source_path, dest_path)
+
+        LOG.info("Rsyncing file(s) from {} to {}: {}".format(source_ip,
+                                                             self.host, cmd))
+        self.send(cmd)
+        index = self.expect(blob_list=[self.prompt, PASSWORD_PROMPT],
+                            timeout=timeout)
+        if index == 1:
+            self.send(source_pswd)
+            self.expect(timeout=timeout, searchwindowsize=100,
+                        fail_ok=fail_ok)
+
+        code, output = self._process_exec_result(rm_date=True)
+        if code != 0 and not fail_ok:
+            raise exceptions.SSHExecCommandFailed(
+                "Non-zero return code for rsync cmd: {}. Output: {}".format(
+                    cmd, output))
+
+        return code, output
+
     def scp_on_source(self, source_path, dest_user, dest_ip, dest_path,
                       dest_password, timeout=3600, is_dir=False, ipv6=None):
         dest = dest_path
@@ -810,6 +974,8 @@ class SSHClient:
         self.session.close(True)
         LOG.debug("connection closed. host: {}, user: {}. Object ID: {}".format(
             self.host, self.user, id(self)))
+        LOG.debug("Command execution stats for {}: {}".format(
+            self.host, self.get_exec_stats()))
 
     def set_session_timeout(self, timeout=0):
         self.send('TMOUT={}'.format(timeout))
@@ -1138,7 +1304,12 @@ class ContainerClient(SSHClient):
         if prefix_space:
             cmd = ' {}'.format(cmd)
 
-        self.send(cmd, reconnect, reconnect_timeout)
+        start_time = time.monotonic()
+        sent_cmd = cmd
+        if get_exit_code and self.prompt in blob:
+            sent_cmd = self._append_exit_code_marker(cmd)
+
+        self.send(sent_cmd, reconnect, reconnect_timeout)
         code_force = 0
         try:
             index = self.expect(blob_list=blob, timeout=expect_timeout,
@@ -1165,6 +1336,7 @@ class ContainerClient(SSHClient):
             code = code_force
 
         self.__force_end(force_end)
+        self._update_exec_stats(start_time, cmd)
 
         if code > 0 and not fail_ok:
             raise exceptions.SSHExecCommandFailed(
@@ -1559,6 +1731,7 @@ class ControllerClient:
     __default_name = None
     __prev_client = None
     __prev_idx = None
+    __lock = threading.RLock()
 
     @classmethod
     def get_active_controller(cls, name=None, fail_ok=False):
@@ -1592,8 +1765,11 @@ class ControllerClient:
         curr_thread = threading.current_thread()
         idx = 0 if curr_thread is threading.main_thread() else int(
             curr_thread.name.split('-')[-1])
+        if ProjVar.get_var('SSH_MUX'):
+            cls.__add_pooled_client(name=name, idx=idx)
+
         for lab_ in cls.__lab_ssh_map:
-            if lab_ == name:
+            if lab_ == name and idx < len(cls.__lab_ssh_map[lab_]):
                 controller_ssh = cls.__lab_ssh_map[lab_][idx]
                 if isinstance(controller_ssh, SSHClient):
                     msg = "Getting active controller client for {}".format(lab_)
@@ -1612,6 +1788,37 @@ class ControllerClient:
             ("The name - {} does not have a corresponding controller ssh "
              "session set. ssh_map: {}").format(name, cls.__lab_ssh_map))
 
+    @classmethod
+    def __add_pooled_client(cls, name, idx):
+        """
+        Open a lightweight ssh session for current thread if there is none.
+        The session shares the authenticated transport of the main thread
+        session (ssh ControlMaster), so no new ssh handshake or login is
+        needed.
+
+        Args:
+            name (str): lab name in lab_ssh_map
+            idx (int): thread index
+
+        """
+        ssh_list = cls.__lab_ssh_map.get(name)
+        if not ssh_list or idx < len(ssh_list):
+            return
+
+        base_ssh = ssh_list[0]
+        # Nested ssh sessions (e.g., via tuxlab for ipv6) cannot be pooled
+        if type(base_ssh) is not SSHClient:
+            return
+
+        LOG.info("Open pooled ssh session to {} for {}".format(
+            base_ssh.host, threading.current_thread().name))
+        pooled_ssh = SSHClient(base_ssh.host, user=base_ssh.user,
+                               password=base_ssh.password,
+                               initial_prompt=base_ssh.initial_prompt,
+                               port=base_ssh.port, multiplex=True)
+        pooled_ssh.connect(retry=True, retry_timeout=30, use_current=False)
+        cls.set_active_controller(pooled_ssh, name=name)
+
     @classmethod
     def get_active_controllers(cls, fail_ok=True, current_thread_only=True):
         """ Get all the active controllers ssh sessions.
@@ -1673,28 +1880,30 @@ class ControllerClient:
             else:
                 name = 'no_name'
 
-        # new lab or ip address
-        if name not in cls.__lab_ssh_map:
-            cls.__lab_ssh_map[name] = []
-
         curr_thread = threading.current_thread()
         idx = 0 if curr_thread is threading.main_thread() else int(
             curr_thread.name.split('-')[-1])
-        # set ssh for new lab
-        if len(cls.__lab_ssh_map[name]) == idx:
-            cls.__lab_ssh_map[name].append(ssh_client)
-        # change existing ssh
-        elif len(cls.__lab_ssh_map[name]) > idx:
-            cls.__lab_ssh_map[name][idx] = ssh_client
-        # fill with copy of new ssh session until list is correct length
-        # (only when a different lab or ip address has also been added)
-        else:
-            new_ssh = SSHClient(ssh_client.host, ssh_client.user,
-                                ssh_client.password)
-            new_ssh.connect(use_current=False)
-            while len(cls.__lab_ssh_map[name]) < idx:
-                cls.__lab_ssh_map[name].append(new_ssh)
-            cls.__lab_ssh_map[name].append(ssh_client)
+        with cls.__lock:
+            # new lab or ip address
+            if name not in cls.__lab_ssh_map:
+                cls.__lab_ssh_map[name] = []
+
+            # set ssh for new lab
+            if len(cls.__lab_ssh_map[name]) == idx:
+                cls.__lab_ssh_map[name].append(ssh_client)
+            # change existing ssh
+            elif len(cls.__lab_ssh_map[name]) > idx:
+                cls.__lab_ssh_map[name][idx] = ssh_client
+            # fill with copy of new ssh session until list is correct length
+            # (only when a different lab or ip address has also been added)
+            else:
+                new_ssh = SSHClient(ssh_client.host, ssh_client.user,
+                                    ssh_client.password,
+                                    multiplex=ProjVar.get_var('SSH_MUX'))
+                new_ssh.connect(use_current=False)
+                while len(cls.__lab_ssh_map[name]) < idx:
+                    cls.__lab_ssh_map[name].append(new_ssh)
+                cls.__lab_ssh_map[name].append(ssh_client)
 
         LOG.info(
             "Active controller client for {} is set. Host ip/name: {}".format(
@@ -35,13 +35,19 @@ ESC = bytes([27]) # Escape character
 VT100_DEVICE_STATUS = bytes([27,91,53,110]) # Device Status Query
 VT100_DEVICE_OK = bytes([27,91,48,110]) # Device OK
 
+# Bytes handled by the per byte state machine in TelnetClient.process_rawq()
+RAWQ_SPECIAL = re.compile(b'[' + re.escape(IAC + theNULL + b'\021') + b']')
+RAWQ_SPECIAL_VT100 = re.compile(b'[' + re.escape(IAC + theNULL + b'\021' + ESC) + b']')
+RECV_SIZE = 4096
+
 
 class TelnetClient(Telnet):
 
     def __init__(self, host, prompt=None, port=0, timeout=30, hostname=None,
                  user=HostLinuxUser.get_user(),
                  password=HostLinuxUser.get_password(),
-                 negotiate=False, vt100query=False, console_log_file=None):
+                 negotiate=False, vt100query=False, console_log_file=None,
+                 flush_timeout=1):
 
         self.logger = LOG
         super(TelnetClient, self).__init__(host=host, port=port, timeout=timeout)
@@ -64,7 +70,7 @@ class TelnetClient(Telnet):
             self.vt100querybuffer = b'' # Buffer for VT100 queries
         #-- mod ends
 
-        self.flush(timeout=1)
+        self.flush(timeout=flush_timeout)
         self.logger = telnet_logger(hostname) if hostname else telnet_logger(host + ":" + str(port))
         self.hostname = hostname
         self.prompt = prompt
@@ -360,16 +366,47 @@ class TelnetClient(Telnet):
     #     super(TelnetClient, self).close()
 
 
+    def fill_rawq(self):
+        """Fill raw queue from one recv() system call.
+
+        Same as Telnet.fill_rawq(), but reads up to RECV_SIZE bytes instead of
+        50, since process_rawq() copies plain data in chunks.
+
+        """
+        if self.irawq >= len(self.rawq):
+            self.rawq = b''
+            self.irawq = 0
+        buf = self.sock.recv(RECV_SIZE)
+        self.msg("recv %r", buf)
+        self.eof = (not buf)
+        self.rawq = self.rawq + buf
+
     def process_rawq(self):
         """Transfer from raw queue to cooked queue.
 
         Set self.eof when connection is closed.  Don't block unless in
         the midst of an IAC sequence.
 
+        Plain data between IAC, NUL, XON and (if vt100query) ESC bytes is
+        copied in one slice. The byte by byte state machine is only used
+        for these bytes and the sequences following them.
+
         """
-        buf = [b'', b'']
+        buf = [bytearray(), bytearray()]
+        special_re = RAWQ_SPECIAL_VT100 if self.vt100query else RAWQ_SPECIAL
         try:
             while self.rawq:
+                if not self.iacseq and not (self.vt100query and self.vt100querybuffer):
+                    match = special_re.search(self.rawq, self.irawq)
+                    end = match.start() if match else len(self.rawq)
+                    if end > self.irawq:
+                        buf[self.sb] += self.rawq[self.irawq:end]
+                        if end >= len(self.rawq):
+                            self.rawq = b''
+                            self.irawq = 0
+                            break
+                        self.irawq = end
+
                 c = self.rawq_getchar()
                 if not self.iacseq:
                     if c == theNULL:
@@ -391,7 +428,7 @@ class TelnetClient(Telnet):
                     # deal with IAC sequences
                     #-- mod ends
                     if c != IAC:
-                        buf[self.sb] = buf[self.sb] + c
+                        buf[self.sb] += c
                         continue
                     else:
                         self.iacseq += c
@@ -403,15 +440,15 @@ class TelnetClient(Telnet):
 
                     self.iacseq = b''
                     if c == IAC:
-                        buf[self.sb] = buf[self.sb] + c
+                        buf[self.sb] += c
                     else:
                         if c == SB: # SB ... SE start.
                             self.sb = 1
                             self.sbdataq = b''
                         elif c == SE:
                             self.sb = 0
-                            self.sbdataq = self.sbdataq + buf[1]
-                            buf[1] = b''
+                            self.sbdataq = self.sbdataq + bytes(buf[1])
+                            buf[1] = bytearray()
                         if self.option_callback:
                             # Callback is supposed to look into
                             # the sbdataq
@@ -467,11 +504,11 @@ class TelnetClient(Telnet):
             self.iacseq = b'' # Reset on EOF
             self.sb = 0
             pass
-        self.cookedq = self.cookedq + buf[0]
+        self.cookedq = self.cookedq + bytes(buf[0])
         #-- mod begins
-        self.log_write(buf[0])
+        self.log_write(bytes(buf[0]))
         #-- mod ends
-        self.sbdataq = self.sbdataq + buf[1]
+        self.sbdataq = self.sbdataq + bytes(buf[1])
 
     def log_write(self, text):
         if not text:
@@ -252,3 +252,6 @@ class InstallError(TiSError):
 class K8sError(TiSError):
     message = 'K8s error'
 
+
+class RestAPIError(TiSError):
+    message = 'REST API request failed.'
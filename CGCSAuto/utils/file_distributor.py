@@ -0,0 +1,258 @@
+import os
+import time
+from concurrent import futures
+
+from consts.auth import HostLinuxUser
+from utils import exceptions
+from utils.artifact_cache import get_checksum
+from utils.tis_log import LOG
+
+
+PARTIAL_DIR = '.rsync-partial'
+
+
+class FileDistributor:
+    """
+    Distribute a file or directory from a remote server to multiple hosts,
+    such as active controllers of system controller and subclouds.
+
+    Only the first destination copies from the origin. In each following
+    round, every host that already has the file pushes it to one host that
+    does not, so N destinations are served in about log2(N) + 1 transfer
+    rounds instead of N. Existing files are checked against the checksum of
+    the origin file before they are reused or relayed, and checksums of all
+    copied destinations are verified once after distribution.
+
+    e.g.,
+        distributor = FileDistributor(cons_ssh, dest_path='/home/sysadmin/a.img')
+        distributor.distribute(fetch_func=lambda con_ssh: con_ssh.scp_on_dest(...))
+    """
+
+    def __init__(self, dest_clients, dest_path, is_dir=False, dest_user=None,
+                 dest_password=None, timeout=900, max_workers=10):
+        """
+
+        Args:
+            dest_clients (list): ssh clients of destination hosts. Each
+                client is only used by one thread at a time.
+            dest_path (str): file path, or directory path if is_dir
+            is_dir (bool):
+            dest_user (str|None): user to push to destinations as
+            dest_password (str|None):
+            timeout (int): timeout per transfer
+            max_workers (int): max transfers at the same time
+        """
+        self.dest_clients = list(dest_clients)
+        self.dest_path = dest_path
+        self.is_dir = is_dir
+        self.dest_user = dest_user or HostLinuxUser.get_user()
+        self.dest_password = dest_password or HostLinuxUser.get_password()
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    def _relay(self, src_client, dest_client):
+        """
+        Push file from one destination to another via rsync. Partial
+        transfers are kept in a separate dir, so an interrupted transfer
+        never leaves a truncated file at dest_path.
+        """
+        if self.is_dir:
+            source = dest = self.dest_path.rstrip('/') + '/'
+            parent_dir = self.dest_path
+        else:
+            source = dest = self.dest_path
+            parent_dir = os.path.dirname(self.dest_path)
+
+        extra_opts = ['--partial-dir={}'.format(PARTIAL_DIR),
+                      '--rsync-path="mkdir -p {} && rsync"'.format(parent_dir)]
+        src_client.rsync(source=source, dest_server=dest_client.host,
+                         dest=dest, dest_user=self.dest_user,
+                         dest_password=self.dest_password,
+                         extra_opts=extra_opts, timeout=self.timeout)
+
+    def _remove(self, client):
+        client.exec_cmd('rm -rf {}'.format(self.dest_path), fail_ok=True)
+
+    def _refetch(self, fetch_func, client):
+        """
+        Remove file from destination and copy it from origin again. Otherwise
+        fetch_func may keep a bad file that already exists.
+        """
+        self._remove(client)
+        return fetch_func(client)
+
+    def _run_concurrently(self, func, args_list):
+        """
+        Run func with each args in args_list concurrently
+
+        Returns (list): exception or None for each args in args_list
+
+        """
+        if len(args_list) == 1:
+            try:
+                func(*args_list[0])
+                return [None]
+            except Exception as e:
+                return [e]
+
+        results = []
+        with futures.ThreadPoolExecutor(
+                max_workers=min(self.max_workers, len(args_list))) as executor:
+            futures_ = [executor.submit(func, *args) for args in args_list]
+            for future in futures_:
+                results.append(future.exception())
+        return results
+
+    def _verify(self, ref_checksum, clients):
+        """
+        Get destinations whose checksum does not match the reference
+
+        Returns (list): ssh clients
+
+        """
+        checksums = {}
+
+        def _get_checksum(client):
+            checksums[client] = get_checksum(client, self.dest_path,
+                                             is_dir=self.is_dir,
+                                             timeout=self.timeout,
+                                             fail_ok=True)
+
+        self._run_concurrently(_get_checksum, [(client,) for client in
+                                               clients])
+        mismatched = [client for client in clients if
+                      checksums.get(client) != ref_checksum]
+        for client in mismatched:
+            LOG.warning("Checksum mismatch for {} on {}. Expected: {}, "
+                        "actual: {}".format(self.dest_path, client.host,
+                                            ref_checksum,
+                                            checksums.get(client)))
+        return mismatched
+
+    def distribute(self, fetch_func, skip_existing=True, verify=True,
+                   fail_ok=False):
+        """
+        Distribute file to all destinations
+
+        Args:
+            fetch_func (runnable): called with ssh client of a destination to
+                copy file from origin to it. Used for the first destination,
+                and for destinations that relay or verification failed for.
+                The file is removed from the destination before it is
+                called. Can return checksum of the origin file to verify
+                all destinations against, otherwise checksum of the first
+                destination is used. Always called in current thread.
+            skip_existing (bool): skip destinations that already have the
+                file and whose checksum matches the reference. Ignored if
+                is_dir.
+            verify (bool): whether to compare checksums of destinations with
+                the reference after distribution
+            fail_ok (bool):
+
+        Returns (dict): {<host>: <error>} for destinations failed to
+            distribute to. Empty dict if all succeeded.
+
+        Raises (exceptions.CommonError): if any destination failed and
+            fail_ok=False
+
+        """
+        start_time = time.time()
+        pending = list(self.dest_clients)
+        existing = []
+        if skip_existing and not self.is_dir:
+            existing = [client for client in pending if
+                        client.file_exists(self.dest_path)]
+            # Fresh copy from origin is the reference to check existing
+            # files against, so prefer a destination without the file
+            pending = [client for client in pending if client not in existing]
+            if not pending:
+                pending, existing = existing[:1], existing[1:]
+
+        failed = {}
+        holders = []
+        ref_checksum = None
+        while pending and not holders:
+            root = pending.pop(0)
+            try:
+                ref_checksum = self._refetch(fetch_func, root)
+                holders.append(root)
+            except Exception as e:
+                LOG.warning("Failed to copy {} to {}: {}".format(
+                    self.dest_path, root.host, e))
+                failed[root.host] = e
+        if not holders and existing:
+            # Cannot get a reference. Trust existing files as before.
+            LOG.warning("Failed to copy {} from origin. Use existing files "
+                        "on {}".format(self.dest_path, ', '.join(
+                            client.host for client in existing)))
+            holders, existing = existing, []
+
+        copied = list(holders)
+        to_verify = []
+        if (verify or existing) and holders:
+            if ref_checksum:
+                to_verify.append(holders[0])
+            else:
+                ref_checksum = get_checksum(holders[0], self.dest_path,
+                                            is_dir=self.is_dir,
+                                            timeout=self.timeout)
+        if existing:
+            mismatched = self._verify(ref_checksum, existing) if \
+                ref_checksum else []
+            for client in existing:
+                if client in mismatched:
+                    self._remove(client)
+                    pending.append(client)
+                else:
+                    holders.append(client)
+                    copied.append(client)
+
+        # Destinations that failed to push to others, e.g., unreachable
+        # subcloud from another subcloud, are not used as relay source again.
+        bad_sources = []
+        while pending:
+            sources = [src for src in holders if src not in bad_sources]
+            if not sources:
+                sources = holders[:1]
+            batch = list(zip(sources, pending))
+            pending = pending[len(batch):]
+            LOG.info("Relay {} to {}".format(self.dest_path, ', '.join(
+                '{}->{}'.format(src.host, dest.host) for src, dest in batch)))
+            errors = self._run_concurrently(self._relay, batch)
+            for (src, dest), err in zip(batch, errors):
+                if err is not None:
+                    LOG.warning("Failed to relay {} from {} to {}: {}. Copy "
+                                "from origin instead.".format(
+                                    self.dest_path, src.host, dest.host, err))
+                    if src is not holders[0]:
+                        bad_sources.append(src)
+                    try:
+                        self._refetch(fetch_func, dest)
+                    except Exception as e:
+                        failed[dest.host] = e
+                        continue
+                holders.append(dest)
+                copied.append(dest)
+                to_verify.append(dest)
+
+        if verify and ref_checksum and to_verify:
+            for client in self._verify(ref_checksum, to_verify):
+                try:
+                    self._refetch(fetch_func, client)
+                except Exception as e:
+                    failed[client.host] = e
+                    continue
+                if self._verify(ref_checksum, [client]):
+                    failed[client.host] = 'Checksum mismatch'
+
+        succeeded = [client for client in copied if client.host not in failed]
+        LOG.info("{} distributed to {}/{} destination(s) in {:.1f} "
+                 "seconds".format(self.dest_path, len(succeeded),
+                                  len(succeeded) + len(failed),
+                                  time.time() - start_time))
+        if failed and not fail_ok:
+            raise exceptions.CommonError(
+                "Failed to distribute {} to {}".format(
+                    self.dest_path, ', '.join('{}: {}'.format(host, err) for
+                                              host, err in failed.items())))
+        return failed
@@ -1,31 +1,265 @@
-import inspect
-import time
+import functools
+import math
 import re
+import threading
+import time
 
 from utils.tis_log import LOG
 
 
+class Histogram:
+    """
+    Latency histogram with log scaled buckets. Each bucket spans 1% of its
+    value, so percentiles are within 1% of the actual values while memory is
+    bounded by the value range rather than the number of samples.
+    """
+    PRECISION = 0.01
+    __log_base = math.log(1 + PRECISION)
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """
+        Args:
+            value (float): seconds
+        """
+        # bucket by microseconds. Sub microsecond values share bucket 0.
+        micros = value * 1000000
+        index = int(math.log(micros) / self.__log_base) if micros > 1 else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def get_percentile(self, percentile):
+        """
+        Args:
+            percentile (int|float): 0 to 100
+
+        Returns (float): seconds. Upper bound of the bucket containing the
+            given percentile, capped by max value.
+
+        """
+        if not self.count:
+            return 0.0
+
+        target = math.ceil(self.count * percentile / 100) or 1
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min((1 + self.PRECISION) ** (index + 1) / 1000000,
+                           self.max)
+        return self.max
+
+    def get_stats(self):
+        """
+        Returns (dict): count, mean, min, p50, p95, p99, max, total in seconds
+        """
+        return {'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'min': self.min or 0.0,
+                'p50': self.get_percentile(50),
+                'p95': self.get_percentile(95),
+                'p99': self.get_percentile(99),
+                'max': self.max or 0.0,
+                'total': self.total}
+
+
 class KPI:
     """
-    Normally would use functions but using data members to retain
-    t0 time.
-    .stop makes use of the stack inspection to retrieve the method
-    or function name that the KPI object is being run in with the
-    parameters.
+    Named timer. Timings are recorded to per name histograms for current
+    test and for the whole session.
+
+    Examples:
+        with KPI('rest GET /v1/ihosts'):
+            ...
 
-    delta value is adjusted by 1000 to get milliseconds
+        @KPI.timed('host lock')
+        def lock_host(...):
+            ...
+
+        kpi = KPI('vm boot')
+        ...
+        delta = kpi.stop()
+
+        LOG.info(KPI.get_summary(scope='session'))
     """
-    def __init__(self):
-        self.timer0 = time.time()
+    SCOPES = ('test', 'session')
+    __histograms = {scope: {} for scope in SCOPES}
+    __lock = threading.Lock()
+
+    def __init__(self, name):
+        self.name = name
+        self.timer0 = time.monotonic()
+
+    def start(self):
+        self.timer0 = time.monotonic()
 
     def stop(self):
-        delta = time.time() - self.timer0
-        call = inspect.stack()[1][3]
-        check = re.search('(\(.+\))', str(inspect.stack()[2][4]))
-        if check is None:
-            check = str(inspect.stack()[2][4])
-        else:
-            check = re.search('(\(.+\))', 
-                              str(inspect.stack()[2][4])).group()
-        LOG.info("KPI: {} {} {}".format(call, check, delta * 1000))
+        """
+        Record time elapsed since start
+
+        Returns (float): seconds
+
+        """
+        delta = time.monotonic() - self.timer0
+        self.record(self.name, delta)
         return delta
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @classmethod
+    def record(cls, name, delta):
+        """
+        Record a timing
+
+        Args:
+            name (str): such as 'rest GET /v1/ihosts'
+            delta (float): seconds
+
+        """
+        with cls.__lock:
+            for histograms in cls.__histograms.values():
+                histogram = histograms.get(name)
+                if histogram is None:
+                    histogram = histograms[name] = Histogram()
+                histogram.record(delta)
+
+    @classmethod
+    def timed(cls, name):
+        """
+        Decorator to record execution time of a function under given name
+        """
+        def wrapper(func):
+            @functools.wraps(func)
+            def timed_func(*args, **kwargs):
+                with cls(name):
+                    return func(*args, **kwargs)
+            return timed_func
+        return wrapper
+
+    @classmethod
+    def get_stats(cls, scope='session', name=None):
+        """
+        Get timing stats
+
+        Args:
+            scope (str): test or session
+            name (str|None): return stats of all names if None
+
+        Returns (dict): {<name>: <stats>, ...} or stats of given name.
+            See Histogram.get_stats()
+
+        """
+        with cls.__lock:
+            histograms = dict(cls.__histograms[scope])
+            if name is not None:
+                histogram = histograms.get(name)
+                return histogram.get_stats() if histogram else None
+            return {name_: histogram.get_stats() for name_, histogram in
+                    histograms.items()}
+
+    @classmethod
+    def get_summary(cls, scope='session'):
+        """
+        Get stats table in milliseconds, sorted by total time
+
+        Args:
+            scope (str): test or session
+
+        Returns (str):
+
+        """
+        stats = cls.get_stats(scope=scope)
+        if not stats:
+            return ''
+
+        headers = ('name', 'count', 'mean', 'p50', 'p95', 'p99', 'max',
+                   'total')
+        rows = []
+        for name, stat in sorted(stats.items(),
+                                 key=lambda item: item[1]['total'],
+                                 reverse=True):
+            rows.append([name, str(stat['count'])] +
+                        ['{:.1f}'.format(stat[key] * 1000) for key in
+                         headers[2:]])
+        widths = [max(len(row[i]) for row in rows + [list(headers)]) for i in
+                  range(len(headers))]
+        lines = ['  '.join(val.ljust(widths[i]) if i == 0 else
+                           val.rjust(widths[i]) for i, val in enumerate(row))
+                 for row in [list(headers)] + rows]
+        lines.insert(1, '-' * len(lines[0]))
+        return 'KPI timings ({} scope, ms):\n{}'.format(scope, '\n'.join(lines))
+
+    @classmethod
+    def reset(cls, scope='test'):
+        with cls.__lock:
+            cls.__histograms[scope] = {}
+
+
+def get_rest_kpi_name(method, resource):
+    """
+    Get kpi name for REST request. Uuids and numbers in resource path are
+    replaced with {id} so that requests to the same endpoint are aggregated.
+
+    Args:
+        method (str): such as GET
+        resource (str): such as /ihosts/<uuid>/ports?limit=10
+
+    Returns (str): such as 'rest GET /ihosts/{id}/ports'
+
+    """
+    resource = resource.split('?', 1)[0]
+    resource = re.sub(r'/([0-9a-fA-F-]{32,36}|\d+)(?=/|$)', '/{id}', resource)
+    return 'rest {} {}'.format(method, resource or '/')
+
+
+def get_cli_kpi_name(cmd, sub_cmd):
+    """
+    Get kpi name for cli. Arguments and flags of the sub command are
+    excluded.
+
+    Args:
+        cmd (str): such as openstack
+        sub_cmd (str): such as 'server list --long'
+
+    Returns (str): such as 'cli openstack server list'
+
+    """
+    # openstack sub commands consist of object and action
+    word_count = 2 if cmd.endswith('openstack') else 1
+    words = []
+    for word in sub_cmd.split():
+        if word.startswith('-') or len(words) >= word_count:
+            break
+        words.append(word)
+    return ' '.join(['cli', cmd.split('/')[-1]] + words)
+
+
+def log_summary(scope='test', reset=True):
+    """
+    Log kpi timing summary of given scope
+
+    Args:
+        scope (str): test or session
+        reset (bool): whether to clear timings of given scope after logging
+
+    """
+    summary = KPI.get_summary(scope=scope)
+    if summary:
+        LOG.info(summary)
+    if reset:
+        KPI.reset(scope=scope)
+    return summary
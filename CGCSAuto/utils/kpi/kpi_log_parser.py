@@ -9,6 +9,7 @@ from consts.kpi_vars import KPI_DATE_FORMAT
 from consts.proj_vars import ProjVar
 from keywords import host_helper, common, system_helper
 from utils import lab_info
+from utils.kpi import upload_kpi
 from utils.clients.ssh import SSHClient, CONTROLLER_PROMPT, ControllerClient
 
 
@@ -54,12 +55,7 @@ def record_kpi(local_kpi_file, kpi_name, host=None, log_path=None, end_pattern=N
 
     """
     try:
-        if not lab_name:
-            lab = ProjVar.get_var('LAB')
-            if not lab:
-                raise ValueError("lab_name needs to be provided")
-        else:
-            lab = lab_info.get_lab_dict(labname=lab_name)
+        lab = _get_lab(lab_name)
 
         kpi_dict = {'lab': lab['name']}
         if start_pattern and end_pattern and build_id:
@@ -70,33 +66,9 @@ def record_kpi(local_kpi_file, kpi_name, host=None, log_path=None, end_pattern=N
                 append_to_kpi_file(local_kpi_file=local_kpi_file, kpi_name=kpi_name, kpi_dict=kpi_dict)
                 return
 
-        if not con_ssh:
-            con_ssh = ControllerClient.get_active_controller(fail_ok=True)
-            if not con_ssh:
-                if not ProjVar.get_var('LAB'):
-                    ProjVar.set_var(lab=lab)
-                    ProjVar.set_var(source_openrc=True)
-                con_ssh = SSHClient(lab.get('floating ip'), HostLinuxUser.get_user(), HostLinuxUser.get_password(),
-                                    CONTROLLER_PROMPT)
-                con_ssh.connect()
-
-        if not build_id or not sw_version:
-            build_info = system_helper.get_build_info(con_ssh=con_ssh)
-            build_id = build_id if build_id else build_info['BUILD_ID']
-            sw_version = sw_version if sw_version else build_info['SW_VERSION']
-
-        kpi_dict.update({'build_id': build_id, 'sw_version': sw_version})
-
-        if not patch:
-            patch = ProjVar.get_var('PATCH')
-            if patch:
-                patch = ' '.join(patch)
-                kpi_dict.update({'patch': patch})
-        else:
-            kpi_dict.update({'patch': patch})
-
-        load_average = get_load_average(ssh_client=con_ssh, uptime=uptime)
-        kpi_dict.update({'load_average': load_average})
+        con_ssh = _get_con_ssh(lab, con_ssh=con_ssh)
+        kpi_dict.update(_get_kpi_base_dict(lab, con_ssh=con_ssh, build_id=build_id, sw_version=sw_version,
+                                           patch=patch, uptime=uptime))
 
         if not unit:
             unit = 'Time(s)'
@@ -110,19 +82,12 @@ def record_kpi(local_kpi_file, kpi_name, host=None, log_path=None, end_pattern=N
         if kpi_val is not None:
             time_stamp = common.get_date_in_format(ssh_client=con_ssh, date_format=KPI_DATE_FORMAT)
         else:
-            if start_pattern:
-                kpi_val, time_stamp, count = get_duration(start_pattern=start_pattern, start_path=start_path,
-                                                          end_pattern=end_pattern, log_path=log_path,
-                                                          host=host, sudo=sudo, topdown=topdown,
-                                                          extended_regex=extended_regex,
-                                                          average_for_all=average_for_all,
-                                                          init_time=init_time, start_host=start_host,
-                                                          start_pattern_init=start_pattern_init, con_ssh=con_ssh)
-            else:
-                kpi_val, time_stamp, count = get_match(pattern=end_pattern, log_path=log_path, host=host,
-                                                       extended_regex=extended_regex, python_pattern=python_pattern,
-                                                       average_for_all=average_for_all, sudo=sudo, topdown=topdown,
-                                                       init_time=init_time, con_ssh=con_ssh)
+            kpi_spec = dict(kpi_name=kpi_name, host=host, log_path=log_path, end_pattern=end_pattern,
+                            start_pattern=start_pattern, start_path=start_path, start_host=start_host,
+                            extended_regex=extended_regex, python_pattern=python_pattern,
+                            average_for_all=average_for_all, sudo=sudo, topdown=topdown, init_time=init_time,
+                            start_pattern_init=start_pattern_init)
+            kpi_val, time_stamp, count = get_kpis([kpi_spec], con_ssh=con_ssh, fail_ok=False)[kpi_name]
 
         kpi_dict.update({'timestamp': time_stamp, 'value': kpi_val})
 
@@ -140,6 +105,54 @@ def record_kpi(local_kpi_file, kpi_name, host=None, log_path=None, end_pattern=N
         return 1, e.__str__()
 
 
+def _get_lab(lab_name=None):
+    if not lab_name:
+        lab = ProjVar.get_var('LAB')
+        if not lab:
+            raise ValueError("lab_name needs to be provided")
+    else:
+        lab = lab_info.get_lab_dict(labname=lab_name)
+    return lab
+
+
+def _get_con_ssh(lab, con_ssh=None):
+    if not con_ssh:
+        con_ssh = ControllerClient.get_active_controller(fail_ok=True)
+        if not con_ssh:
+            if not ProjVar.get_var('LAB'):
+                ProjVar.set_var(lab=lab)
+                ProjVar.set_var(source_openrc=True)
+            con_ssh = SSHClient(lab.get('floating ip'), HostLinuxUser.get_user(), HostLinuxUser.get_password(),
+                                CONTROLLER_PROMPT)
+            con_ssh.connect()
+    return con_ssh
+
+
+def _get_kpi_base_dict(lab, con_ssh, build_id=None, sw_version=None, patch=None, uptime=5):
+    """
+    Get kpi info that is common for all kpis of the system, such as build id and load average
+    """
+    kpi_dict = {'lab': lab['name']}
+    if not build_id or not sw_version:
+        build_info = system_helper.get_build_info(con_ssh=con_ssh)
+        build_id = build_id if build_id else build_info['BUILD_ID']
+        sw_version = sw_version if sw_version else build_info['SW_VERSION']
+
+    kpi_dict.update({'build_id': build_id, 'sw_version': sw_version})
+
+    if not patch:
+        patch = ProjVar.get_var('PATCH')
+        if patch:
+            patch = ' '.join(patch)
+            kpi_dict.update({'patch': patch})
+    else:
+        kpi_dict.update({'patch': patch})
+
+    load_average = get_load_average(ssh_client=con_ssh, uptime=uptime)
+    kpi_dict.update({'load_average': load_average})
+    return kpi_dict
+
+
 def append_to_kpi_file(local_kpi_file, kpi_name, kpi_dict):
     config = ConfigParser()
     config[kpi_name] = kpi_dict
@@ -160,6 +173,15 @@ def append_to_kpi_file(local_kpi_file, kpi_name, kpi_dict):
         kpi_file.seek(0)
         print("\nContent in KPI file {}: \n{}".format(local_kpi_file, kpi_file.read()))
 
+    # stream kpi to kpi db if a writer is set for the test session
+    # ini line is already written, so upload failure should not fail kpi recording
+    kpi_writer = upload_kpi.KpiWriter.get_writer()
+    if kpi_writer:
+        try:
+            kpi_writer.write(kpi_name, kpi_dict)
+        except Exception as e:
+            print("Failed to queue kpi {} for upload: {}".format(kpi_name, e.__str__()))
+
 
 def get_load_average(ssh_client, uptime=5):
     uptime_map = {
@@ -236,37 +258,22 @@ def get_duration(start_pattern, end_pattern, log_path, host, con_ssh, start_path
     Returns:
 
     """
-    def get_end_times(init_time_, host_ssh_):
-        if re.match(TIMESTAMP_PATTERN, end_pattern):
-            end_times_ = [end_pattern]
-        else:
-            end_line = search_log(file_path=log_path, ssh_client=host_ssh_, pattern=end_pattern, sudo=sudo,
-                                  extended_regex=extended_regex, get_all=average_for_all, top_down=topdown,
-                                  init_time=init_time_)
-            end_times_ = re.findall(TIMESTAMP_PATTERN, end_line)
-        return end_times_
-
-    start_host = start_host if start_host else host
-    end_times = None
-    with host_helper.ssh_to_host(hostname=start_host, con_ssh=con_ssh) as host_ssh:
-        if re.match(TIMESTAMP_PATTERN, start_pattern):
-            start_times = [start_pattern]
-        else:
-            start_path = start_path if start_path else log_path
-            start_line = search_log(file_path=start_path, ssh_client=host_ssh, pattern=start_pattern, sudo=sudo,
-                                    extended_regex=extended_regex, get_all=average_for_all, top_down=topdown,
-                                    init_time=init_time)
-            start_times = re.findall(TIMESTAMP_PATTERN, start_line)
-        if start_pattern_init:
-            init_time = start_times[0]
+    kpi_spec = dict(kpi_name='duration', host=host, log_path=log_path, end_pattern=end_pattern,
+                    start_pattern=start_pattern, start_path=start_path, start_host=start_host,
+                    extended_regex=extended_regex, average_for_all=average_for_all, sudo=sudo, topdown=topdown,
+                    init_time=init_time, start_pattern_init=start_pattern_init)
+    return get_kpis([kpi_spec], con_ssh=con_ssh, fail_ok=False)['duration']
+
 
-        if start_host == host:
-            end_times = get_end_times(init_time_=init_time, host_ssh_=host_ssh)
+def get_match(pattern, log_path, host, con_ssh, python_pattern=None, extended_regex=False, average_for_all=False,
+              sudo=False, topdown=False, init_time=None):
+    kpi_spec = dict(kpi_name='match', host=host, log_path=log_path, end_pattern=pattern,
+                    python_pattern=python_pattern, extended_regex=extended_regex, average_for_all=average_for_all,
+                    sudo=sudo, topdown=topdown, init_time=init_time)
+    return get_kpis([kpi_spec], con_ssh=con_ssh, fail_ok=False)['match']
 
-    if end_times is None:
-        with host_helper.ssh_to_host(hostname=host, con_ssh=con_ssh) as end_ssh:
-            end_times = get_end_times(init_time_=init_time, host_ssh_=end_ssh)
 
+def _calc_duration(start_times, end_times):
     count = len(start_times)
     end_count = len(end_times)
     diff = end_count - count
@@ -295,13 +302,8 @@ def get_duration(start_pattern, end_pattern, log_path, host, con_ssh, start_path
     return average_duration, end_time, count
 
 
-def get_match(pattern, log_path, host, con_ssh, python_pattern=None, extended_regex=False, average_for_all=False,
-              sudo=False, topdown=False, init_time=None):
-    with host_helper.ssh_to_host(hostname=host, con_ssh=con_ssh) as host_ssh:
-        line = search_log(file_path=log_path, ssh_client=host_ssh, pattern=pattern, extended_regex=extended_regex,
-                          get_all=average_for_all, sudo=sudo, top_down=topdown, init_time=init_time)
-
-    timestamp_pattern = '\d{4}-\d{2}-\d{2}[T| ]\d{2}:\d{2}:\d{2}'
+def _calc_match(line, pattern, python_pattern=None, average_for_all=False):
+    timestamp_pattern = r'\d{4}-\d{2}-\d{2}[T| ]\d{2}:\d{2}:\d{2}'
     time_stamp = re.findall(timestamp_pattern, line)[-1]
 
     python_pattern = python_pattern if python_pattern else pattern
@@ -318,6 +320,281 @@ def get_match(pattern, log_path, host, con_ssh, python_pattern=None, extended_re
     return final_val, time_stamp, count
 
 
+# Searches all patterns of a log in one pass. Log lines are streamed from zcat with a file marker line before each
+# log. Search parameters are passed via environment variables to avoid awk -v escape processing of the patterns.
+_FILE_MARKER = '##KPI_LOG_FILE'
+_AWK_SEARCH = (
+    'BEGIN { n = ENVIRON["KPI_N"] + 0; '
+    'for (i = 0; i < n; i++) { p[i] = ENVIRON["KPI_P" i]; f[i] = ENVIRON["KPI_F" i]; m[i] = ENVIRON["KPI_M" i]; '
+    'ini_s[i] = ENVIRON["KPI_IS" i]; ini_t[i] = ENVIRON["KPI_IT" i] } } '
+    '$1 == "' + _FILE_MARKER + '" { cur = $2; first = 1; next } '
+    'first { tfmt = ($1 ~ /[0-9]T[0-9]/); first = 0 } '
+    'index($0, "grep") { next } '
+    '{ for (i = 0; i < n; i++) { '
+    'if (f[i] != cur || (m[i] == "first" && c[i])) continue; '
+    'if (ini_s[i] != "" && $0 <= (tfmt ? ini_t[i] : ini_s[i])) continue; '
+    'if ($0 ~ p[i]) { if (m[i] == "last") { c[i] = 1; l[i, 1] = $0 } else l[i, ++c[i]] = $0 } } } '
+    'END { for (i = 0; i < n; i++) { '
+    'if (m[i] == "all_rev") { for (j = c[i]; j >= 1; j--) print "KPI" i ":" l[i, j] } '
+    'else { for (j = 1; j <= c[i]; j++) print "KPI" i ":" l[i, j] } } }')
+
+
+def _shell_quote(val):
+    return "'{}'".format(val.replace("'", "'\\''"))
+
+
+def _grep_to_awk_regex(pattern, extended_regex=False):
+    """
+    Convert a pattern used in zgrep "<pattern>" to awk extended regex.
+    """
+    # unescape double quoted shell string
+    pattern = re.sub(r'\\([$`"\\])', r'\1', pattern)
+    if extended_regex:
+        return pattern
+
+    # basic regex: \( \) \{ \} \| \+ \? are special, while unescaped ones are literal
+    converted = ''
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            next_char = pattern[i + 1]
+            converted += next_char if next_char in '(){}|+?' else char + next_char
+            i += 2
+            continue
+        converted += '\\' + char if char in '(){}|+?' else char
+        i += 1
+    return converted
+
+
+def search_logs(ssh_client, searches, sudo=False, expect_timeout=300):
+    """
+    Search multiple patterns in multiple logs on a host with one pass over each log.
+    Each search behaves the same as search_log() with the same parameters.
+
+    Args:
+        ssh_client (SSHClient): ssh client of the host where the logs are located
+        searches (list): list of dict with keys: file_path, pattern, and optional extended_regex, get_all,
+            top_down, init_time
+        sudo (bool): whether to access logs with sudo
+        expect_timeout (int): max seconds to wait for the search to complete
+
+    Returns (list): matching lines for each search in same order as searches. Empty string if no match.
+
+    """
+    if not searches:
+        return []
+
+    prefix_space = False
+    files = []
+    env_vars = ['KPI_N={}'.format(len(searches))]
+    for i, search in enumerate(searches):
+        file_path = search['file_path']
+        if 'bash' in file_path:
+            prefix_space = True
+            sudo = True
+        if file_path not in files:
+            files.append(file_path)
+
+        if search.get('get_all'):
+            mode = 'all' if search.get('top_down') else 'all_rev'
+        else:
+            mode = 'first' if search.get('top_down') else 'last'
+
+        init_time = search.get('init_time')
+        init_time = init_time.strip() if init_time else ''
+        pattern = _grep_to_awk_regex(search['pattern'], extended_regex=search.get('extended_regex'))
+        env_vars += ['KPI_F{}={}'.format(i, files.index(file_path)),
+                     'KPI_M{}={}'.format(i, mode),
+                     'KPI_P{}={}'.format(i, _shell_quote(pattern)),
+                     'KPI_IS{}={}'.format(i, _shell_quote(init_time.replace('T', ' '))),
+                     'KPI_IT{}={}'.format(i, _shell_quote(init_time.replace(' ', 'T')))]
+
+    read_cmd = '; '.join('echo "{} {}"; zcat -f "{}" 2>/dev/null'.format(_FILE_MARKER, i, file_path)
+                         for i, file_path in enumerate(files))
+    cmd = "sh -c '{}' | {} awk '{}'".format(read_cmd, ' '.join(env_vars), _AWK_SEARCH)
+
+    if prefix_space:
+        ssh_client.exec_cmd('HISTCONTROL=ignorespace')
+    print("Search {} pattern(s) in {}".format(len(searches), ', '.join(files)))
+    if sudo:
+        out = ssh_client.exec_sudo_cmd(cmd, fail_ok=True, prefix_space=prefix_space,
+                                       expect_timeout=expect_timeout)[1]
+    else:
+        out = ssh_client.exec_cmd(cmd, fail_ok=True, prefix_space=prefix_space, expect_timeout=expect_timeout)[1]
+
+    outputs = [[] for _ in searches]
+    for line in out.splitlines():
+        match = re.match(r'KPI(\d+):(.*)', line)
+        if match and int(match.group(1)) < len(searches):
+            outputs[int(match.group(1))].append(match.group(2))
+
+    return ['\n'.join(lines) for lines in outputs]
+
+
+def _search_hosts(searches_per_host, con_ssh):
+    outputs = {}
+    for host, searches in searches_per_host.items():
+        sudo = any(search.get('sudo') for search in searches)
+        with host_helper.ssh_to_host(hostname=host, con_ssh=con_ssh) as host_ssh:
+            outputs[host] = search_logs(ssh_client=host_ssh, searches=searches, sudo=sudo)
+    return outputs
+
+
+def get_kpis(kpi_specs, con_ssh=None, fail_ok=True):
+    """
+    Get values of multiple kpis. Logs are grouped per host, and each host is searched for all patterns in one
+    pass over its logs, instead of one grep per pattern.
+
+    Args:
+        kpi_specs (list): list of dict. Each dict contains kpi_name, and log search params that are the same as
+            record_kpi(): host, log_path, end_pattern, start_pattern, start_path, start_host, extended_regex,
+            python_pattern, average_for_all, sudo, topdown, init_time, start_pattern_init
+        con_ssh (SSHClient|None): ssh client of active controller
+        fail_ok (bool): whether to raise exception if any kpi failed to be extracted
+
+    Returns (dict): {<kpi_name>: (<kpi_val>, <time_stamp>, <count>), ...}
+        When fail_ok=True, value of failed kpi is the exception instance.
+
+    """
+    # Searches with start_pattern_init depend on the start timestamps, so they are searched in a second round.
+    rounds = [{}, {}]
+    outputs = [{}, {}]
+
+    def _add_search(round_, host_, spec_, file_path, pattern, init_time):
+        host_searches = rounds[round_].setdefault(host_, [])
+        host_searches.append(dict(file_path=file_path, pattern=pattern, init_time=init_time,
+                                  extended_regex=spec_.get('extended_regex', False),
+                                  get_all=spec_.get('average_for_all', False), top_down=spec_.get('topdown', False),
+                                  sudo=spec_.get('sudo', False)))
+        return round_, host_, len(host_searches) - 1
+
+    def _get_times(spec_, pattern_type):
+        pattern = spec_['{}_pattern'.format(pattern_type)]
+        if re.match(TIMESTAMP_PATTERN, pattern):
+            return [pattern]
+        return re.findall(TIMESTAMP_PATTERN, _get_output(spec_, pattern_type))
+
+    def _get_output(spec_, pattern_type):
+        round_, host_, index = refs[spec_['kpi_name']][pattern_type]
+        search = rounds[round_][host_][index]
+        out = outputs[round_][host_][index]
+        print("Output for {}: {}".format(search['pattern'], out))
+        if not out:
+            raise ValueError("Nothing returned when search {} in {} on {}".format(
+                search['pattern'], search['file_path'], host_ if host_ else 'active controller'))
+        return out
+
+    results = {}
+
+    def _handle_error(spec_, e):
+        if not fail_ok:
+            raise e
+        print("Failed to get kpi {}. Error: {}".format(spec_['kpi_name'], e.__str__()))
+        results[spec_['kpi_name']] = e
+
+    refs = {}
+    for spec in kpi_specs:
+        host = spec.get('host')
+        start_pattern = spec.get('start_pattern')
+        end_pattern = spec['end_pattern']
+        kpi_refs = refs[spec['kpi_name']] = {}
+        if start_pattern and not re.match(TIMESTAMP_PATTERN, start_pattern):
+            kpi_refs['start'] = _add_search(0, spec.get('start_host') or host, spec,
+                                            file_path=spec.get('start_path') or spec['log_path'],
+                                            pattern=start_pattern, init_time=spec.get('init_time'))
+        if not start_pattern or not re.match(TIMESTAMP_PATTERN, end_pattern):
+            if not (start_pattern and spec.get('start_pattern_init')):
+                kpi_refs['end'] = _add_search(0, host, spec, file_path=spec['log_path'], pattern=end_pattern,
+                                              init_time=spec.get('init_time'))
+
+    outputs[0] = _search_hosts(rounds[0], con_ssh=con_ssh)
+
+    for spec in kpi_specs:
+        kpi_refs = refs[spec['kpi_name']]
+        if spec.get('start_pattern') and spec.get('start_pattern_init') and \
+                not re.match(TIMESTAMP_PATTERN, spec['end_pattern']):
+            try:
+                init_time = _get_times(spec, 'start')[0]
+            except Exception as e:
+                _handle_error(spec, e)
+                continue
+            kpi_refs['end'] = _add_search(1, spec.get('host'), spec, file_path=spec['log_path'],
+                                          pattern=spec['end_pattern'], init_time=init_time)
+
+    outputs[1] = _search_hosts(rounds[1], con_ssh=con_ssh)
+
+    for spec in kpi_specs:
+        kpi_name = spec['kpi_name']
+        if kpi_name in results:
+            continue
+        try:
+            if spec.get('start_pattern'):
+                results[kpi_name] = _calc_duration(start_times=_get_times(spec, 'start'),
+                                                   end_times=_get_times(spec, 'end'))
+            else:
+                results[kpi_name] = _calc_match(_get_output(spec, 'end'), pattern=spec['end_pattern'],
+                                                python_pattern=spec.get('python_pattern'),
+                                                average_for_all=spec.get('average_for_all', False))
+        except Exception as e:
+            _handle_error(spec, e)
+
+    return results
+
+
+def record_kpis(local_kpi_file, kpi_specs, lab_name=None, con_ssh=None, build_id=None, sw_version=None,
+                patch=None, uptime=5, fail_ok=True):
+    """
+    Record multiple kpis in ini format in given file. Logs are searched once per host for all kpis.
+
+    Args:
+        local_kpi_file (str): local file path to store the kpi data
+        kpi_specs (list): list of dict. Each dict contains kpi_name, optional unit, and log search params.
+            See get_kpis() for details.
+        lab_name (str|None):
+        con_ssh (SSHClient|None):
+        build_id (str|None):
+        sw_version (str|None):
+        patch (str|None):
+        uptime (int|str): get load average for the previous <uptime> minutes via 'uptime' cmd
+        fail_ok (bool):
+
+    Returns (dict): {<kpi_name>: (<code>, <kpi_val or error msg>), ...}
+        code 0 if kpi is recorded, 1 otherwise.
+
+    """
+    try:
+        lab = _get_lab(lab_name)
+        con_ssh = _get_con_ssh(lab, con_ssh=con_ssh)
+        base_dict = _get_kpi_base_dict(lab, con_ssh=con_ssh, build_id=build_id, sw_version=sw_version, patch=patch,
+                                       uptime=uptime)
+        kpis = get_kpis(kpi_specs, con_ssh=con_ssh, fail_ok=fail_ok)
+    except Exception as e:
+        if not fail_ok:
+            raise
+        print("Failed to record kpis. Error: {}".format(e.__str__()))
+        return {spec['kpi_name']: (1, e.__str__()) for spec in kpi_specs}
+
+    res = {}
+    for spec in kpi_specs:
+        kpi_name = spec['kpi_name']
+        kpi = kpis[kpi_name]
+        if isinstance(kpi, Exception):
+            res[kpi_name] = (1, kpi.__str__())
+            continue
+
+        kpi_val, time_stamp, count = kpi
+        kpi_dict = dict(base_dict)
+        kpi_dict['unit'] = spec.get('unit') or 'Time(s)'
+        if spec.get('host'):
+            kpi_dict['host'] = spec['host']
+        kpi_dict.update({'log_path': spec['log_path'], 'timestamp': time_stamp, 'value': kpi_val})
+        append_to_kpi_file(local_kpi_file=local_kpi_file, kpi_name=kpi_name, kpi_dict=kpi_dict)
+        res[kpi_name] = (0, kpi_val)
+
+    return res
+
+
 if __name__ == '__main__':
     """
     Usage:
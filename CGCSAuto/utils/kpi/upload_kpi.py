@@ -1,7 +1,9 @@
+import calendar
+import os
+import threading
+import time
 from argparse import ArgumentParser
 from configparser import ConfigParser
-from influxdb import InfluxDBClient
-from math import ceil
 
 
 KPI_DB = 'tis-lab-auto-test-kpis.cumulus.wrs.com'
@@ -11,12 +13,334 @@ DB_NAME = 'kpihistory'
 # DB_NAME = 'testdb'    # test database
 
 
+def get_kpi_point(kpi_name, kpi_dict):
+    """
+    Convert kpi recorded by kpi_log_parser to InfluxDB point
+
+    Args:
+        kpi_name (str):
+        kpi_dict (dict): kpi info such as value, timestamp, lab, build_id, etc
+
+    Returns (dict): point with measurement, time, tags and fields
+
+    """
+    kpi_val = kpi_dict.get('value')
+    vals = [float(val_) for val_ in str(kpi_val).split(',')]
+    upload_dict = {
+        'measurement': kpi_name,
+        'time': '{}Z'.format(str(kpi_dict.get('timestamp')).strip().replace(' ', 'T')),
+        'tags': {
+            'lab': kpi_dict.get('lab'),
+            'build_id': kpi_dict.get('build_id', ''),
+            'sw_version':  kpi_dict.get('sw_version', ''),
+            'baseline': 'false'
+        },
+        'fields': {
+            'value': vals[0],
+            'unit': kpi_dict.get('unit', '')
+        },
+    }
+
+    # Add patch tag when avail
+    patch = kpi_dict.get('patch', None)
+    if patch:
+        upload_dict['tags'].update({'patch': patch})
+
+    # Add extra fields when avail
+    extra_fields = {}
+
+    if kpi_dict.get('lab_config', None):
+        extra_fields.update({'lab_config': kpi_dict.get('lab_config')})
+
+    if 'drbd_sync' in kpi_name.lower():
+        extra_fields.update({'value_min': vals[1], 'value_max': vals[2]})
+
+    load_avg = kpi_dict.get('load_average', None)
+    if load_avg is not None:
+        extra_fields['load_avg'] = float(load_avg)
+
+    disk_io = kpi_dict.get('disk_io', None)
+    if disk_io is not None:
+        extra_fields['disk_io'] = float(disk_io)
+
+    if extra_fields:
+        upload_dict['fields'].update(extra_fields)
+
+    return upload_dict
+
+
+def _escape_key(val):
+    return str(val).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+
+def _escape_measurement(val):
+    return str(val).replace(',', '\\,').replace(' ', '\\ ')
+
+
+def _format_field(val):
+    if isinstance(val, bool):
+        return 'true' if val else 'false'
+    if isinstance(val, (int, float)):
+        return repr(float(val))
+    return '"{}"'.format(str(val).replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def to_line_protocol(point):
+    """
+    Convert point to InfluxDB line protocol with timestamp in seconds.
+    e.g., 'host_lock,lab=wcp_7-12,build_id=2019-01-01_00-00-00 value=30.0,unit="Time(s)" 1546300800'
+
+    Args:
+        point (dict): point from get_kpi_point()
+
+    Returns (str):
+
+    """
+    tags = ''.join(',{}={}'.format(_escape_key(key), _escape_key(val))
+                   for key, val in sorted(point.get('tags', {}).items()) if val not in (None, ''))
+    fields = ','.join('{}={}'.format(_escape_key(key), _format_field(val))
+                      for key, val in sorted(point['fields'].items()) if val is not None)
+    timestamp = calendar.timegm(time.strptime(point['time'][:19], '%Y-%m-%dT%H:%M:%S'))
+    return '{}{} {} {}'.format(_escape_measurement(point['measurement']), tags, fields, timestamp)
+
+
+class KpiWriter:
+    """
+    Buffered kpi writer. Kpis are converted to line protocol as they are recorded, and written to InfluxDB in
+    batches from a background thread, so tests do not wait for kpi uploads. Lines that failed to be uploaded are
+    appended to a spool file, and are replayed on next flush, which could be in the next test session. Lines
+    rejected by InfluxDB (4xx) are moved to <spool_path>.rejected instead of being replayed.
+
+    When local_path is given, lines are written to that file instead of InfluxDB, e.g., for offline testing.
+
+    e.g.,
+        KpiWriter.set_writer(KpiWriter(spool_path='<log_root>/kpi_spool.lp'))
+        ...
+        KpiWriter.get_writer().write(kpi_name, kpi_dict)     # called by kpi_log_parser.append_to_kpi_file()
+        ...
+        KpiWriter.get_writer().close()
+    """
+    __writer = None
+
+    def __init__(self, spool_path=None, local_path=None, host=KPI_DB, port=8086, user=KPI_USER,
+                 password=KPI_PASSWD, db_name=DB_NAME, batch_size=20, flush_interval=300, retries=2, retry_delay=5,
+                 timeout=10, background=True):
+        """
+
+        Args:
+            spool_path (str|None): file to store lines that failed to be uploaded
+            local_path (str|None): write lines to this file instead of InfluxDB
+            host (str): InfluxDB host
+            port (int):
+            user (str):
+            password (str):
+            db_name (str):
+            batch_size (int): flush when number of buffered lines reaches this
+            flush_interval (int): flush if seconds since last flush exceeds this
+            retries (int): max retries for each upload
+            retry_delay (int): seconds to wait between retries
+            timeout (int): InfluxDB request timeout in seconds
+            background (bool): flush from a background thread. Otherwise lines are only written on flush() or
+                close().
+        """
+        self.spool_path = spool_path
+        self.local_path = local_path
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.buffer = []
+        self.stats = {'written': 0, 'spooled': 0, 'replayed': 0, 'rejected': 0, 'invalid': 0}
+        self._client = None
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='kpi_writer', daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def set_writer(cls, writer):
+        cls.__writer = writer
+
+    @classmethod
+    def get_writer(cls):
+        return cls.__writer
+
+    def write(self, kpi_name, kpi_dict):
+        """
+        Buffer a kpi. Buffered lines are flushed in background when batch_size or flush_interval is reached.
+        Never raises, so a bad kpi does not fail the test recording it.
+
+        Args:
+            kpi_name (str):
+            kpi_dict (dict): kpi info as recorded in kpi ini file
+
+        Returns (bool): False if kpi cannot be converted to line protocol, e.g., non-numeric value
+
+        """
+        try:
+            line = to_line_protocol(get_kpi_point(kpi_name, kpi_dict))
+        except Exception as e:
+            self.stats['invalid'] += 1
+            print("Invalid kpi {} {} is not uploaded: {}".format(kpi_name, kpi_dict, e.__str__()))
+            return False
+
+        with self._lock:
+            self.buffer.append(line)
+            buffered = len(self.buffer)
+        if buffered >= self.batch_size:
+            self._flush_event.set()
+        return True
+
+    def _run(self):
+        while not self._closed.is_set():
+            self._flush_event.wait(max(self._last_flush + self.flush_interval - time.time(), 1))
+            if self._closed.is_set():
+                break
+            self._flush_event.clear()
+            with self._lock:
+                buffered = len(self.buffer)
+            if buffered >= self.batch_size or time.time() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _get_client(self):
+        if self._client is None:
+            from influxdb import InfluxDBClient
+            self._client = InfluxDBClient(self.host, self.port, self.user, self.password, self.db_name,
+                                          timeout=self.timeout)
+        return self._client
+
+    def _write_lines(self, lines):
+        """
+        Returns (str): 'written', 'rejected' or 'failed'
+        """
+        if self.local_path:
+            with open(self.local_path, mode='a') as f:
+                f.write(''.join(line + '\n' for line in lines))
+            return 'written'
+
+        for i in range(self.retries + 1):
+            try:
+                self._get_client().write_points(lines, time_precision='s', protocol='line')
+                return 'written'
+            except Exception as e:
+                print("Failed to upload {} kpi line(s) to {}: {}".format(len(lines), self.host, e.__str__()))
+                code = getattr(e, 'code', None)
+                if isinstance(code, int) and 400 <= code < 500:
+                    # e.g., malformed line. Retrying or replaying would fail the same way.
+                    return 'rejected'
+                if i < self.retries:
+                    time.sleep(self.retry_delay)
+        return 'failed'
+
+    def _read_spool(self):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return []
+        with open(self.spool_path) as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _write_spool(self, lines):
+        tmp_path = self.spool_path + '.tmp'
+        with open(tmp_path, mode='w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        os.replace(tmp_path, self.spool_path)
+
+    def _quarantine(self, lines):
+        if not self.spool_path:
+            return
+        with open(self.spool_path + '.rejected', mode='a') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+    def _flush(self):
+        self._last_flush = time.time()
+        # spooled lines are kept for kpi db, and not replayed to local file
+        spooled = [] if self.local_path else self._read_spool()
+        with self._lock:
+            buffered, self.buffer = self.buffer, []
+        if not spooled and not buffered:
+            return True
+
+        # Spooled and new lines are uploaded separately, so a bad spooled line does not get new lines rejected
+        to_spool = []
+        all_written = True
+        for lines, is_spooled in ((spooled, True), (buffered, False)):
+            if not lines:
+                continue
+            res = self._write_lines(lines)
+            if res == 'written':
+                self.stats['written'] += len(lines)
+                if is_spooled:
+                    self.stats['replayed'] += len(lines)
+                print("{} kpi line(s) written to {}".format(len(lines), self.local_path or self.host))
+            elif res == 'rejected':
+                # Retrying would fail the same way. Keep them aside for investigation.
+                self.stats['rejected'] += len(lines)
+                self._quarantine(lines)
+                print("{} kpi line(s) rejected by {}{}".format(
+                    len(lines), self.host,
+                    ' and moved to {}.rejected'.format(self.spool_path) if self.spool_path else ''))
+                all_written = False
+            else:
+                if not is_spooled:
+                    self.stats['spooled'] += len(lines)
+                to_spool += lines
+                all_written = False
+
+        if self.spool_path:
+            if to_spool:
+                self._write_spool(to_spool)
+                print("{} kpi line(s) spooled to {}".format(len(to_spool), self.spool_path))
+            elif spooled:
+                os.remove(self.spool_path)
+        return all_written
+
+    def flush(self):
+        """
+        Write buffered lines and lines left in spool file. Never raises.
+
+        Returns (bool): whether all lines are written
+
+        """
+        with self._flush_lock:
+            try:
+                return self._flush()
+            except Exception as e:
+                print("Failed to flush kpis: {}".format(e.__str__()))
+                return False
+
+    def close(self):
+        """
+        Stop background flushing and flush remaining lines
+
+        Returns (dict): writer stats
+
+        """
+        self._closed.set()
+        self._flush_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout * (self.retries + 1) + self.retry_delay * self.retries + 30)
+        self.flush()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        return self.stats
+
+
 def upload_kpi(kpi_file, host=KPI_DB, port=8086, user=KPI_USER,
-               password=KPI_PASSWD):
+               password=KPI_PASSWD, spool_path=None, local_path=None):
     try:
         kpi_config = ConfigParser()
         kpi_config.read(kpi_file)
-        kpi_list = []
         sections = kpi_config.sections()
         if not sections:
             print("No kpi recorded in {}".format(kpi_file))
@@ -25,8 +349,10 @@ def upload_kpi(kpi_file, host=KPI_DB, port=8086, user=KPI_USER,
         print(e.__str__())
         return
 
+    writer = KpiWriter(spool_path=spool_path, local_path=local_path, host=host, port=port, user=user,
+                       password=password, batch_size=len(sections) + 1, background=False)
     for section in sections:
-        section_dict = {'name': section}
+        section_dict = {}
         options = kpi_config.options(section)
         for option in options:
             try:
@@ -34,75 +360,22 @@ def upload_kpi(kpi_file, host=KPI_DB, port=8086, user=KPI_USER,
             except:
                 print("exception on %s!" % option)
                 section_dict[option] = None
-        kpi_list.append(section_dict)
-
-    # print(str(kpi_list))
-
-    upload_list = []
-    for kpi_dict in kpi_list:
-        kpi_name = kpi_dict.get('name')
-        kpi_val = kpi_dict.get('value')
-        vals = [float(val_) for val_ in kpi_val.split(',')]
-        upload_dict = {
-            'measurement': kpi_name,
-            'time': '{}Z'.format(kpi_dict.get('timestamp').strip().replace(' ', 'T')),
-            'tags': {
-                'lab': kpi_dict.get('lab'),
-                'build_id': kpi_dict.get('build_id', ''),
-                'sw_version':  kpi_dict.get('sw_version', ''),
-                'baseline': 'false'
-            },
-            'fields': {
-                'value': vals[0],
-                'unit': kpi_dict.get('unit', '')
-            },
-        }
-
-        # Add patch tag when avail
-        patch = kpi_dict.get('patch', None)
-        if patch:
-            upload_dict['tags'].update({'patch': patch})
-
-        # Add extra fields when avail
-        extra_fields = {}
-
-        if kpi_dict.get('lab_config', None):
-            extra_fields.update({'lab_config': kpi_dict.get('lab_config')})
-
-        if 'drbd_sync' in kpi_name.lower():
-            extra_fields.update({'value_min': vals[1], 'value_max': vals[2]})
-
-        load_avg = kpi_dict.get('load_average', None)
-        if load_avg is not None:
-            extra_fields['load_avg'] = float(load_avg)
-
-        disk_io = kpi_dict.get('disk_io', None)
-        if disk_io is not None:
-            extra_fields['disk_io'] = float(disk_io)
-
-        if extra_fields:
-            upload_dict['fields'].update(extra_fields)
-
-        upload_list.append(upload_dict)
-
-    print("\nConnect to KPI DB and upload KPI(s): \n{}".format(upload_list))
-    client = InfluxDBClient(host, port, user, password, DB_NAME)
-    client.write_points(upload_list)
-
-    # print("\nQuery uploaded results")
-    # for kpi_dict in kpi_list:
-    #     # client.delete_series(measurement=kpi_dict.get('name'))
-    #     query = 'SELECT * FROM "{}"'.format(kpi_dict.get('name'))
-    #     print("{}".format(query))
-    #     result = client.query(query)
-    #     print("{}\n".format(result))
+        writer.write(section, section_dict)
 
+    print("\nConnect to KPI DB and upload KPI(s): \n{}".format('\n'.join(writer.buffer)))
+    writer.close()
     return
 
+
 if __name__ == '__main__':
     parser = ArgumentParser("KPI uploader")
     parser.add_argument('file_path', type=str, help='Full path for recorded KPIs. e.g., '
                                                     '/sandbox/AUTOMATION_LOGS/wcp_7_12/201711151119/kpi.ini')
 
+    parser.add_argument('--local', dest='local_path', default=None,
+                        help='Write kpis in line protocol to given file instead of uploading to KPI DB')
+    parser.add_argument('--spool', dest='spool_path', default=None,
+                        help='File to keep kpis that failed to be uploaded, and to replay from on next upload')
+
     args = parser.parse_args()
-    upload_kpi(kpi_file=args.file_path)
+    upload_kpi(kpi_file=args.file_path, spool_path=args.spool_path, local_path=args.local_path)
@@ -0,0 +1,411 @@
+import json
+import re
+import threading
+import time
+
+import pexpect
+
+from consts.proj_vars import ProjVar
+from utils import exceptions
+from utils.clients.ssh import SSHClient, ControllerClient
+from utils.tis_log import LOG
+
+
+WATCH_PODS_CMD = 'kubectl get pods --all-namespaces --watch -o json ' \
+                 '--output-watch-events'
+
+
+def get_pod_status(pod):
+    """
+    Get pod status as shown in STATUS column of 'kubectl get pods'
+
+    Args:
+        pod (dict): pod object from kubectl json output
+
+    Returns (str): such as Running, Completed, Init:0/1, CrashLoopBackOff,
+        Terminating
+
+    """
+    metadata = pod.get('metadata', {})
+    spec = pod.get('spec', {})
+    status = pod.get('status', {})
+    reason = status.get('reason') or status.get('phase') or ''
+
+    def _get_terminated_reason(terminated):
+        if terminated.get('reason'):
+            return terminated['reason']
+        if terminated.get('signal'):
+            return 'Signal:{}'.format(terminated['signal'])
+        return 'ExitCode:{}'.format(terminated.get('exitCode'))
+
+    initializing = False
+    init_statuses = status.get('initContainerStatuses') or []
+    for i, container in enumerate(init_statuses):
+        state = container.get('state', {})
+        terminated = state.get('terminated')
+        waiting_reason = state.get('waiting', {}).get('reason')
+        if terminated and terminated.get('exitCode') == 0:
+            continue
+        if terminated:
+            reason = 'Init:{}'.format(_get_terminated_reason(terminated))
+        elif waiting_reason and waiting_reason != 'PodInitializing':
+            reason = 'Init:{}'.format(waiting_reason)
+        else:
+            reason = 'Init:{}/{}'.format(
+                i, len(spec.get('initContainers') or init_statuses))
+        initializing = True
+        break
+
+    if not initializing:
+        has_running = False
+        for container in reversed(status.get('containerStatuses') or []):
+            state = container.get('state', {})
+            waiting_reason = state.get('waiting', {}).get('reason')
+            if waiting_reason:
+                reason = waiting_reason
+            elif state.get('terminated'):
+                reason = _get_terminated_reason(state['terminated'])
+            elif state.get('running') and container.get('ready'):
+                has_running = True
+        if reason == 'Completed' and has_running:
+            reason = 'Running'
+
+    if metadata.get('deletionTimestamp'):
+        reason = 'Unknown' if status.get('reason') == 'NodeLost' else \
+            'Terminating'
+    return reason
+
+
+def get_pod_info(pod):
+    """
+    Get pod info from pod object of kubectl json output
+
+    Returns (dict): name, namespace, labels, node, phase, status, ready
+        e.g., {'name': 'nova-api-xxx', 'namespace': 'openstack',
+        'labels': {'application': 'nova'}, 'node': 'controller-0',
+        'phase': 'Running', 'status': 'Running', 'ready': '1/1'}
+
+    """
+    metadata = pod.get('metadata', {})
+    spec = pod.get('spec', {})
+    status = pod.get('status', {})
+    container_statuses = status.get('containerStatuses') or []
+    ready_count = len([container for container in container_statuses if
+                       container.get('ready')])
+    total_count = len(spec.get('containers') or container_statuses)
+    return {'name': metadata.get('name'),
+            'namespace': metadata.get('namespace'),
+            'labels': metadata.get('labels') or {},
+            'node': spec.get('nodeName'),
+            'phase': status.get('phase'),
+            'status': get_pod_status(pod),
+            'ready': '{}/{}'.format(ready_count, total_count)}
+
+
+class PodWatcher:
+    """
+    Maintain pod states of all namespaces from 'kubectl get pods --watch'
+    streamed over a dedicated ssh session, and wake up waiters on pod change.
+
+    e.g.,
+        watcher = PodWatcher.get_watcher()
+        if watcher:
+            res, pods = watcher.wait_for(check_func, timeout=300)
+    """
+    __watchers = {}
+    __retry_times = {}
+    __lock = threading.Lock()
+    # min seconds between attempts to start a watcher on the same host
+    RETRY_INTERVAL = 300
+
+    def __init__(self, con_ssh, sync_idle=1, sync_timeout=60):
+        """
+
+        Args:
+            con_ssh (SSHClient): ssh client of active controller. A new
+                session to the same host is opened for the watch.
+            sync_idle (int|float): initial pod list is considered received
+                when watch output is idle for this many seconds
+            sync_timeout (int): max seconds to wait for initial pod list
+        """
+        self.host = con_ssh.host
+        self.sync_idle = sync_idle
+        self.sync_timeout = sync_timeout
+        # {(<namespace>, <name>): <pod_info>, ...}. See get_pod_info()
+        self.pods = {}
+        self.synced = False
+        self.alive = False
+        self.error = None
+        self._seen = set()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._ssh = SSHClient(con_ssh.host, user=con_ssh.user,
+                              password=con_ssh.password,
+                              initial_prompt=con_ssh.initial_prompt,
+                              multiplex=ProjVar.get_var('SSH_MUX'))
+        self._thread = None
+
+    @classmethod
+    def get_watcher(cls, con_ssh=None):
+        """
+        Get started pod watcher for the system of given ssh client. A
+        watcher that stopped, e.g., ssh session lost, is replaced by a new
+        one.
+
+        Args:
+            con_ssh (SSHClient|None):
+
+        Returns (PodWatcher|None): None if watch is disabled or unavailable
+
+        """
+        if not ProjVar.get_var('KUBE_WATCH'):
+            return None
+        if not con_ssh:
+            con_ssh = ControllerClient.get_active_controller()
+
+        host = con_ssh.host
+        with cls.__lock:
+            watcher = cls.__watchers.get(host)
+            if watcher and watcher.alive:
+                return watcher
+            if watcher:
+                LOG.warning("Pod watcher on {} died: {}. Restart it.".format(
+                    host, watcher.error))
+                watcher.stop()
+                cls.__watchers.pop(host)
+            elif host in cls.__watchers and \
+                    time.time() < cls.__retry_times.get(host, 0):
+                # Do not retry on each wait if watch is unavailable
+                return None
+
+            watcher = cls(con_ssh)
+            try:
+                watcher.start()
+            except Exception as e:
+                LOG.warning("kubectl watch is unavailable, fall back to "
+                            "polling. {}".format(e.__str__()))
+                watcher.stop()
+                watcher = None
+                cls.__retry_times[host] = time.time() + cls.RETRY_INTERVAL
+            cls.__watchers[host] = watcher
+            return watcher
+
+    @classmethod
+    def stop_all(cls):
+        with cls.__lock:
+            for watcher in cls.__watchers.values():
+                if watcher:
+                    watcher.stop()
+            cls.__watchers.clear()
+            cls.__retry_times.clear()
+
+    def start(self):
+        """
+        Start watching pods, and wait for initial pod list
+
+        """
+        LOG.info("Start watching pods on {}".format(self.host))
+        self._ssh.connect(use_current=False)
+        # do not copy the pod stream to ssh log
+        self._ssh.session.logfile = None
+        self._ssh.send(WATCH_PODS_CMD)
+        self.alive = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='kube_pod_watcher', daemon=True)
+        self._thread.start()
+
+        with self._cond:
+            self._cond.wait_for(lambda: self.synced or not self.alive,
+                                timeout=self.sync_timeout)
+        if not self.synced:
+            raise exceptions.KubeError(
+                "Initial pod list not received within {}s. {}".format(
+                    self.sync_timeout, self.error or ''))
+        LOG.info("Watching {} pods on {}".format(len(self.pods), self.host))
+
+    def stop(self):
+        self._stop.set()
+        self.alive = False
+        try:
+            self._ssh.send_control('c')
+            self._ssh.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._cond.notify_all()
+
+    def _run(self):
+        decoder = json.JSONDecoder()
+        buffer = ''
+        text = ''
+        last_data = time.time()
+        try:
+            while not self._stop.is_set():
+                try:
+                    buffer += self._ssh.session.read_nonblocking(
+                        size=65536, timeout=self.sync_idle)
+                    last_data = time.time()
+                except pexpect.TIMEOUT:
+                    pass
+
+                while True:
+                    start = buffer.find('{')
+                    if start < 0:
+                        text += buffer
+                        buffer = ''
+                        break
+                    text += buffer[:start]
+                    try:
+                        obj, end = decoder.raw_decode(buffer, start)
+                    except ValueError:
+                        buffer = buffer[start:]
+                        break
+                    buffer = buffer[end:]
+                    self._update(obj)
+
+                if re.search(self._ssh.prompt, text):
+                    # kubectl exited, e.g., watch closed by api server.
+                    if not self._seen and 'rror' in text:
+                        raise exceptions.KubeCmdError(text.strip()[-500:])
+                    LOG.debug("kubectl watch ended on {}, restart "
+                              "watch".format(self.host))
+                    with self._cond:
+                        self.synced = False
+                        self._seen = set()
+                    self._ssh.send(WATCH_PODS_CMD)
+                    last_data = time.time()
+                    text = ''
+                text = text[-1000:]
+
+                # wait longer if no pod is received yet, in case kubectl is
+                # slow to respond
+                sync_idle = self.sync_idle if self._seen else \
+                    max(self.sync_idle, 5)
+                if not self.synced and time.time() - last_data >= sync_idle:
+                    self._set_synced()
+        except Exception as e:
+            if not self._stop.is_set():
+                self.error = e.__str__()
+                LOG.warning("Pod watcher on {} stopped: {}".format(
+                    self.host, self.error))
+        finally:
+            self.alive = False
+            with self._cond:
+                self._cond.notify_all()
+
+    def _update(self, obj):
+        event_type = obj.get('type')
+        pod = obj.get('object')
+        if obj.get('kind') == 'Pod':
+            # watch event types are not supported by kubectl
+            event_type, pod = 'MODIFIED', obj
+        if not pod or pod.get('kind') != 'Pod':
+            return
+
+        pod_info = get_pod_info(pod)
+        key = (pod_info['namespace'], pod_info['name'])
+        with self._cond:
+            if event_type == 'DELETED':
+                self.pods.pop(key, None)
+            else:
+                self.pods[key] = pod_info
+                self._seen.add(key)
+            self._cond.notify_all()
+
+    def _set_synced(self):
+        with self._cond:
+            # remove pods deleted while watch was restarting
+            for key in list(self.pods):
+                if key not in self._seen:
+                    self.pods.pop(key)
+            self.synced = True
+            self._cond.notify_all()
+
+    def get_pods(self):
+        with self._cond:
+            return dict(self.pods)
+
+    def wait_for(self, check_func, timeout=300):
+        """
+        Wait for pods to meet given criteria. check_func is evaluated on
+        each pod change.
+
+        Args:
+            check_func (runnable): takes pods dict ({(<namespace>, <name>):
+                <pod_info>}) and returns tuple of (<met(bool)>, <info>)
+            timeout (int|float):
+
+        Returns (tuple|None): (<met>, <info from last check>). None if watcher
+            stopped before criteria met, so caller could fall back to polling.
+
+        """
+        end_time = time.time() + timeout
+        info = None
+        with self._cond:
+            while True:
+                if not self.alive:
+                    return None
+                if self.synced:
+                    met, info = check_func(self.pods)
+                    if met:
+                        return True, info
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return False, info
+                self._cond.wait(remaining)
+
+
+def parse_labels(labels):
+    """
+    Parse equality based label selectors
+
+    Args:
+        labels (str|dict|list|tuple|None): e.g., 'application=nova,
+            component=compute'
+
+    Returns (dict|None): None if labels contain selectors other than '='
+
+    """
+    if not labels:
+        return {}
+    if isinstance(labels, dict):
+        return {key: str(val) for key, val in labels.items()}
+    if isinstance(labels, str):
+        labels = labels.split(',')
+
+    labels_dict = {}
+    for label in labels:
+        label = label.strip()
+        if not re.fullmatch(r'[\w./-]+==?[\w./-]*', label):
+            return None
+        key, val = label.replace('==', '=').split('=', 1)
+        labels_dict[key] = val
+    return labels_dict
+
+
+def match_pod(pod_info, namespace=None, pod_names=None, partial_names=None,
+              labels=None):
+    """
+    Whether pod matches given criteria
+
+    Args:
+        pod_info (dict): see get_pod_info()
+        namespace (str|None): any namespace if None
+        pod_names (list|None): full pod names
+        partial_names (list|None):
+        labels (dict|None): parsed labels. See parse_labels()
+
+    Returns (bool):
+
+    """
+    if namespace and pod_info['namespace'] != namespace:
+        return False
+    if pod_names and pod_info['name'] not in pod_names:
+        return False
+    if partial_names and not any(partial_name in pod_info['name'] for
+                                 partial_name in partial_names):
+        return False
+    if labels and any(pod_info['labels'].get(key) != val for key, val in
+                      labels.items()):
+        return False
+    return True
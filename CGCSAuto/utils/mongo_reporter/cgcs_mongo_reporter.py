@@ -33,16 +33,24 @@ WASSP_PATH = os.path.join(LOCAL_PATH, "..", "..", "..", "..", "..")
 
 def collect_and_upload_results(test_name=None, result=None, log_dir=None,
                                build=None, build_server=None,
-                               build_job=None):
+                               build_job=None, lab=None, tag=None,
+                               system_type=None):
     """
     collect the test environment variables
+
+    lab, tag and system_type default to LAB, REPORT_TAG and SYS_TYPE of
+    current session. Pass them explicitly when uploading results of another
+    session, e.g., replayed from upload queue journal. Empty tag or
+    system_type means not set in that session.
     """
 
     # get defaults from config file
     options = parse_config_file()
 
     # get the environment variables
-    lab = options['lab'] if options.get('lab') else ProjVar.get_var('LAB')
+    if not lab:
+        lab = ProjVar.get_var('LAB')
+    lab = options['lab'] if options.get('lab') else lab
     lab_name = lab['short_name'].upper().replace('-', '_')
     build = options['build'] if options.get('build') else build
     build_server = options.get('build_server') if \
@@ -51,13 +59,14 @@ def collect_and_upload_results(test_name=None, result=None, log_dir=None,
         options.get('build_job') if options.get('build_job') else build_job
     userstory = options.get('userstory') if options.get('userstory') else ''
 
-    if ProjVar.get_var('REPORT_TAG'):
+    if tag is None:
         tag = ProjVar.get_var('REPORT_TAG')
-    else:
+    if not tag:
         tag = options['tag'] if options.get('tag') else \
             'regression_%s_%s' % (build, lab_name)
 
-    system_type = ProjVar.get_var('SYS_TYPE')
+    if system_type is None:
+        system_type = ProjVar.get_var('SYS_TYPE')
     if system_type:
         if '+' in system_type:
             count = system_type.count('+')
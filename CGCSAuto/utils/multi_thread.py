@@ -1,10 +1,11 @@
 import threading
 import time
 import traceback
+from concurrent import futures
 
 from consts.proj_vars import ProjVar
 from utils.clients.ssh import SSHClient, ControllerClient, NATBoxClient
-from utils.clients.local import RemoteCLIClient
+from utils.clients.local import RemoteCLIClient, LocalHostClient
 from utils.exceptions import ThreadingError
 from utils.tis_log import LOG
 
@@ -28,6 +29,21 @@ class MThread(threading.Thread):
     """
     total_threads = 0
     running_threads = []
+    __idx_lock = threading.Lock()
+
+    @classmethod
+    def next_thread_name(cls):
+        """
+        Allocate a unique thread name. Name of any thread that uses its own
+        ssh sessions has to be allocated here, since its index is used to
+        locate the ssh clients of the thread. See ControllerClient.
+
+        Returns (str): e.g., Thread-3
+
+        """
+        with cls.__idx_lock:
+            cls.total_threads += 1
+            return 'Thread-{}'.format(cls.total_threads)
 
     def __init__(self, func, *args, **kwargs):
         """
@@ -37,14 +53,15 @@ class MThread(threading.Thread):
             *args:
             **kwargs:
         """
-        threading.Thread.__init__(self)
-        MThread.total_threads += 1
-        self.thread_id = MThread.total_threads
+        name = MThread.next_thread_name()
+        threading.Thread.__init__(self, name=name)
+        self.thread_id = int(name.split('-')[-1])
         self.func = func
         self.args = args
         self.kwargs = kwargs
         self._output = None
         self._output_returned = threading.Event()
+        self._finished = threading.Event()
         self.timeout = None
         self._err = None
 
@@ -64,13 +81,10 @@ class MThread(threading.Thread):
                 timeout = self.timeout
 
             if timeout:
-                end_time = time.time() + timeout
-                while time.time() < end_time:
-                    if self._err:
-                        raise ThreadingError(str(self._err))
-                    if self._output_returned.is_set():
-                        # LOG.info("{}: {} returned: {}".format(self.name, self.func.__name__, self._output.__str__))
-                        break
+                # set when func returns or raises
+                self._finished.wait(timeout)
+                if self._err:
+                    raise ThreadingError(str(self._err))
 
         return self._output
 
@@ -104,32 +118,7 @@ class MThread(threading.Thread):
         # run the function
         try:
             MThread.running_threads.append(self)
-            LOG.info("Connecting to lab fip in new thread...")
-            lab = ProjVar.get_var('lab')
-
-            from keywords import common
-            con_ssh = common.ssh_to_stx(set_client=True)
-
-            if ProjVar.get_var('IS_DC'):
-                LOG.info("Connecting to subclouds fip in new thread...")
-                ControllerClient.set_active_controller(con_ssh, 'RegionOne')
-                con_ssh_dict = ControllerClient.get_active_controllers_map()
-                for name in con_ssh_dict:
-                    if name in lab:
-                        subcloud_fip = lab[name]['floating ip']
-                        subcloud_ssh = SSHClient(subcloud_fip)
-                        try:
-                            subcloud_ssh.connect(use_current=False)
-                            ControllerClient.set_active_controller(subcloud_ssh, name=name)
-                        except:
-                            if name == ProjVar.get_var('PRIMARY_SUBCLOUD'):
-                                raise
-                            LOG.warning('Cannot connect to {}'.format(name))
-
-            LOG.info("Connecting to NatBox in new thread...")
-            NATBoxClient.set_natbox_client()
-            if ProjVar.get_var('REMOTE_CLI'):
-                RemoteCLIClient.get_remote_cli_client()
+            _setup_thread_clients()
 
             LOG.info("Execute function {}({}, {})".format(self.func.__name__, self.args, self.kwargs))
             self._output = self.func(*self.args, **self.kwargs)
@@ -142,21 +131,10 @@ class MThread(threading.Thread):
             raise
         finally:
             LOG.info("Terminating thread: {}".format(self.thread_id))
-            if ProjVar.get_var('IS_DC'):
-                ssh_clients = ControllerClient.get_active_controllers(current_thread_only=True)
-                for con_ssh in ssh_clients:
-                    con_ssh.close()
-            else:
-                ControllerClient.get_active_controller().close()
-
-            natbox_ssh = NATBoxClient.get_natbox_client()
-            if natbox_ssh:
-                natbox_ssh.close()
-
-            if ProjVar.get_var('REMOTE_CLI'):
-                RemoteCLIClient.get_remote_cli_client().close()
+            _close_thread_clients()
             LOG.debug("{} has finished".format(self.name))
             MThread.running_threads.remove(self)
+            self._finished.set()
 
     def wait_for_thread_end(self, timeout=3600, fail_ok=False):
         """
@@ -200,14 +178,317 @@ class MThread(threading.Thread):
         return True, self._err
 
 
+def _setup_thread_clients(natbox=True):
+    """
+    Set up active controller, NatBox and remote cli clients for current thread
+
+    Args:
+        natbox (bool): whether to log in to NatBox
+    """
+    LOG.info("Connecting to lab fip in new thread...")
+    lab = ProjVar.get_var('lab')
+
+    con_ssh = None
+    if ProjVar.get_var('SSH_MUX'):
+        # Lightweight session over the main thread ssh transport
+        con_ssh = ControllerClient.get_active_controller(fail_ok=True)
+    if con_ssh is None:
+        from keywords import common
+        con_ssh = common.ssh_to_stx(set_client=True)
+
+    if ProjVar.get_var('IS_DC'):
+        LOG.info("Connecting to subclouds fip in new thread...")
+        ControllerClient.set_active_controller(con_ssh, 'RegionOne')
+        con_ssh_dict = ControllerClient.get_active_controllers_map()
+        for name in con_ssh_dict:
+            if name in lab:
+                subcloud_fip = lab[name]['floating ip']
+                subcloud_ssh = SSHClient(
+                    subcloud_fip, multiplex=ProjVar.get_var('SSH_MUX'))
+                try:
+                    subcloud_ssh.connect(use_current=False)
+                    ControllerClient.set_active_controller(subcloud_ssh, name=name)
+                except:
+                    if name == ProjVar.get_var('PRIMARY_SUBCLOUD'):
+                        raise
+                    LOG.warning('Cannot connect to {}'.format(name))
+
+    if natbox:
+        LOG.info("Connecting to NatBox in new thread...")
+        NATBoxClient.set_natbox_client()
+    if ProjVar.get_var('REMOTE_CLI'):
+        RemoteCLIClient.get_remote_cli_client()
+
+
+def _get_thread_clients(natbox=True):
+    """
+    Get all clients set for current thread
+
+    Args:
+        natbox (bool): whether NatBox client was set up for current thread
+
+    Returns (list): ssh/local clients
+
+    """
+    clients = ControllerClient.get_active_controllers(current_thread_only=True)
+    if natbox:
+        natbox_ssh = NATBoxClient.get_natbox_client()
+        if natbox_ssh:
+            clients.append(natbox_ssh)
+    if ProjVar.get_var('REMOTE_CLI'):
+        remote_client = RemoteCLIClient.get_remote_cli_client(create_new=False)
+        if remote_client:
+            clients.append(remote_client)
+    return clients
+
+
+def _close_thread_clients():
+    if ProjVar.get_var('IS_DC'):
+        ssh_clients = ControllerClient.get_active_controllers(current_thread_only=True)
+        for con_ssh in ssh_clients:
+            con_ssh.close()
+    else:
+        ControllerClient.get_active_controller().close()
+
+    natbox_ssh = NATBoxClient.get_natbox_client()
+    if natbox_ssh:
+        natbox_ssh.close()
+
+    if ProjVar.get_var('REMOTE_CLI'):
+        RemoteCLIClient.get_remote_cli_client().close()
+
+
+class MThreadPool:
+    """
+    Thread pool with bounded number of worker threads. Each worker sets up its
+    own controller/NatBox sessions once and reuses them for all the tasks it
+    runs, and the sessions are closed when the pool is shut down.
+
+    e.g.,
+        with MThreadPool(max_workers=4) as pool:
+            futures_ = [pool.submit(vm_helper.live_migrate_vm, vm) for vm in vms]
+            for future in pool.as_completed(futures_):
+                code, msg = future.result()
+
+        or
+            pool = MThreadPool(max_workers=4)
+            for host in hosts:
+                pool.submit(host_helper.lock_host, host)
+            pool.wait_for_all(timeout=1200)
+            pool.shutdown()
+    """
+    active_pools = []
+
+    def __init__(self, max_workers=5, timeout=3600, natbox=True):
+        """
+
+        Args:
+            max_workers (int): max number of worker threads, i.e., max number
+                of tasks running at the same time and max number of ssh
+                sessions opened per lab
+            timeout (int): default timeout for wait_for_all/as_completed
+            natbox (bool): whether each worker logs in to NatBox. Set to
+                False if tasks only need controller sessions.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.natbox = natbox
+        self.futures = []
+        self._worker_clients = []
+        self._clients_lock = threading.Lock()
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=max_workers, initializer=self.__init_worker)
+        MThreadPool.active_pools.append(self)
+
+    def __init_worker(self):
+        # Thread name has to end with a unique index, which is used to locate
+        # the ssh clients of current thread.
+        threading.current_thread().name = MThread.next_thread_name()
+        LOG.info("Starting pool worker {}".format(threading.current_thread().name))
+        try:
+            _setup_thread_clients(natbox=self.natbox)
+        except Exception as e:
+            # Raising here would break the whole pool. Tasks needing the
+            # missing sessions fail individually instead.
+            LOG.warning("Failed to set up ssh sessions for {}: {}".format(
+                threading.current_thread().name, e))
+        finally:
+            clients = _get_thread_clients(natbox=self.natbox)
+            with self._clients_lock:
+                self._worker_clients += clients
+
+    def __reconnect_worker_clients(self):
+        """
+        Reconnect ssh sessions of current worker that were lost, e.g., after
+        swact or controller reboot. Only main thread session is reconnected
+        by such keywords, while workers of long-lived pools outlive them.
+        """
+        try:
+            clients = _get_thread_clients(natbox=self.natbox)
+        except Exception as e:
+            LOG.warning("Failed to get ssh sessions of {}: {}".format(
+                threading.current_thread().name, e))
+            return
+
+        for client in clients:
+            if isinstance(client, LocalHostClient):
+                continue
+            try:
+                if not client.is_connected():
+                    LOG.info("Reconnect to {} in {}".format(
+                        client.host, threading.current_thread().name))
+                    client.connect(retry=True, retry_timeout=60,
+                                   use_current=False)
+            except Exception as e:
+                # Let the task fail on its own if session is still down
+                LOG.warning("Failed to reconnect to {}: {}".format(
+                    client.host, e))
+
+    def __run_task(self, func, args, kwargs):
+        self.__reconnect_worker_clients()
+        LOG.info("Execute function {}({}, {})".format(func.__name__, args, kwargs))
+        output = func(*args, **kwargs)
+        LOG.info("{} returned: {}".format(func.__name__, output))
+        return output
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedule func(*args, **kwargs) to run in a worker thread
+
+        Args:
+            func (runnable):
+            *args:
+            **kwargs:
+
+        Returns (concurrent.futures.Future):
+
+        """
+        future = self._executor.submit(self.__run_task, func, args, kwargs)
+        self.futures.append(future)
+        return future
+
+    def map(self, func, *iterables, timeout=None):
+        """
+        Run func for each item in iterables. Similar to builtin map.
+
+        Returns (list): return values in the order of given iterables
+
+        """
+        futures_ = [self.submit(func, *args) for args in zip(*iterables)]
+        return [future.result(timeout=timeout or self.timeout) for future in futures_]
+
+    def as_completed(self, futures_=None, timeout=None):
+        """
+        Iterate over futures as they complete
+
+        Args:
+            futures_ (list|None): futures to wait for. Default to all submitted.
+            timeout (int|None):
+
+        Returns (iterator):
+
+        """
+        if futures_ is None:
+            futures_ = self.futures
+        return futures.as_completed(futures_, timeout=timeout or self.timeout)
+
+    def forget(self, futures_):
+        """
+        Stop tracking given futures, e.g., after their results are collected
+        from a long-lived pool, so they are not kept for wait_for_all
+
+        Args:
+            futures_ (list):
+
+        """
+        self.futures = [future for future in self.futures if
+                        future not in futures_]
+
+    def cancel_pending(self):
+        """
+        Cancel tasks that have not started yet
+
+        Returns (int): number of tasks cancelled
+
+        """
+        cancelled = [future for future in self.futures if future.cancel()]
+        if cancelled:
+            LOG.info("{} pending task(s) cancelled".format(len(cancelled)))
+        return len(cancelled)
+
+    def is_active(self):
+        return any(not future.done() for future in self.futures)
+
+    def wait_for_all(self, timeout=None, fail_ok=False):
+        """
+        Wait for all submitted tasks to finish
+
+        Args:
+            timeout (int|None): default to self.timeout
+            fail_ok (bool): whether to raise exception if any task failed or
+                did not finish within timeout
+
+        Returns (tuple): (<all finished without error(bool)>, <errors(list)>)
+
+        """
+        if not timeout:
+            timeout = self.timeout
+        LOG.info("Wait for {} task(s) to finish".format(len(self.futures)))
+        done, not_done = futures.wait(self.futures, timeout=timeout)
+
+        errors = []
+        for future in done:
+            if not future.cancelled() and future.exception():
+                exc = future.exception()
+                errors.append(''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+
+        if not_done:
+            msg = "{} task(s) did not finish within {} seconds".format(len(not_done), timeout)
+        elif errors:
+            msg = "{} task(s) failed: {}".format(len(errors), '\n'.join(errors))
+        else:
+            return True, errors
+
+        if fail_ok:
+            LOG.error(msg)
+            return False, errors
+        raise ThreadingError(msg)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """
+        Shut down the pool and close the sessions opened by workers
+
+        Args:
+            wait (bool): whether to wait for running tasks to finish
+            cancel_pending (bool): whether to cancel tasks not yet started
+
+        """
+        if cancel_pending:
+            self.cancel_pending()
+        self._executor.shutdown(wait=wait)
+        if wait:
+            with self._clients_lock:
+                for client in self._worker_clients:
+                    client.close()
+                self._worker_clients = []
+        if self in MThreadPool.active_pools:
+            MThreadPool.active_pools.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True, cancel_pending=exc_type is not None)
+
+
 def get_multi_threads():
     return MThread.running_threads
 
 
 def is_multi_thread_active():
-    if len(get_multi_threads()) == 0:
-        return False
-    return True
+    if get_multi_threads():
+        return True
+    return any(pool.is_active() for pool in MThreadPool.active_pools)
 
 
 class Events(threading.Event):
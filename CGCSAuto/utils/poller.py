@@ -0,0 +1,218 @@
+import copy
+import random
+import threading
+import time
+
+from utils import exceptions
+from utils.tis_log import LOG
+
+
+class Condition:
+    """
+    A condition to wait for on a given resource type.
+    e.g., vm_1 status is ACTIVE in openstack server list:
+        cond = Condition('server', check_func=lambda table_: ..., name='vm_1 ACTIVE')
+
+    After Poller.wait_for_conditions() returns, following attributes are set:
+        met (bool): whether the condition is met
+        actual: the last value returned by check_func
+        elapsed (float|None): seconds taken for the condition to be met
+    """
+    def __init__(self, resource_type, check_func, name=None, **query_kwargs):
+        """
+
+        Args:
+            resource_type (str): resource type registered in Poller. such as
+                'server', 'host', 'alarm'
+            check_func (runnable): function that takes the resource table and
+                returns a tuple of (<met(bool)>, <actual value>)
+            name (str|None): description of the condition for logging
+            **query_kwargs: kwargs passed to the fetch function of given
+                resource type. such as con_ssh, auth_info
+        """
+        self.resource_type = resource_type
+        self.check_func = check_func
+        self.name = name if name else resource_type
+        self.query_kwargs = query_kwargs
+        self.met = False
+        self.actual = None
+        self.elapsed = None
+
+    def check(self, table_):
+        met, self.actual = self.check_func(copy.deepcopy(table_))
+        self.met = bool(met)
+        return self.met
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "<Condition {} met={} actual={} elapsed={}>".format(
+            self.name, self.met, self.actual, self.elapsed)
+
+
+class Poller:
+    """
+    Central poller for wait_for_* keywords.
+
+    Conditions on the same resource type are checked against a single list
+    query per tick, and the query result is shared with other threads waiting
+    on the same resource type within the same tick.
+
+    Fetch functions are registered by keyword modules, e.g.,
+        Poller.register('server', _get_servers_table)
+    """
+    __fetch_funcs = {}
+    __cache = {}    # (resource_type, query_key): (timestamp, table_)
+    __locks = {}
+    __lock = threading.Lock()
+    # Cached tables older than this are removed, since pollers of a query
+    # may never come back, e.g., vms deleted or different auth_info
+    CACHE_TTL = 300
+
+    @classmethod
+    def register(cls, resource_type, fetch_func):
+        """
+        Register a fetch function for given resource type.
+
+        Args:
+            resource_type (str):
+            fetch_func (runnable): returns table of all resources of given
+                type in table_parser.table() format.
+
+        """
+        cls.__fetch_funcs[resource_type] = fetch_func
+
+    @staticmethod
+    def get_query_key(resource_type, query_kwargs):
+        """
+        Get cache key for a query. auth_info dicts are keyed on user, tenant
+        and region names only, so that passwords are not kept in the key.
+
+        Returns (tuple):
+
+        """
+        items = []
+        for name, val in sorted(query_kwargs.items()):
+            if isinstance(val, dict):
+                val = tuple(val.get(k) for k in ('user', 'tenant', 'region'))
+            items.append((name, val))
+        return resource_type, repr(items)
+
+    @classmethod
+    def __prune(cls):
+        """
+        Remove expired cache entries and their idle locks. Caller should hold
+        cls.__lock.
+        """
+        now = time.time()
+        for key, (timestamp, table_) in list(cls.__cache.items()):
+            if now - timestamp > cls.CACHE_TTL:
+                cls.__cache.pop(key, None)
+        for key, lock in list(cls.__locks.items()):
+            if key not in cls.__cache and not lock.locked():
+                cls.__locks.pop(key, None)
+
+    @classmethod
+    def fetch(cls, resource_type, max_age=0, **query_kwargs):
+        """
+        Get table of given resource type. The table is queried again only if
+        the cached one is older than max_age.
+
+        Args:
+            resource_type (str):
+            max_age (int|float): seconds
+            **query_kwargs:
+
+        Returns (dict): table of all resources of given type
+
+        """
+        if resource_type not in cls.__fetch_funcs:
+            raise ValueError("Unknown resource type {}. Registered: {}".format(
+                resource_type, list(cls.__fetch_funcs.keys())))
+
+        key = cls.get_query_key(resource_type, query_kwargs)
+        with cls.__lock:
+            cls.__prune()
+            key_lock = cls.__locks.setdefault(key, threading.Lock())
+
+        # Only one thread queries a resource type at a time. Others waiting
+        # on the lock will get the fresh result from cache.
+        with key_lock:
+            cached = cls.__cache.get(key)
+            if cached and time.time() - cached[0] <= max_age:
+                return cached[1]
+
+            table_ = cls.__fetch_funcs[resource_type](**query_kwargs)
+            cls.__cache[key] = (time.time(), table_)
+            return table_
+
+    @classmethod
+    def wait_for_conditions(cls, conditions, timeout=300, check_interval=3,
+                            max_interval=30, backoff=1.0, jitter=0.1,
+                            fail_ok=True):
+        """
+        Wait for all given conditions to be met.
+
+        Args:
+            conditions (list|tuple|Condition):
+            timeout (int): max seconds to wait for all conditions
+            check_interval (int|float): initial seconds between checks
+            max_interval (int|float): max seconds between checks when backoff
+                is used
+            backoff (float): multiplier applied to the interval after each
+                tick. 1 means fixed interval
+            jitter (float): random fraction of the interval added to/removed
+                from each sleep to avoid threads polling in lockstep
+            fail_ok (bool): whether to raise exception if any condition is not
+                met within timeout
+
+        Returns (tuple): (<all met(bool)>, <conditions(list)>)
+            Each condition has met, actual and elapsed set.
+
+        """
+        if isinstance(conditions, Condition):
+            conditions = [conditions]
+
+        LOG.info("Waiting for conditions: {}".format(
+            ', '.join(str(cond) for cond in conditions)))
+        start_time = time.time()
+        end_time = start_time + timeout
+        interval = check_interval
+        pending = list(conditions)
+        while pending:
+            # group by resource type and query kwargs, one query per group
+            groups = {}
+            for cond in pending:
+                key = cls.get_query_key(cond.resource_type,
+                                        cond.query_kwargs)
+                groups.setdefault(key, []).append(cond)
+
+            for group in groups.values():
+                table_ = cls.fetch(group[0].resource_type,
+                                   max_age=interval / 2,
+                                   **group[0].query_kwargs)
+                for cond in group:
+                    if cond.check(table_):
+                        cond.elapsed = time.time() - start_time
+                        pending.remove(cond)
+                        LOG.info("{} met after {:.1f}s".format(cond,
+                                                               cond.elapsed))
+
+            if not pending or time.time() >= end_time:
+                break
+
+            sleep_time = interval * (1 + random.uniform(-jitter, jitter))
+            time.sleep(max(0, min(sleep_time, end_time - time.time())))
+            interval = min(interval * backoff, max_interval)
+
+        if not pending:
+            return True, list(conditions)
+
+        msg = "Conditions not met within {}s: {}".format(
+            timeout, ', '.join('{} (actual: {})'.format(cond, cond.actual)
+                               for cond in pending))
+        if fail_ok:
+            LOG.warning(msg)
+            return False, list(conditions)
+        raise exceptions.TimeoutException(msg)
@@ -1,13 +1,24 @@
 import requests
 import json
 import os
+import threading
 
 from consts.proj_vars import ProjVar
 from consts.auth import CliAuth, Tenant
 from keywords import keystone_helper, security_helper
 
+from utils import exceptions
 from utils.tis_log import LOG
-from utils.kpi.kpi import KPI
+from utils.kpi.kpi import KPI, get_rest_kpi_name
+
+# Shared by all Rest clients, so that tcp/tls connections to the same
+# endpoint are reused across calls
+_SESSION = requests.Session()
+_SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+
+_rest_clients = {}
+_rest_clients_lock = threading.Lock()
 
 
 class Rest:
@@ -33,7 +44,9 @@ class Rest:
 
         """
         auth_info = Tenant.get('admin_platform') if platform else Tenant.get('admin')
+        self.auth_info = auth_info
         self.token = ""
+        self.project_id = None
         self.token_payload = ""
         self.region = ProjVar.get_var('REGION')
         self.baseURL = keystone_helper.get_endpoints(field='URL',
@@ -74,6 +87,8 @@ class Rest:
                        '"admin","domain": {"name":"Default"}'
                        '}}}}')
         self.token_payload = json.loads(json_string)
+        # Use current admin password in case it was changed in the session
+        self.token_payload['auth']['identity']['password']['user']['password'] = self.auth_info['password']
 
     def retrieve_token(self, endpoint, token_request=None, verify=None):
         if token_request is None:
@@ -86,7 +101,7 @@ class Rest:
 
         LOG.info("Retrieving token. post URL: {}, headers: {}, data: {}".format(self.ksURL + endpoint, headers,
                                                                                 token_request))
-        r = requests.post(self.ksURL+endpoint,
+        r = _SESSION.post(self.ksURL+endpoint,
                           headers=headers,
                           data=token_request, verify=verify)
         req = r.request
@@ -98,6 +113,11 @@ class Rest:
             self.token = "THISTOKENDOESNOTEXIST"
         else:
             self.token = r.headers['X-Subject-Token']
+            self.project_id = r.json().get('token', {}).get('project', {}).get('id')
+            if self.project_id:
+                # e.g., nova endpoint http://<ip>:8774/v2.1/%(tenant_id)s
+                for tenant_var in ('%(tenant_id)s', '%(project_id)s'):
+                    self.baseURL = self.baseURL.replace(tenant_var, self.project_id)
         LOG.info('token retrieval status: {} text: {}'.format(r.status_code, r.text))
         return r.status_code, r.text
 
@@ -128,8 +148,8 @@ class Rest:
         LOG.info(message.format(self.baseURL, resource, headers))
         if verify is None:
             verify = self.verify
-        kpi = KPI()
-        r = requests.get(self.baseURL + resource,
+        kpi = KPI(get_rest_kpi_name('GET', resource))
+        r = _SESSION.get(self.baseURL + resource,
                          headers=headers, verify=verify)
         delta = kpi.stop()
         return r.status_code, r.json()
@@ -140,8 +160,8 @@ class Rest:
         LOG.debug(message.format(self.baseURL, resource, headers))
         if verify is None:
             verify = self.verify
-        kpi = KPI()
-        r = requests.delete(self.baseURL + resource,
+        kpi = KPI(get_rest_kpi_name('DELETE', resource))
+        r = _SESSION.delete(self.baseURL + resource,
                             headers=headers, verify=verify)
         delta = kpi.stop()
         return r.status_code, r.json()
@@ -153,8 +173,8 @@ class Rest:
                                 headers, json_data))
         if verify is None:
             verify = self.verify
-        kpi = KPI()
-        r = requests.patch(self.baseURL + resource,
+        kpi = KPI(get_rest_kpi_name('PATCH', resource))
+        r = _SESSION.patch(self.baseURL + resource,
                            headers=headers, data=json_data,
                            verify=verify)
         delta = kpi.stop()
@@ -167,8 +187,8 @@ class Rest:
                                 headers, json_data))
         if verify is None:
             verify = self.verify
-        kpi = KPI()
-        r = requests.put(self.baseURL + resource, 
+        kpi = KPI(get_rest_kpi_name('PUT', resource))
+        r = _SESSION.put(self.baseURL + resource, 
                          headers=headers, data=json_data,
                          verify=verify)
         kpi.stop()
@@ -179,11 +199,138 @@ class Rest:
         message = "baseURL: {} resource: {} headers: {} data: {}"
         LOG.debug(message.format(self.baseURL, resource,
                                 headers, json_data))
-        kpi = KPI()
+        kpi = KPI(get_rest_kpi_name('POST', resource))
         if verify is None:
             verify = self.verify
-        r = requests.post(self.baseURL + resource,
+        r = _SESSION.post(self.baseURL + resource,
                           headers=headers, data=json_data,
                           verify=verify)
         kpi.stop()
         return r.status_code, r.json()
+
+
+def use_rest_backend(auth_info=None, use_telnet=False):
+    """
+    Whether to serve query keywords via REST api instead of cli.
+    Only applies to admin user on current region, since Rest clients are
+    authenticated as admin.
+
+    Args:
+        auth_info (dict|None):
+        use_telnet (bool):
+
+    Returns (bool):
+
+    """
+    if not ProjVar.get_var('REST_BACKEND') or use_telnet or ProjVar.get_var('REMOTE_CLI'):
+        return False
+
+    if auth_info is None:
+        auth_info = Tenant.get_primary()
+
+    return auth_info.get('user') == 'admin' and not (ProjVar.get_var('IS_DC') and auth_info.get('region'))
+
+
+def get_rest_client(service_name, platform=False):
+    """
+    Get a cached Rest client for given service. Client is created and
+    authenticated upon first request.
+
+    Args:
+        service_name (str): such as 'sysinv', 'fm', 'nova', 'neutron'
+        platform (bool): whether it is a platform service
+
+    Returns (Rest):
+
+    """
+    key = (service_name, platform, ProjVar.get_var('REGION'))
+    with _rest_clients_lock:
+        if key not in _rest_clients:
+            _rest_clients[key] = Rest(service_name, platform=platform)
+        return _rest_clients[key]
+
+
+def get_json(service_name, resource, platform=False, params=None, fail_ok=False):
+    """
+    GET given resource and return the json body. Token is refreshed once if
+    it is expired.
+
+    Args:
+        service_name (str): such as 'sysinv', 'fm', 'nova', 'neutron'
+        resource (str): such as '/ihosts'
+        platform (bool):
+        params (dict|None): url query parameters
+        fail_ok (bool): whether to return None instead of raising exception
+            upon failure
+
+    Returns (dict|list|None): json response
+
+    """
+    try:
+        # endpoint lookup and token request happen upon first request
+        rest_client = get_rest_client(service_name, platform=platform)
+        url = rest_client.baseURL + resource
+        for i in range(2):
+            r = _SESSION.get(url, params=params,
+                             headers=rest_client.auth_header_select(),
+                             verify=rest_client.verify)
+            if r.status_code == 401 and i == 0:
+                LOG.info("Token expired. Retrieve a new one for {}".format(service_name))
+                rest_client.generate_token_request()
+                rest_client.retrieve_token('/auth/tokens')
+                continue
+            break
+
+        if r.status_code != 200:
+            raise exceptions.RestAPIError("GET {} failed. Status code: {}. Details: {}".format(url, r.status_code,
+                                                                                              r.text))
+        return r.json()
+
+    except Exception as e:
+        if fail_ok:
+            LOG.warning("GET {} {} failed. {}".format(service_name, resource, e))
+            return None
+        raise
+
+
+def get_table(service_name, resource, items_key, field_map, platform=False, params=None, fail_ok=False):
+    """
+    GET given resource and convert the json list to a table in the same
+    format as table_parser.table(), so that table_parser can be used to
+    filter it as if it was a cli output.
+
+    Args:
+        service_name (str): such as 'sysinv', 'fm', 'nova', 'neutron'
+        resource (str): such as '/ihosts'
+        items_key (str): key of the item list in json response. e.g., 'ihosts'
+        field_map (list|tuple): list of (<table header>, <json key or function that takes the item as arg>)
+            e.g., (('ID', 'id'), ('Subnets', lambda net: ', '.join(net['subnets'])))
+        platform (bool):
+        params (dict|None): url query parameters
+        fail_ok (bool): whether to return None instead of raising exception
+            upon failure
+
+    Returns (dict|None): {'headers': [<header1>, ...], 'values': [[<row1_val1>, ...], ...]}
+
+    """
+    json_body = get_json(service_name, resource=resource, platform=platform, params=params, fail_ok=fail_ok)
+    if json_body is None:
+        return None
+
+    headers = [header for header, key in field_map]
+    values = []
+    try:
+        for item in json_body[items_key]:
+            row = []
+            for header, key in field_map:
+                val = key(item) if callable(key) else item.get(key)
+                row.append(str(val) if val is not None else 'None')
+            values.append(row)
+    except (KeyError, TypeError, AttributeError) as e:
+        msg = "Unexpected json body from GET {} {}. {}: {}".format(service_name, resource, type(e).__name__, e)
+        if fail_ok:
+            LOG.warning(msg)
+            return None
+        raise exceptions.RestAPIError(msg)
+
+    return {'headers': headers, 'values': values}
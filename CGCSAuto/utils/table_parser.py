@@ -11,6 +11,54 @@ delimiter_line = re.compile(r'^\+-[+\-]+-\+$')
 kute_sep = re.compile(r'\s\s[^\s]')
 
 
+class Table(dict):
+    """
+    Table dict returned by table(). i.e., {'headers': [...], 'values': [...]}
+
+    Behaves the same as a regular dict. Additionally it caches hash indexes
+    built by get_values()/filter_table() for strict string lookups, so that
+    repeated lookups such as get_values(table_, 'ID', Name='x') on the same
+    table do not scan all rows again.
+
+    Indexes are dropped when 'headers' or 'values' is reassigned, and are
+    rebuilt if the values list is swapped or its length changed.
+    """
+    def __init__(self, *args, **kwargs):
+        super(Table, self).__init__(*args, **kwargs)
+        self._indexes = {}
+
+    def __setitem__(self, key, value):
+        self._indexes = {}
+        super(Table, self).__setitem__(key, value)
+
+    def get_index(self, col_index):
+        """
+        Get hash index for given column. The index maps the stripped and
+        lower-cased cell value (multi-line cell merged) to row indexes.
+
+        Args:
+            col_index (int):
+
+        Returns (dict): {<cell_value>: [<row_index>, ...]}
+
+        """
+        rows = self['values']
+        signature = (id(rows), len(rows))
+        cached = self._indexes.get(col_index)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        index = {}
+        for i, row in enumerate(rows):
+            value = row[col_index]
+            if isinstance(value, list):
+                value = ''.join(value)
+            index.setdefault(value.strip().lower(), []).append(i)
+
+        self._indexes[col_index] = (signature, index)
+        return index
+
+
 def __details_multiple(output_lines, with_label=False):
     """Return list of dicts with item details from cli output tables.
     If with_label is True, key '__label' is added to each items dict.
@@ -107,8 +155,10 @@ def __table(output_lines, rstrip_value=False):
     Return dict with list of column names in 'headers' key and
     rows in 'values' key.
     """
-    table_ = {'headers': [], 'values': []}
+    table_ = Table(headers=[], values=[])
+    values = table_['values']
     columns = []
+    delimiter = None
 
     if not isinstance(output_lines, list):
         output_lines = output_lines.split('\n')
@@ -117,23 +167,28 @@ def __table(output_lines, rstrip_value=False):
         # skip last line if empty (just newline at the end)
         output_lines = output_lines[:-1]
 
-    delimiter_line_num = 0
     header_rows = []
     for line in output_lines:
-        if delimiter_line.match(line):
+        # column offsets are only recalculated when delimiter line changes
+        if line == delimiter:
+            continue
+        if line.startswith('+-') and delimiter_line.match(line):
+            delimiter = line
             columns = __table_columns(line)
-            delimiter_line_num += 1
             continue
         if '|' not in line:
             LOG.debug('skipping invalid table line: %s' % line)
             continue
-        row = []
-        for col in columns:
-            raw_row = line[col[0]:col[1]]
-            stripped_row = raw_row.rstrip() if rstrip_value else raw_row.strip()
-            row.append(stripped_row)
-        if table_['values']:
-            table_['values'].append(row)
+        cells = line.split('|')
+        if len(cells) != len(columns) + 2:
+            # '|' in cell value or misaligned line. Slice by column offsets.
+            cells = [''] + [line[start:end] for start, end in columns] + ['']
+        if rstrip_value:
+            row = [cell.rstrip() for cell in cells[1:-1]]
+        else:
+            row = [cell.strip() for cell in cells[1:-1]]
+        if values:
+            values.append(row)
         else:
             if not header_rows:
                 header_rows.append(row)
@@ -141,7 +196,7 @@ def __table(output_lines, rstrip_value=False):
             if row[0] == '':
                 header_rows.append(row)
             else:
-                table_['values'].append(row)
+                values.append(row)
 
     headers_ = [list(filter(None, list(t))) for t in zip(*header_rows)]
     table_['headers'] = [''.join(item) for item in headers_]
@@ -177,33 +232,40 @@ def __convert_multilines_values(values, merge_lines=False):
     if line_count == 1:
         return values
 
+    if all(row[0] for row in values):
+        # no multi-line entry
+        return values
+
+    # group lines into entries. A line with empty first value belongs to the
+    # entry of the previous line.
+    grouped = []
+    for row in values:
+        if row[0] or not grouped:
+            grouped.append([row])
+        else:
+            grouped[-1].append(row)
+
     entries = []
-    start_index = 0  # start_index for first entry
-    for i in range(line_count):  # line_count > 1 if code can get here.
-        # if first value for the NEXT row is not empty string, then next row
-        # is the start of a new entry,
-        # and the current row is the last row of current entry
-        if i == line_count - 1 or values[i + 1][0]:
-            end_index = i
-            if start_index == end_index:  # single-line entry
-                entry = values[start_index]
-            else:  # multi-line entry
-                entry_lines = [values[index] for index in
-                               range(start_index, end_index + 1)]
-                # each column value is a list
-                entry_combined = [list(filter(None, list(t))) for t in
-                                  zip(*entry_lines)]
-                if merge_lines:
-                    entry = [' '.join(item) for item in entry_combined]
-                else:
-                    # convert column value to string if list len is 1
-                    entry = [item if len(item) > 1 else ' '.join(item) for item
-                             in entry_combined]
-                LOG.debug("Multi-row entry found for: {}".format(entry[0]))
-
-            entries.append(entry)
-            start_index = i + 1  # start_index for next entry
+    multi_line_count = 0
+    for entry_lines in grouped:
+        if len(entry_lines) == 1:  # single-line entry
+            entries.append(entry_lines[0])
+            continue
+
+        # multi-line entry. each column value is a list
+        multi_line_count += 1
+        entry_combined = [[item for item in t if item] for t in
+                          zip(*entry_lines)]
+        if merge_lines:
+            entry = [' '.join(item) for item in entry_combined]
+        else:
+            # convert column value to string if list len is 1
+            entry = [item if len(item) > 1 else ' '.join(item) for item
+                     in entry_combined]
+        entries.append(entry)
 
+    if multi_line_count:
+        LOG.debug("{} multi-row entries found".format(multi_line_count))
     return entries
 
 
@@ -217,7 +279,15 @@ def table(output_lines, combine_multiline_entry=False, rstrip_value=False):
     return: Dictionary of a table with.multi-line entry taken into
     account.table_['values'] is list of entries. If
     multi-line entry, then this entry itself is a list.
+
+    output_lines can also be the parsed object returned by cli with
+    output_format='json', which is converted via table_from_json().
     """
+    if isinstance(output_lines, dict) or (
+            isinstance(output_lines, list) and
+            (not output_lines or not isinstance(output_lines[0], str))):
+        return table_from_json(output_lines)
+
     table_ = __table(output_lines, rstrip_value=rstrip_value)
     rows = get_all_rows(table_)
     if not rows:
@@ -234,6 +304,53 @@ def table(output_lines, combine_multiline_entry=False, rstrip_value=False):
     return table_
 
 
+def __json_value_to_str(value):
+    """
+    Convert a value in cli json output to the string shown in ascii table.
+    """
+    if isinstance(value, str):
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return str(value)
+    if isinstance(value, list):
+        return ', '.join(__json_value_to_str(item) for item in value)
+    if isinstance(value, dict):
+        if value and all(isinstance(v, list) for v in value.values()):
+            # such as Networks in server list: net1=ip1, ip2; net2=ip3
+            return '; '.join('{}={}'.format(k, __json_value_to_str(v)) for
+                             k, v in value.items())
+        return ', '.join("{}='{}'".format(k, __json_value_to_str(v)) for
+                         k, v in sorted(value.items()))
+    return str(value)
+
+
+def table_from_json(output):
+    """
+    Convert parsed json output of cli (-f json) to table format, so it can be
+    used by get_values(), filter_table(), get_value_two_col_table(), etc.
+
+    Args:
+        output (list|dict): list of dicts from a list command, or a dict from
+            a show command
+
+    Returns (Table): multi-column table for list output, or Field/Value
+        two-column table for show output
+
+    """
+    if isinstance(output, dict):
+        values = [[str(k), __json_value_to_str(v)] for k, v in output.items()]
+        return Table(headers=['Field', 'Value'], values=values)
+
+    if not output:
+        LOG.debug("Empty table returned")
+        return Table(headers=[], values=[])
+
+    headers = list(output[0].keys())
+    values = [[__json_value_to_str(item.get(header)) for header in headers]
+              for item in output]
+    return Table(headers=headers, values=values)
+
+
 def get_all_rows(table_):
     """
     Args:
@@ -533,32 +650,19 @@ def get_values(table_, target_header, strict=True, regex=False,
             kwarg_row_indexes += _get_row_indexes(table_, header, value,
                                                   strict=strict, regex=regex)
 
-        row_indexes.append(list(set(kwarg_row_indexes)))
-
-    len_ = len(row_indexes)
-    target_row_indexes = []
+        row_indexes.append(set(kwarg_row_indexes))
 
-    if len_ == 1:
-        target_row_indexes = row_indexes[0]
-    elif len_ > 1:
-        # Check every item in the first row_index list and see if it's also
-        # in the rest of the row_index lists
-        for item in row_indexes[0]:
-            for i in range(1, len_):
-                if item not in row_indexes[i]:
-                    break
-            else:
-                target_row_indexes.append(item)
+    # rows matching all the criteria
+    target_row_indexes = set.intersection(*row_indexes)
 
-    target_column = get_column(table_, target_header)
-    target_values = []
+    rows = get_all_rows(table_)
     if exclude:
-        total_row_indexes = list(range(len(target_column)))
-        target_row_indexes = list(
-            (set(total_row_indexes) - set(target_row_indexes)))
+        target_row_indexes = set(range(len(rows))) - target_row_indexes
 
-    for i in target_row_indexes:
-        target_value = target_column[i]
+    col_index = __get_column_index(table_, target_header)
+    target_values = []
+    for i in sorted(target_row_indexes):
+        target_value = rows[i][col_index]
 
         # handle extra parsing of the value
         if isinstance(target_value, list) and merge_lines:
@@ -728,6 +832,11 @@ def __filter_table(table_, row_indexes):
 
 def _get_row_indexes(table_, field, value, strict=True, regex=False,
                      exclude=False):
+    if strict and not regex and not exclude and isinstance(table_, Table) \
+            and isinstance(value, (str, int, float)):
+        index = table_.get_index(__get_column_index(table_, field))
+        return list(index.get(str(value).strip().lower(), []))
+
     row_indexes = []
     column = get_column(table_, field)
     if regex:
@@ -775,7 +884,7 @@ def filter_table(table_, strict=True, regex=False, exclude=False, **kwargs):
         A table dictionary with original headers and filtered values(rows)
 
     """
-    table_ = table_.copy()
+    table_ = Table(table_)
     kwargs = {k: v for k, v in kwargs.items() if v is not None}
     if not kwargs:
         LOG.debug("No kwargs specified. Skip filtering")
@@ -813,7 +922,7 @@ def filter_table(table_, strict=True, regex=False, exclude=False, **kwargs):
         total_row_indexes = list(range(len(all_rows)))
         row_indexes = list((set(total_row_indexes) - set(row_indexes)))
 
-    return __filter_table(table_, row_indexes)
+    return __filter_table(table_, sorted(row_indexes))
 
 
 def compare_tables(table_one, table_two):
@@ -1,3 +1,8 @@
+import os
+import time
+
+from pytest import mark
+
 from consts import auth
 from consts.proj_vars import ProjVar
 from utils import cli
@@ -47,6 +52,25 @@ def test_auth_tenant():
     cli.openstack('server list', auth_info=auth.Tenant.get('tenant1'))
     LOG.tc_func_end()
 
+
+# 1000 cli calls against a live lab. Set CLI_BENCHMARK=1 to run it.
+@mark.slow
+@mark.skipif(not os.environ.get('CLI_BENCHMARK'), reason="cli benchmark only runs on request against a live lab")
+def test_token_auth_benchmark():
+    LOG.tc_func_start()
+    vm_id = cli.openstack('server list', '-f value -c ID', auth_info=auth.Tenant.get('admin'))[1].split()[0]
+    durations = {}
+    for token_auth in (False, True):
+        start_time = time.time()
+        for i in range(500):
+            cli.openstack('server show', vm_id, auth_info=auth.Tenant.get('admin'), token_auth=token_auth)
+        durations['token' if token_auth else 'password'] = (time.time() - start_time) / 500
+
+    LOG.info("Average 'openstack server show' latency: {}".format(durations))
+    assert durations['token'] < durations['password'], "Token auth is not faster than password auth"
+    LOG.tc_func_end()
+
+
 if __name__ == '__main__':
     ssh_client = SSHClient('128.224.150.142')
     ControllerClient.set_active_controller(ssh_client)
@@ -0,0 +1,172 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from utils import artifact_cache, exceptions
+from utils.artifact_cache import ArtifactCache
+
+KIB = 1024
+
+
+@pytest.fixture(scope='session')
+def setup_tis_ssh():
+    # Override conftest fixture. Commands run on local host, no lab is needed.
+    pass
+
+
+@pytest.fixture()
+def reconnect_before_test():
+    pass
+
+
+class LocalClient:
+    """
+    Fake ssh client that runs commands on local host. rsync from source
+    server is emulated by copying local files.
+    """
+    host = 'localhost'
+
+    def __init__(self):
+        self.rsync_calls = []
+        self.unreachable = False
+
+    def exec_cmd(self, cmd, fail_ok=False, expect_timeout=60):
+        proc = subprocess.run(['bash', '-c', cmd], stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              timeout=expect_timeout)
+        output = proc.stdout.decode().strip()
+        assert fail_ok or proc.returncode == 0, output
+        return proc.returncode, output
+
+    def rsync_on_dest(self, source_user, source_ip, source_path, dest_path,
+                      source_pswd, extra_opts=None, timeout=3600,
+                      fail_ok=False):
+        self.rsync_calls.append(extra_opts)
+        if self.unreachable:
+            output = 'ssh: connect to host {} port 22: Connection timed ' \
+                     'out'.format(source_ip)
+            if fail_ok:
+                return 255, output
+            raise exceptions.SSHExecCommandFailed(output)
+        with open(source_path, 'rb') as f:
+            content = f.read()
+        up_to_date = False
+        if os.path.exists(dest_path):
+            with open(dest_path, 'rb') as f:
+                up_to_date = f.read() == content
+
+        if '--dry-run' in extra_opts:
+            size = 0 if up_to_date else len(content)
+            return 0, 'Total file size: {:,} bytes\n' \
+                      'Total transferred file size: {:,} bytes'.format(
+                          len(content), size)
+        if up_to_date:
+            return 0, ''
+        # rsync replaces dest file instead of writing to it
+        tmp_path = dest_path + '.tmp'
+        shutil.copy(source_path, tmp_path)
+        os.rename(tmp_path, dest_path)
+        return 0, '>f+++++++++ {}'.format(os.path.basename(dest_path))
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return ArtifactCache(LocalClient(), cache_dir=str(tmp_path / 'cache'))
+
+
+@pytest.fixture()
+def fake_fs(monkeypatch, cache):
+    """
+    10G file system where each KiB cached counts as 1G
+    """
+    def _get_fs_usage(ssh_client, path):
+        used = sum(os.path.getsize(os.path.join(cache.objects_dir, name)) for
+                   name in os.listdir(cache.objects_dir)) / KIB
+        return 10, 10 - used
+
+    monkeypatch.setattr(artifact_cache, 'get_fs_usage', _get_fs_usage)
+
+
+def _create_source(tmp_path, name, size):
+    path = tmp_path / 'server' / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(name.encode() * (size // len(name)))
+    return str(path)
+
+
+def _fetch(cache, source_path):
+    return cache.fetch('test-server', source_path, source_user='svc-cgcsauto',
+                       source_password='password')
+
+
+def test_fetch_cached(tmp_path, cache, monkeypatch):
+    required = []
+    monkeypatch.setattr(cache, 'evict', lambda required_gib=0: required.append(
+        required_gib))
+    source_path = _create_source(tmp_path, 'guest.img', 3 * KIB)
+
+    checksum = _fetch(cache, source_path)
+    assert cache.has(checksum)
+    assert _fetch(cache, source_path) == checksum
+    assert required == [os.path.getsize(source_path) / 1024 ** 3, 0]
+
+    dest_path = str(tmp_path / 'images' / 'guest.img')
+    cache.link(checksum, dest_path)
+    assert os.path.samefile(dest_path, cache.get_object_path(checksum))
+    # linked destination cannot be written in place
+    assert not os.stat(dest_path).st_mode & 0o222
+
+
+def test_fetch_source_unreachable(tmp_path, cache):
+    source_path = _create_source(tmp_path, 'guest.img', 3 * KIB)
+    checksum = _fetch(cache, source_path)
+
+    cache.ssh_client.unreachable = True
+    assert _fetch(cache, source_path) == checksum
+    with pytest.raises(exceptions.SSHExecCommandFailed):
+        _fetch(cache, _create_source(tmp_path, 'new.img', 3 * KIB))
+
+
+def test_evict_lru(tmp_path, cache, fake_fs):
+    checksums = [_fetch(cache, _create_source(tmp_path, name, 2 * KIB)) for
+                 name in ('a.img', 'b.img', 'c.img')]
+    for index, checksum in enumerate(checksums):
+        os.utime(cache.get_object_path(checksum), (index, index))
+
+    # 6G used. 3G more would be 90% used.
+    cache.evict(required_gib=3)
+    assert [cache.has(checksum) for checksum in checksums] == \
+        [False, True, True]
+
+
+def test_evict_skip_linked_outside(tmp_path, cache, fake_fs):
+    checksums = [_fetch(cache, _create_source(tmp_path, name, 2 * KIB)) for
+                 name in ('a.img', 'b.img', 'c.img')]
+    # Destination of least recently used file is not removed after use
+    cache.link(checksums[0], str(tmp_path / 'images' / 'a.img'))
+    for index, checksum in enumerate(checksums):
+        os.utime(cache.get_object_path(checksum), (index, index))
+
+    cache.evict(required_gib=3)
+    assert [cache.has(checksum) for checksum in checksums] == \
+        [True, False, True]
+    # source copies of evicted file are removed as well
+    assert sorted(name for name in os.listdir(cache.sources_dir) if
+                  not name.endswith('.sha256')) == \
+        [cache.get_key('test-server', str(tmp_path / 'server' / name)) for
+         name in ('a.img', 'c.img')]
+
+
+def test_evict_max_used_percent(tmp_path, cache, fake_fs):
+    checksum = _fetch(cache, _create_source(tmp_path, 'a.img', 2 * KIB))
+
+    # 8G free is enough, but 8G used would exceed 75%
+    cache.evict(required_gib=6)
+    assert cache.has(checksum) is False
+
+    checksum = _fetch(cache, _create_source(tmp_path, 'b.img', 2 * KIB))
+    cache.max_used_percent = None
+    cache.evict(required_gib=6)
+    assert cache.has(checksum)
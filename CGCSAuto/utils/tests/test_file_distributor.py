@@ -0,0 +1,196 @@
+import hashlib
+
+import pytest
+
+from utils import exceptions
+from utils.file_distributor import FileDistributor
+
+DEST_PATH = '/home/sysadmin/images/tis-centos-guest.img'
+CONTENT = b'guest image'
+
+
+@pytest.fixture(scope='session')
+def setup_tis_ssh():
+    # Override conftest fixture. Fake clients only, no lab is needed.
+    pass
+
+
+@pytest.fixture()
+def reconnect_before_test():
+    pass
+
+
+def _checksum(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class FakeClient:
+    """
+    Fake ssh client of a destination. Files are kept in hosts dict shared by
+    all fake clients: {<host>: {<path>: <content>}}
+    """
+    def __init__(self, host, hosts, unreachable=(), truncate_to=()):
+        self.host = host
+        self.hosts = hosts
+        self.hosts.setdefault(host, {})
+        self.unreachable = unreachable
+        self.truncate_to = truncate_to
+        self.rsync_calls = []
+
+    @property
+    def files(self):
+        return self.hosts[self.host]
+
+    def file_exists(self, file_path):
+        return file_path in self.files
+
+    def exec_cmd(self, cmd, fail_ok=False, expect_timeout=60):
+        if cmd.startswith('rm -rf '):
+            self.files.pop(cmd.split()[-1], None)
+            return 0, ''
+        if cmd.startswith('sha256sum '):
+            path = cmd.split()[-1]
+            if path not in self.files:
+                return 1, 'sha256sum: {}: No such file or directory'.format(
+                    path)
+            return 0, '{}  {}'.format(_checksum(self.files[path]), path)
+        raise NotImplementedError(cmd)
+
+    def rsync(self, source, dest_server, dest, dest_user, dest_password,
+              extra_opts=None, timeout=120):
+        self.rsync_calls.append((dest_server, extra_opts))
+        assert '--partial' not in extra_opts
+        if dest_server in self.unreachable:
+            raise exceptions.SSHExecCommandFailed(
+                'ssh: connect to host {} port 22: Connection timed '
+                'out'.format(dest_server))
+        content = self.files[source]
+        if dest_server in self.truncate_to:
+            content = content[:len(content) // 2]
+        self.hosts[dest_server][dest] = content
+
+
+class Origin:
+    def __init__(self, content=CONTENT, return_checksum=True):
+        self.content = content
+        self.return_checksum = return_checksum
+        self.fetched = []
+
+    def fetch(self, client):
+        self.fetched.append(client.host)
+        # Same as scp without artifact cache: existing file is kept
+        if not client.file_exists(DEST_PATH):
+            client.files[DEST_PATH] = self.content
+        if self.return_checksum:
+            return _checksum(self.content)
+
+
+def _get_clients(count, **kwargs):
+    hosts = {}
+    return [FakeClient('10.10.{}.3'.format(i), hosts, **kwargs) for i in
+            range(count)], hosts
+
+
+def test_distribute_relay():
+    clients, hosts = _get_clients(7)
+    origin = Origin()
+    failed = FileDistributor(clients, DEST_PATH).distribute(origin.fetch)
+
+    assert failed == {}
+    assert origin.fetched == [clients[0].host]
+    assert all(hosts[client.host][DEST_PATH] == CONTENT for client in
+               clients)
+    # 1 fetch then relay rounds of 1, 2 and 3 destinations
+    assert len(clients[0].rsync_calls) == 3
+    assert all('--partial-dir=.rsync-partial' in opts for client in clients
+               for _, opts in client.rsync_calls)
+
+
+def test_distribute_single_destination_verified():
+    clients, hosts = _get_clients(1)
+    origin = Origin()
+    hosts[clients[0].host][DEST_PATH] = b'truncated'
+
+    failed = FileDistributor(clients, DEST_PATH).distribute(origin.fetch)
+
+    # Existing bad file is removed before fetch, so it is replaced
+    assert failed == {}
+    assert hosts[clients[0].host][DEST_PATH] == CONTENT
+
+
+def test_distribute_existing_files_checked():
+    clients, hosts = _get_clients(4)
+    origin = Origin()
+    hosts[clients[1].host][DEST_PATH] = CONTENT
+    hosts[clients[2].host][DEST_PATH] = b'guest im'
+
+    failed = FileDistributor(clients, DEST_PATH).distribute(origin.fetch)
+
+    assert failed == {}
+    # Destination without the file is the root, good existing file is kept
+    assert origin.fetched == [clients[0].host]
+    assert not any(dest == clients[1].host for client in clients for dest, _
+                   in client.rsync_calls)
+    assert all(hosts[client.host][DEST_PATH] == CONTENT for client in
+               clients)
+
+
+def test_distribute_existing_files_without_origin_checksum():
+    clients, hosts = _get_clients(3)
+    origin = Origin(return_checksum=False)
+    for client in clients[1:]:
+        hosts[client.host][DEST_PATH] = b'guest im'
+
+    failed = FileDistributor(clients, DEST_PATH).distribute(origin.fetch)
+
+    assert failed == {}
+    assert all(hosts[client.host][DEST_PATH] == CONTENT for client in
+               clients)
+
+
+def test_distribute_unreachable_relay_source():
+    clients, hosts = _get_clients(5)
+    system_controller = clients[0]
+    subcloud_ips = [client.host for client in clients[1:]]
+    for client in clients[1:]:
+        client.unreachable = subcloud_ips
+    origin = Origin()
+
+    failed = FileDistributor(clients, DEST_PATH).distribute(origin.fetch)
+
+    assert failed == {}
+    assert all(hosts[client.host][DEST_PATH] == CONTENT for client in
+               clients)
+    # Subcloud that failed to relay is not used as relay source again
+    for client in clients[1:]:
+        assert len(client.rsync_calls) <= 1
+    assert len(system_controller.rsync_calls) >= 2
+
+
+def test_distribute_corrupted_relay():
+    clients, hosts = _get_clients(3)
+    clients[0].truncate_to = [clients[2].host]
+    origin = Origin()
+
+    failed = FileDistributor(clients, DEST_PATH).distribute(origin.fetch)
+
+    assert failed == {}
+    assert hosts[clients[2].host][DEST_PATH] == CONTENT
+    assert origin.fetched == [clients[0].host, clients[2].host]
+
+
+def test_distribute_fail_ok():
+    clients, hosts = _get_clients(2)
+    clients[0].unreachable = [clients[1].host]
+
+    def _fetch(client):
+        if client is clients[1]:
+            raise exceptions.CommonError('scp failed')
+        return Origin().fetch(client)
+
+    failed = FileDistributor(clients, DEST_PATH).distribute(_fetch,
+                                                            fail_ok=True)
+    assert list(failed) == [clients[1].host]
+
+    with pytest.raises(exceptions.CommonError):
+        FileDistributor(clients, DEST_PATH).distribute(_fetch)
@@ -0,0 +1,128 @@
+import pytest
+
+from utils.kube_watch import get_pod_info, get_pod_status, match_pod, \
+    parse_labels
+
+RUNNING = {'running': {'startedAt': '2026-10-18T10:00:00Z'}}
+
+
+@pytest.fixture(scope='session')
+def setup_tis_ssh():
+    # Override conftest fixture. Pod objects are parsed locally, no lab is
+    # needed.
+    pass
+
+
+@pytest.fixture()
+def reconnect_before_test():
+    pass
+
+
+def _pod(phase='Running', containers=None, init_containers=None,
+         deleting=False, reason=None, name='nova-api-6d5c7',
+         namespace='openstack', labels=None):
+    """
+    Create pod object as in 'kubectl get pods -o json' output
+
+    Args:
+        containers (list|None): container states, e.g., [RUNNING]
+        init_containers (list|None): init container states
+    """
+    pod = {'metadata': {'name': name, 'namespace': namespace,
+                        'labels': labels or {}},
+           'spec': {'nodeName': 'controller-0'},
+           'status': {'phase': phase}}
+    if reason:
+        pod['status']['reason'] = reason
+    if deleting:
+        pod['metadata']['deletionTimestamp'] = '2026-10-18T10:00:00Z'
+    if containers is not None:
+        pod['spec']['containers'] = [{'name': 'c{}'.format(i)} for i in
+                                     range(len(containers))]
+        pod['status']['containerStatuses'] = [
+            {'state': state, 'ready': 'running' in state} for state in
+            containers]
+    if init_containers is not None:
+        pod['spec']['initContainers'] = [{'name': 'i{}'.format(i)} for i in
+                                         range(len(init_containers))]
+        pod['status']['initContainerStatuses'] = [
+            {'state': state} for state in init_containers]
+    return pod
+
+
+@pytest.mark.parametrize(('pod', 'expt_status'), [
+    (_pod(containers=[RUNNING]), 'Running'),
+    (_pod(phase='Pending'), 'Pending'),
+    (_pod(phase='Succeeded',
+          containers=[{'terminated': {'exitCode': 0, 'reason': 'Completed'}}]),
+     'Completed'),
+    (_pod(containers=[{'waiting': {'reason': 'CrashLoopBackOff'}}]),
+     'CrashLoopBackOff'),
+    (_pod(phase='Failed', containers=[{'terminated': {'exitCode': 137}}]),
+     'ExitCode:137'),
+    (_pod(phase='Failed', containers=[{'terminated': {'signal': 9}}]),
+     'Signal:9'),
+    (_pod(containers=[RUNNING,
+                      {'terminated': {'exitCode': 0, 'reason': 'Completed'}}]),
+     'Running'),
+    (_pod(phase='Pending', containers=[{'waiting': {}}],
+          init_containers=[{'terminated': {'exitCode': 0}}, RUNNING]),
+     'Init:1/2'),
+    (_pod(phase='Pending', containers=[{'waiting': {}}],
+          init_containers=[{'waiting': {'reason': 'ImagePullBackOff'}}]),
+     'Init:ImagePullBackOff'),
+    (_pod(phase='Pending', containers=[{'waiting': {}}],
+          init_containers=[{'terminated': {'exitCode': 1,
+                                           'reason': 'Error'}}]),
+     'Init:Error'),
+    (_pod(containers=[RUNNING], deleting=True), 'Terminating'),
+    (_pod(containers=[RUNNING], deleting=True, reason='NodeLost'),
+     'Unknown'),
+    (_pod(phase='Failed', reason='Evicted'), 'Evicted'),
+])
+def test_get_pod_status(pod, expt_status):
+    assert get_pod_status(pod) == expt_status
+
+
+def test_get_pod_info():
+    pod = _pod(containers=[RUNNING, {'waiting': {}}],
+               labels={'application': 'nova'})
+    assert get_pod_info(pod) == {
+        'name': 'nova-api-6d5c7', 'namespace': 'openstack',
+        'labels': {'application': 'nova'}, 'node': 'controller-0',
+        'phase': 'Running', 'status': 'Running', 'ready': '1/2'}
+
+
+@pytest.mark.parametrize(('labels', 'expt'), [
+    (None, {}),
+    ('', {}),
+    ({'application': 'nova', 'replicas': 1},
+     {'application': 'nova', 'replicas': '1'}),
+    ('application=nova, component==compute',
+     {'application': 'nova', 'component': 'compute'}),
+    (['app.kubernetes.io/name=ceph'], {'app.kubernetes.io/name': 'ceph'}),
+    ('application!=nova', None),
+    ('environment in (production)', None),
+    ('application', None),
+])
+def test_parse_labels(labels, expt):
+    assert parse_labels(labels) == expt
+
+
+@pytest.mark.parametrize(('kwargs', 'expt'), [
+    ({}, True),
+    ({'namespace': 'openstack'}, True),
+    ({'namespace': 'default'}, False),
+    ({'pod_names': ['nova-api-6d5c7', 'nova-conductor-7f9b2']}, True),
+    ({'pod_names': ['nova-api']}, False),
+    ({'partial_names': ['glance', 'nova-api']}, True),
+    ({'partial_names': ['glance']}, False),
+    ({'labels': {'application': 'nova'}}, True),
+    ({'labels': {'application': 'nova', 'component': 'api'}}, True),
+    ({'labels': {'application': 'nova', 'component': 'compute'}}, False),
+    ({'namespace': 'openstack', 'labels': {'application': 'glance'}}, False),
+])
+def test_match_pod(kwargs, expt):
+    pod_info = get_pod_info(_pod(labels={'application': 'nova',
+                                         'component': 'api'}))
+    assert match_pod(pod_info, **kwargs) is expt
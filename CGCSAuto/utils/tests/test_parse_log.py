@@ -0,0 +1,83 @@
+import gzip
+import os
+
+import pytest
+
+from utils.cgcs_reporter.parse_log import LogIndex
+
+TIS_LOG = LogIndex.TIS_LOG
+
+
+@pytest.fixture(scope='session')
+def setup_tis_ssh():
+    # Override conftest fixture. Only local log files are parsed.
+    pass
+
+
+@pytest.fixture()
+def reconnect_before_test():
+    pass
+
+
+def _test_log(name):
+    return ''.join('[2026-10-18 10:00:00] DEBUG\n{}{}\nstep of {}\n'.format(marker, name, name) for marker in
+                   ('Setup started for: ', 'Test steps started for: ', 'Teardown started for: ')) + \
+        'Test Result for: {} - PASS\n'.format(name)
+
+
+def _write(log_dir, content, mode='a'):
+    with open(os.path.join(log_dir, TIS_LOG), mode) as f:
+        f.write(content)
+
+
+def _rotate(log_dir):
+    # Same as gzip rotating file handler with backup count of 1
+    log_path = os.path.join(log_dir, TIS_LOG)
+    with open(log_path, 'rb') as f_in, gzip.open(log_path + '.1.gz', 'wb') as f_out:
+        f_out.write(f_in.read())
+    os.remove(log_path)
+
+
+def test_log_index(tmp_path):
+    log_dir = str(tmp_path)
+    _write(log_dir, _test_log('test_a'))
+    index = LogIndex(log_dir)
+    index.update()
+    _write(log_dir, _test_log('test_b'))
+    index.update()
+
+    assert [test['name'] for test in index.get_tests()] == ['test_a', 'test_b']
+    test_b = index.get_tests('test_b')[0]
+    assert index.get_test_log(test_b, 'call').splitlines()[1] == 'step of test_b'
+    assert 'test_a' not in index.get_test_log(test_b)
+
+
+def test_log_index_rotated(tmp_path):
+    log_dir = str(tmp_path)
+    _write(log_dir, _test_log('test_a'))
+    index = LogIndex(log_dir)
+    index.update()
+
+    _rotate(log_dir)
+    _write(log_dir, _test_log('test_b'))
+    index.update()
+
+    assert index.stale
+    assert [test['name'] for test in index.get_tests()] == ['test_a', 'test_b']
+    for name in ('test_a', 'test_b'):
+        log = index.get_test_log(index.get_tests(name)[0])
+        assert log == _test_log(name).split('\n', 1)[1]
+
+
+def test_log_index_truncated(tmp_path):
+    log_dir = str(tmp_path)
+    _write(log_dir, _test_log('test_a') + _test_log('test_b'))
+    index = LogIndex(log_dir)
+    index.update()
+
+    _write(log_dir, _test_log('test_c'), mode='r+')
+    os.truncate(os.path.join(log_dir, TIS_LOG), len(_test_log('test_c')))
+    index.update()
+
+    assert [test['name'] for test in index.get_tests()] == ['test_c']
+    assert index.get_test_log(index.get_tests('test_c')[0]) == _test_log('test_c').split('\n', 1)[1]
@@ -0,0 +1,166 @@
+import time
+from telnetlib import Telnet, theNULL, DO, DONT, WILL, WONT, NOOPT, IAC, SGA, SB, SE, ECHO
+
+from utils.clients import telnet
+from utils.clients.telnet import TelnetClient
+from utils.tis_log import LOG
+
+# Recorded controller console output during install: kernel/systemd messages
+# with color escape sequences, puppet output and telnet negotiation. Repeated
+# by _get_console_dump() to simulate streaming an install console.
+CONSOLE_DUMP = (
+    IAC + DO + SGA + IAC + WILL + ECHO + IAC + WILL + SGA +
+    b"[    0.000000] Linux version 3.10.0-957.21.3.el7.2.tis.x86_64 (mockbuild@yow-cgts4-lx) (gcc version 4.8.5 "
+    b"20150623 (Red Hat 4.8.5-36) (GCC) ) #1 SMP PREEMPT Tue Jul 30 23:58:30 EDT 2019\r\n"
+    b"[    0.000000] Command line: BOOT_IMAGE=/vmlinuz-3.10.0-957.21.3.el7.2.tis.x86_64 root=UUID=6b4c2c3e "
+    b"ro security=selinux selinux=0 console=ttyS0,115200n8\r\n"
+    b"[  OK  ] Started Journal Service.\r\n"
+    b"\x1b[32m  OK  \x1b[0m] Reached target Local File Systems (Pre).\r\n"
+    b"         Starting Remount Root and Kernel File Systems...\r\n"
+    b"\x1b[0;32mNotice: /Stage[main]/Platform::Config::File/File[/etc/platform/platform.conf]/ensure: "
+    b"defined content as '{md5}3c0b5e0c1c8ba2a3f4b8b1f0d52a3e2f'\x1b[0m\r\n"
+    b"\x00\x00\x11controller-0 login: \r\n" +
+    IAC + IAC + b"binary \xc3\xa9t\xc3\xa9\r\n" +
+    IAC + SB + b"\x18\x01" + IAC + SE +
+    b"\x1b[5n" + b"Password: \r\n"
+)
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = b''
+
+    def sendall(self, data):
+        self.sent += data
+
+    def close(self):
+        pass
+
+
+class LegacyTelnetClient(TelnetClient):
+    def process_rawq(self):
+        # Previous TelnetClient.process_rawq(): every byte goes through
+        # rawq_getchar() and cooked data is grown by bytes concatenation.
+        buf = [b'', b'']
+        try:
+            while self.rawq:
+                c = self.rawq_getchar()
+                if not self.iacseq:
+                    if c == theNULL:
+                        continue
+                    if c == b"\021":
+                        continue
+                    if self.vt100query:
+                        if self.vt100querybuffer:
+                            self.vt100querybuffer += c
+                            if len(self.vt100querybuffer) > 10:
+                                self.vt100querybuffer = b''
+                            elif self.vt100querybuffer == telnet.VT100_DEVICE_STATUS:
+                                self.sock.sendall(telnet.VT100_DEVICE_OK)
+                                self.vt100querybuffer = b''
+                        if not self.vt100querybuffer and c == telnet.ESC:
+                            self.vt100querybuffer += c
+                    if c != IAC:
+                        buf[self.sb] = buf[self.sb] + c
+                        continue
+                    else:
+                        self.iacseq += c
+                elif len(self.iacseq) == 1:
+                    if c in (DO, DONT, WILL, WONT):
+                        self.iacseq += c
+                        continue
+
+                    self.iacseq = b''
+                    if c == IAC:
+                        buf[self.sb] = buf[self.sb] + c
+                    else:
+                        if c == SB:
+                            self.sb = 1
+                            self.sbdataq = b''
+                        elif c == SE:
+                            self.sb = 0
+                            self.sbdataq = self.sbdataq + buf[1]
+                            buf[1] = b''
+                        if self.option_callback:
+                            self.option_callback(self.sock, c, NOOPT)
+                elif len(self.iacseq) == 2:
+                    cmd = self.iacseq[1:2]
+                    self.iacseq = b''
+                    opt = c
+                    if cmd in (DO, DONT):
+                        if self.negotiate and opt == SGA:
+                            self.sock.sendall(IAC + WILL + opt)
+                        else:
+                            self.sock.sendall(IAC + WONT + opt)
+                    elif cmd in (WILL, WONT):
+                        if self.negotiate and (opt == SGA or (cmd == WILL and opt == ECHO)):
+                            self.sock.sendall(IAC + DO + opt)
+                        else:
+                            self.sock.sendall(IAC + DONT + opt)
+        except EOFError:
+            self.iacseq = b''
+            self.sb = 0
+        self.cookedq = self.cookedq + buf[0]
+        self.log_write(buf[0])
+        self.sbdataq = self.sbdataq + buf[1]
+
+
+def _get_client(client_class, negotiate=True, vt100query=True):
+    # Unconnected client. TelnetClient.__init__() would connect and login.
+    client = client_class.__new__(client_class)
+    Telnet.__init__(client)
+    client.sock = FakeSocket()
+    client.console_log_file = None
+    client.negotiate = negotiate
+    client.vt100query = vt100query
+    client.vt100querybuffer = b''
+    return client
+
+
+def _get_console_dump(size):
+    return CONSOLE_DUMP * (size // len(CONSOLE_DUMP) + 1)
+
+
+def _feed(client, data, chunk_size):
+    # cooked data is drained after each chunk as read_very_eager() does
+    cooked = []
+    for i in range(0, len(data), chunk_size):
+        client.rawq += data[i:i + chunk_size]
+        client.process_rawq()
+        cooked.append(client.cookedq)
+        client.cookedq = b''
+    client.cookedq = b''.join(cooked)
+    return client
+
+
+def test_process_rawq():
+    data = _get_console_dump(size=100000)
+    for vt100query in (True, False):
+        # odd chunk sizes split IAC and vt100 sequences across chunks
+        for chunk_size in (1, 7, 50, 4096):
+            legacy = _feed(_get_client(LegacyTelnetClient, vt100query=vt100query), data, chunk_size)
+            current = _feed(_get_client(TelnetClient, vt100query=vt100query), data, chunk_size)
+            assert current.cookedq == legacy.cookedq
+            assert current.sbdataq == legacy.sbdataq
+            assert current.sock.sent == legacy.sock.sent
+            assert current.iacseq == legacy.iacseq
+
+    assert b'\x00' not in current.cookedq and b'\x11' not in current.cookedq
+    assert b'\xff\xff' not in current.cookedq and b'\xffbinary' in current.cookedq
+
+
+def test_process_rawq_benchmark():
+    data = _get_console_dump(size=2000000)
+    throughputs = {}
+    for client_class in (LegacyTelnetClient, TelnetClient):
+        for chunk_size in (50, telnet.RECV_SIZE):
+            client = _get_client(client_class)
+            start_time = time.time()
+            _feed(client, data, chunk_size)
+            duration = time.time() - start_time
+            throughputs[(client_class.__name__, chunk_size)] = len(data) / duration / 1000000
+
+    LOG.info("process_rawq throughput (MB/s): {}".format(
+        ', '.join('{} recv {}: {:.2f}'.format(name, chunk_size, throughput) for
+                  (name, chunk_size), throughput in throughputs.items())))
+    assert throughputs[('TelnetClient', telnet.RECV_SIZE)] > throughputs[('LegacyTelnetClient', 50)]
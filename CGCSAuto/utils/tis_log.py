@@ -1,4 +1,11 @@
+import atexit
+import gzip
 import logging
+import os
+import queue
+import shutil
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from time import gmtime
 
 from utils import exceptions
@@ -13,6 +20,11 @@ TC_END_SEP = '='*60
 TC_SETUP_STEP_SEP = TC_TEARDOWN_STEP_SEP = '='*22
 TC_SETUP_START_SEP = TC_TEARDOWN_START_SEP = TC_RESULT_SEP = '-'*65
 
+# Log messages longer than this are moved to a side file, and only the head of
+# the message is kept in the log with the side file offset.
+MAX_LOG_MSG_SIZE = 20000
+LOG_MSG_HEAD_SIZE = 2000
+
 
 class TisLogger(logging.getLoggerClass()):
     def __init__(self, name='', level=logging.NOTSET):
@@ -152,6 +164,168 @@ def get_tis_logger(logger_name, log_path=None, timestamp=gmtime, stream=True, lo
     return logger
 
 
+class _TisQueueHandler(QueueHandler):
+    """
+    Put log records to the queue as is. Message formatting is done by the
+    listener thread instead of the logging thread.
+    """
+    def prepare(self, record):
+        return record
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _TisQueueListener(QueueListener):
+    """
+    Formats and dispatches queued log records to the actual handlers in a
+    background thread. Messages longer than max_msg_size are written to
+    spill_path and truncated in the log.
+    """
+    def __init__(self, queue_, *handlers, spill_path=None, max_msg_size=MAX_LOG_MSG_SIZE):
+        super().__init__(queue_, *handlers, respect_handler_level=True)
+        self.spill_path = spill_path
+        self.max_msg_size = max_msg_size
+        # set by start_queue_logging
+        self.logger = None
+        self.queue_handler = None
+
+    def _handle_error(self, record):
+        # Report to stderr like a handler would. Has to be called from an except block.
+        if self.handlers:
+            self.handlers[0].handleError(record)
+
+    def prepare(self, record):
+        try:
+            msg = record.getMessage()
+        except Exception:
+            # e.g., LOG.info("%s %s", 1)
+            self._handle_error(record)
+            msg = 'Failed to format log message. msg: {!r}, args: {!r}'.format(record.msg, record.args)
+
+        if self.spill_path and len(msg) > self.max_msg_size:
+            try:
+                with open(self.spill_path, mode='a') as f:
+                    offset = f.tell()
+                    f.write('[{}] {}\n'.format(record.threadName, msg))
+                msg = '{}\n... [{} chars truncated. Full message: {} offset {}]'.format(
+                    msg[:LOG_MSG_HEAD_SIZE], len(msg) - LOG_MSG_HEAD_SIZE, os.path.basename(self.spill_path),
+                    offset)
+            except OSError:
+                self._handle_error(record)
+                msg = '{}\n... [{} chars truncated]'.format(msg[:LOG_MSG_HEAD_SIZE], len(msg) - LOG_MSG_HEAD_SIZE)
+
+        record.msg = msg
+        record.args = None
+        return record
+
+    def handle(self, record):
+        if isinstance(record, _FlushMarker):
+            for handler in self.handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    self._handle_error(None)
+            record.done.set()
+            return
+
+        # One bad record should not stop the listener thread, otherwise all
+        # following records are lost
+        try:
+            super().handle(record)
+        except Exception:
+            self._handle_error(record)
+
+
+__QUEUE_LISTENER = None
+
+
+def start_queue_logging(logger, handlers, spill_path=None, max_msg_size=MAX_LOG_MSG_SIZE):
+    """
+    Send records of given logger to a queue, and write them to given handlers
+    from a background thread. So logging calls do not wait for formatting and
+    file writes, and threads do not contend on the handler locks.
+
+    Args:
+        logger (logging.Logger):
+        handlers (list): handlers to write log records. They should not be
+            added to any logger.
+        spill_path (str|None): side file for messages longer than
+            max_msg_size. No truncation if None.
+        max_msg_size (int):
+
+    Returns (QueueListener):
+
+    """
+    global __QUEUE_LISTENER
+    stop_queue_logging()
+
+    queue_ = queue.SimpleQueue()
+    queue_handler = _TisQueueHandler(queue_)
+    logger.addHandler(queue_handler)
+    __QUEUE_LISTENER = _TisQueueListener(queue_, *handlers, spill_path=spill_path, max_msg_size=max_msg_size)
+    __QUEUE_LISTENER.logger = logger
+    __QUEUE_LISTENER.queue_handler = queue_handler
+    __QUEUE_LISTENER.start()
+    return __QUEUE_LISTENER
+
+
+# write out queued records before exit
+atexit.register(lambda: stop_queue_logging())
+
+
+def flush_queue_logging(timeout=30):
+    """
+    Wait for queued log records to be written. e.g., before parsing the log
+    file.
+    """
+    if __QUEUE_LISTENER is None:
+        return
+    marker = _FlushMarker()
+    __QUEUE_LISTENER.queue.put(marker)
+    marker.done.wait(timeout)
+
+
+def stop_queue_logging():
+    """
+    Write all queued log records and stop the listener thread
+    """
+    global __QUEUE_LISTENER
+    if __QUEUE_LISTENER is not None:
+        # Stop queueing first, so a following start_queue_logging does not
+        # leave a handler writing to the stopped listener's queue
+        __QUEUE_LISTENER.logger.removeHandler(__QUEUE_LISTENER.queue_handler)
+        __QUEUE_LISTENER.stop()
+        __QUEUE_LISTENER = None
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def get_gzip_rotating_file_handler(log_path, max_bytes, backup_count=20):
+    """
+    File handler that rotates given log file when it reaches max_bytes, and
+    compresses rotated files to <log_path>.<n>.gz
+
+    Args:
+        log_path (str):
+        max_bytes (int):
+        backup_count (int):
+
+    Returns (RotatingFileHandler):
+
+    """
+    handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
+    handler.namer = lambda name: name + '.gz'
+    handler.rotator = _gzip_rotator
+    return handler
+
+
 def get_existing_loggers():
     return __EXISTING_LOGGERS
 
@@ -0,0 +1,345 @@
+import functools
+import json
+import os
+import queue
+import threading
+import time
+
+from utils.tis_log import LOG
+
+
+class UploadQueue:
+    """
+    Background uploader for test results.
+
+    Upload jobs are journaled to an append-only spool file before they are
+    queued, and uploaded by a worker thread with retries, so that slow or
+    unreachable result databases do not block test execution.
+
+    Jobs not uploaded in previous sessions are replayed from the journal
+    when the queue is created. The journal is compacted to unfinished jobs
+    upon creation and whenever it exceeds max_spool_size, and jobs older
+    than max_age are dropped from it. Jobs of a kind registered with a
+    batch function are uploaded with one call per batch.
+
+    Journal line format (json):
+        {"op": "add", "seq": 1, "ts": 1571234567.8, "kind": "mongo",
+         "kwargs": {...}}
+        {"op": "done"|"failed"|"dropped", "seq": 1}
+
+    e.g.,
+        UploadQueue.register('mongo', collect_and_upload_results)
+        upload_queue = UploadQueue(spool_path='<lab_log_dir>/upload_spool.log')
+        upload_queue.put('mongo', test_name=test_name, result='PASS', ...)
+        ...
+        upload_queue.flush(timeout=300)
+    """
+    __upload_funcs = {}
+    __batch_funcs = {}
+
+    def __init__(self, spool_path, max_pending=1000, batch_size=20, retries=4,
+                 backoff=2, max_delay=60, max_spool_size=10 * 1024 * 1024,
+                 max_age=7 * 24 * 3600):
+        """
+
+        Args:
+            spool_path (str): path of the journal file
+            max_pending (int): max number of jobs waiting to be uploaded.
+                Oldest job is dropped when exceeded. It remains in the journal.
+            batch_size (int): max number of jobs uploaded per worker wake up
+            retries (int): max retries per job
+            backoff (int|float): base of exponential delay between retries
+            max_delay (int|float): max seconds between retries
+            max_spool_size (int): journal size in bytes to compact it at
+            max_age (int|float): seconds to keep unfinished jobs in journal
+        """
+        self.spool_path = spool_path
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.max_spool_size = max_spool_size
+        self.max_age = max_age
+        self.failed = []
+        self.stats = {'queued': 0, 'uploaded': 0, 'failed': 0, 'dropped': 0,
+                      'retries': 0, 'replayed': 0}
+
+        self._seq = 0
+        self._spool_size = 0
+        self._compact_size = max_spool_size
+        self._queue = queue.Queue()
+        self._journal_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        with self._journal_lock:
+            jobs = self._compact()
+        for seq, kind, kwargs in jobs:
+            # unregistered kinds stay in journal until they expire
+            if kind in self.__upload_funcs:
+                self._queue.put((seq, kind, kwargs))
+                self.stats['replayed'] += 1
+        if self.stats['replayed']:
+            LOG.info("Replay {} unfinished upload jobs from {}".format(
+                self.stats['replayed'], spool_path))
+
+        self._worker = threading.Thread(target=self._run, name='upload_queue',
+                                        daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def register(cls, kind, upload_func, batch_func=None):
+        """
+        Register upload function for given job kind. upload_func is called
+        with the kwargs given in put(). Exception or False return value is
+        considered a failure.
+
+        Args:
+            kind (str):
+            upload_func (runnable):
+            batch_func (runnable|None): called with a list of kwargs to upload
+                multiple jobs at once. Returns a list of results, one per job,
+                where False is a failure. Exception or False return value
+                fails the whole batch, and its jobs are then uploaded one by
+                one via upload_func.
+
+        """
+        cls.__upload_funcs[kind] = upload_func
+        if batch_func:
+            cls.__batch_funcs[kind] = batch_func
+        else:
+            cls.__batch_funcs.pop(kind, None)
+
+    @staticmethod
+    def _load_jobs(spool_path):
+        """
+        Get unfinished jobs from journal
+
+        Returns (dict): {<seq>: <add record>}
+
+        """
+        jobs = {}
+        if not os.path.exists(spool_path):
+            return jobs
+
+        with open(spool_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record['op'] == 'add':
+                        jobs[record['seq']] = record
+                    elif record['op'] == 'done':
+                        jobs.pop(record['seq'], None)
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return jobs
+
+    def _compact(self):
+        """
+        Rewrite journal with unfinished jobs only. Jobs older than max_age,
+        and oldest jobs beyond max_pending are dropped. Caller should hold
+        the journal lock.
+
+        Returns (list): list of (seq, kind, kwargs) tuples of unfinished jobs
+
+        """
+        try:
+            jobs = self._load_jobs(self.spool_path)
+        except OSError as e:
+            LOG.warning("Failed to read upload journal {}: {}".format(
+                self.spool_path, e))
+            return []
+
+        min_ts = time.time() - self.max_age
+        records = [jobs[seq] for seq in sorted(jobs) if
+                   jobs[seq].get('ts', 0) >= min_ts][-self.max_pending:]
+        expired = len(jobs) - len(records)
+        if expired:
+            LOG.warning("Drop {} expired or excess upload jobs from {}".format(
+                expired, self.spool_path))
+            self.stats['dropped'] += expired
+
+        tmp_path = self.spool_path + '.tmp'
+        with open(tmp_path, mode='w') as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + '\n')
+        os.replace(tmp_path, self.spool_path)
+
+        self._spool_size = os.path.getsize(self.spool_path)
+        # avoid compacting on every write if unfinished jobs alone are large
+        self._compact_size = max(self.max_spool_size, self._spool_size * 2)
+        if records:
+            self._seq = max(self._seq, records[-1]['seq'])
+        return [(record['seq'], record['kind'], record['kwargs']) for record
+                in records]
+
+    def _journal(self, *records):
+        with self._journal_lock:
+            lines = ''.join(json.dumps(record, default=str) + '\n' for record
+                            in records)
+            with open(self.spool_path, mode='a') as f:
+                f.write(lines)
+            self._spool_size += len(lines)
+            if self._spool_size > self._compact_size:
+                self._compact()
+
+    def put(self, kind, **kwargs):
+        """
+        Journal and queue an upload job. This returns immediately.
+
+        Args:
+            kind (str): registered job kind
+            **kwargs: kwargs for the upload function
+
+        Returns (int): sequence number of the job
+
+        """
+        if kind not in self.__upload_funcs:
+            raise ValueError("Unknown upload job kind {}".format(kind))
+
+        with self._journal_lock:
+            self._seq += 1
+            seq = self._seq
+        self._journal({'op': 'add', 'seq': seq, 'ts': time.time(),
+                       'kind': kind, 'kwargs': kwargs})
+
+        if self._queue.qsize() >= self.max_pending:
+            try:
+                dropped = self._queue.get_nowait()
+                self._queue.task_done()
+                self._journal({'op': 'dropped', 'seq': dropped[0]})
+                self.stats['dropped'] += 1
+                LOG.warning("Upload queue full. Dropped job {} {}".format(
+                    dropped[0], dropped[1]))
+            except queue.Empty:
+                pass
+
+        self._queue.put((seq, kind, kwargs))
+        self.stats['queued'] += 1
+        return seq
+
+    def _call(self, kind, func, *args, retries=None):
+        """
+        Call upload or batch function with retries
+
+        Returns: return value of func, or False if failed
+
+        """
+        retries = self.retries if retries is None else retries
+        for i in range(retries + 1):
+            try:
+                res = func(*args)
+                if res is not False:
+                    return res
+                LOG.warning("{} upload returned False".format(kind))
+            except Exception as e:
+                LOG.warning("{} upload failed: {}".format(kind, e))
+
+            if i < retries:
+                self.stats['retries'] += 1
+                # no more waiting between retries after flush() timed out
+                delay = min(self.backoff ** i, self.max_delay)
+                if self._stop.wait(delay):
+                    break
+        return False
+
+    def _upload(self, kind, kwargs, retries=None):
+        func = functools.partial(self.__upload_funcs[kind], **kwargs)
+        return self._call(kind, func, retries=retries) is not False
+
+    def _upload_batch(self, kind, kwargs_list):
+        """
+        Upload jobs of the same kind
+
+        Returns (list): whether each job is uploaded
+
+        """
+        batch_func = self.__batch_funcs.get(kind)
+        if not batch_func or len(kwargs_list) == 1:
+            return [self._upload(kind, kwargs) for kwargs in kwargs_list]
+
+        results = self._call(kind, batch_func, kwargs_list)
+        if isinstance(results, (list, tuple)) and \
+                len(results) == len(kwargs_list):
+            return [res is not False for res in results]
+
+        # A bad job may fail the whole batch. Try each job once.
+        LOG.warning("{} batch upload failed. Upload {} jobs one by "
+                    "one".format(kind, len(kwargs_list)))
+        return [self._upload(kind, kwargs, retries=0) for kwargs in
+                kwargs_list]
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            jobs_per_kind = {}
+            for job in batch:
+                jobs_per_kind.setdefault(job[1], []).append(job)
+
+            records = []
+            for kind, jobs in jobs_per_kind.items():
+                results = self._upload_batch(kind, [kwargs for seq, kind_,
+                                                    kwargs in jobs])
+                for (seq, kind_, kwargs), uploaded in zip(jobs, results):
+                    if uploaded:
+                        records.append({'op': 'done', 'seq': seq})
+                        self.stats['uploaded'] += 1
+                    else:
+                        records.append({'op': 'failed', 'seq': seq})
+                        self.stats['failed'] += 1
+                        self.failed.append((seq, kind, kwargs))
+                    self._queue.task_done()
+            self._journal(*records)
+
+    def get_pending_count(self):
+        return self._queue.qsize()
+
+    def flush(self, timeout=300):
+        """
+        Wait for queued jobs to be uploaded and stop the worker.
+
+        Args:
+            timeout (int): max seconds to wait. Jobs not uploaded within
+                timeout are left in the journal.
+
+        Returns (dict): upload stats
+
+        """
+        end_time = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < end_time:
+            time.sleep(0.5)
+
+        self._stop.set()
+        self._worker.join(max(end_time - time.time(), 1))
+        self.stats['pending'] = self._queue.unfinished_tasks
+        LOG.info("Result upload queue flushed. Stats: {}. Journal: {}".format(
+            self.stats, self.spool_path))
+        return self.stats
+
+    @staticmethod
+    def get_unfinished_jobs(spool_path):
+        """
+        Get jobs in journal that were not uploaded, such as jobs left from an
+        interrupted session. They can be passed to put() again.
+
+        Args:
+            spool_path (str):
+
+        Returns (list): list of (kind, kwargs) tuples
+
+        """
+        jobs = UploadQueue._load_jobs(spool_path)
+        return [(jobs[seq]['kind'], jobs[seq]['kwargs']) for seq in
+                sorted(jobs)]